@@ -1,15 +1,28 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, jsonify
 from flask_login import current_user
-from ..models import Post, Category, User
-from .. import db, login_manager
-from werkzeug.utils import secure_filename
-from datetime import datetime
+from ..models import Post, Category, User, CategoryStat, AuthorStat, DailyStat
+from .. import db, login_manager, metrics
+from datetime import datetime, date, timedelta
 from functools import wraps
-import os
-from slugify import slugify
+import hmac
+from sqlalchemy import select, func
+from ..querybudget import query_budget
+from ..media import save_upload
+from ..slugs import add_with_slug
 
 admin_bp = Blueprint('admin', __name__)
 
+# Dashboard grid: statuses it filters on and the columns it can sort by
+POST_STATUSES = ('published', 'draft')
+GRID_SORTS = {
+    'created_at': Post.created_at,
+    'updated_at': Post.updated_at,
+    'title': Post.title,
+    'views': Post.views,
+    'status': Post.status,
+}
+EXCERPT_LENGTH = 120
+
 # ===============================
 # Decorator: restrict to admins only
 # ===============================
@@ -29,26 +42,163 @@ def admin_required(f):
 # ===============================
 @admin_bp.route('/')
 @admin_required
+@query_budget(4)
 def dashboard():
-    posts = Post.query.order_by(Post.created_at.desc()).all()
+    # Posts are fetched page by page by the grid (admin.posts_data); the
+    # category and author options are sent once, with the page
     categories = Category.query.order_by(Category.name).all()
-    users = User.query.all()
-
-    posts_serialized = [
-        {
-            "id": post.id,
-            "title": post.title,
-            "content": post.content,
-            "category": post.category.name if post.category else "Uncategorized",
-            "user": post.user.username if post.user else "Unknown",
-            "created_at": post.created_at.strftime("%Y-%m-%d %H:%M"),
-            "status": getattr(post, 'status', 'published'),
-            "views": getattr(post, 'views', 0),
-        }
-        for post in posts
-    ]
-
-    return render_template('admin/dashboard.html', posts=posts_serialized, users=users, categories=categories)
+    users = db.session.execute(select(User.id, User.username).order_by(User.username)).all()
+    options = {
+        "categories": [{"id": c.id, "name": c.name} for c in categories],
+        "users": [{"id": u.id, "name": u.username} for u in users],
+        "statuses": list(POST_STATUSES),
+    }
+    return render_template('admin/dashboard.html', categories=categories, options=options)
+
+# ===============================
+# Dashboard grid data (JSON)
+# ===============================
+@admin_bp.route('/posts.json')
+@admin_required
+@query_budget(3)
+def posts_data():
+    """One page of the dashboard grid, filtered and sorted in SQL.
+
+    Only the listed columns are selected; content comes back as a short
+    excerpt and the full text is fetched from admin.post_content on edit.
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+
+    filters = []
+    if request.args.get('status') in POST_STATUSES:
+        filters.append(Post.status == request.args['status'])
+    if request.args.get('category_id', type=int):
+        filters.append(Post.category_id == request.args.get('category_id', type=int))
+    if request.args.get('user_id', type=int):
+        filters.append(Post.user_id == request.args.get('user_id', type=int))
+    if request.args.get('q', '').strip():
+        filters.append(Post.title.ilike(f"%{request.args['q'].strip()}%"))
+
+    sort = GRID_SORTS.get(request.args.get('sort'), Post.created_at)
+    if request.args.get('dir') == 'asc':
+        order = (sort.asc(), Post.id.asc())
+    else:
+        order = (sort.desc(), Post.id.desc())
+
+    total = db.session.scalar(select(func.count(Post.id)).where(*filters))
+    rows = db.session.execute(
+        select(Post.id, Post.title, Post.slug, Post.status, Post.views, Post.category_id, Post.user_id,
+               Post.created_at, func.substr(Post.content, 1, EXCERPT_LENGTH).label('excerpt'))
+        .where(*filters)
+        .order_by(*order)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+
+    return jsonify({
+        "items": [
+            {
+                "id": row.id,
+                "title": row.title,
+                "slug": row.slug,
+                "status": row.status or 'draft',
+                "views": row.views or 0,
+                "category_id": row.category_id,
+                "user_id": row.user_id,
+                "created_at": row.created_at.strftime("%Y-%m-%d %H:%M") if row.created_at else None,
+                "excerpt": row.excerpt,
+            }
+            for row in rows
+        ],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+    })
+
+
+@admin_bp.route('/post/<int:post_id>/content')
+@admin_required
+def post_content(post_id):
+    content = db.session.scalar(select(Post.content).where(Post.id == post_id))
+    if content is None:
+        abort(404)
+    return jsonify({"id": post_id, "content": content})
+
+# ===============================
+# Update Post (inline edits from the dashboard grid)
+# ===============================
+@admin_bp.route('/update_post/<int:post_id>', methods=['POST'])
+@admin_required
+def update_post(post_id):
+    post = Post.query.get_or_404(post_id)
+
+    # Only the fields sent are changed, so the grid can save a title
+    # without having loaded the full content
+    if request.form.get('title', '').strip():
+        post.title = request.form['title'].strip()
+    if request.form.get('content', '').strip():
+        post.content = request.form['content']
+    if 'category_id' in request.form:
+        category = db.session.get(Category, request.form.get('category_id', type=int))
+        if category is None:
+            return jsonify({"error": "Unknown category"}), 400
+        post.category_id = category.id
+    if 'user_id' in request.form:
+        user = db.session.get(User, request.form.get('user_id', type=int))
+        if user is None:
+            return jsonify({"error": "Unknown author"}), 400
+        post.user_id = user.id
+
+    db.session.commit()
+    return jsonify({"ok": True, "id": post.id})
+
+# ===============================
+# Statistics (rollup tables, see app/stats.py)
+# ===============================
+@admin_bp.route('/stats')
+@admin_required
+@query_budget(5)
+def stats():
+    # Each section reads a small rollup table instead of aggregating posts
+    by_category = db.session.execute(
+        select(CategoryStat, Category.name)
+        .outerjoin(Category, Category.id == CategoryStat.category_id)
+        .order_by(CategoryStat.posts.desc())
+    ).all()
+    top_authors = db.session.execute(
+        select(AuthorStat, User.username)
+        .join(User, User.id == AuthorStat.user_id)
+        .order_by(AuthorStat.views.desc())
+        .limit(10)
+    ).all()
+    since = date.today() - timedelta(days=13)
+    days = {row.day: row for row in DailyStat.query.filter(DailyStat.day >= since)}
+    daily = [(since + timedelta(days=i), days.get(since + timedelta(days=i))) for i in range(14)]
+    top_posts = db.session.execute(
+        select(Post.title, Post.slug, Post.views, Post.likes).order_by(Post.views.desc()).limit(10)
+    ).all()
+
+    totals = {column: sum(getattr(row.CategoryStat, column) for row in by_category)
+              for column in ('posts', 'published', 'views', 'likes', 'comments')}
+    return render_template('admin/stats.html', totals=totals, by_category=by_category,
+                           top_authors=top_authors, daily=daily, top_posts=top_posts)
+
+# ===============================
+# Metrics (Prometheus format, see app/metrics.py)
+# ===============================
+@admin_bp.route('/metrics')
+def metrics_export():
+    # Scrapers can't log in: they send the METRICS_TOKEN instead
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return _metrics_response()
+    return admin_required(_metrics_response)()
+
+def _metrics_response():
+    if not metrics.enabled:
+        abort(404)
+    return current_app.response_class(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
 
 # ===============================
 # New Post
@@ -56,15 +206,11 @@ def dashboard():
 @admin_bp.route("/new-post", methods=["GET", "POST"])
 @admin_required
 def new_post():
+    # Ensure default categories exist; concurrent requests may race to insert them
+    if Category.ensure_defaults(db.session):
+        db.session.commit()
     categories = Category.query.all()
 
-    # Ensure default categories exist
-    default_names = ['general', 'politics', 'religion', 'sport', 'entertainment', 'Naija gist']
-    for name in default_names:
-        if not Category.query.filter_by(name=name).first():
-            db.session.add(Category(name=name))
-            db.session.commit()
-
     if request.method == 'POST':
         title = request.form.get('title')
         content = request.form.get('content')
@@ -82,45 +228,21 @@ def new_post():
 
         category_id = category.id
 
-        # Create unique slug
-        base_slug = slugify(title)
-        slug = base_slug
-        counter = 1
-        while Post.query.filter_by(slug=slug).first():
-            slug = f"{base_slug}-{counter}"
-            counter += 1
-
         # ----------------------------
-        # File Upload (Debug Enabled)
+        # File Upload
         # ----------------------------
         media_filename = None
         file = request.files.get('media')
-        print("🔍 File received:", file)  # Debug print
-
         if file and file.filename:
-            filename = secure_filename(file.filename)
-            if filename:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                name, ext = os.path.splitext(filename)
-                unique_filename = f"{name}_{timestamp}{ext}"
-
-                # Safer path resolution
-                upload_folder = os.path.join(current_app.static_folder, 'uploads', 'media')
-                os.makedirs(upload_folder, exist_ok=True)
-
-                file_path = os.path.join(upload_folder, unique_filename)
-                print("💾 Saving to:", file_path)  # Debug print
-                file.save(file_path)
-
-                media_filename = unique_filename
+            # Stored by content hash and shared between posts, see app/media.py
+            media_filename = save_upload(file)
+            if media_filename:
+                current_app.logger.debug("Saved upload as %s", media_filename)
                 flash('Media uploaded successfully!', 'success')
-        else:
-            print("⚠️ No file uploaded or invalid field name")
 
         # Create new post
         post = Post(
             title=title,
-            slug=slug,
             content=content,
             category_id=category_id,
             user_id=current_user.id,
@@ -130,7 +252,8 @@ def new_post():
             views=0,
             media_filename=media_filename
         )
-        db.session.add(post)
+        # Unique slug in one query, retried if a concurrent post takes it
+        add_with_slug(post, title)
         db.session.commit()
 
         flash("New post added successfully!", "success")
@@ -1,13 +1,22 @@
 from flask import Blueprint, jsonify, request, url_for
 from ..models import Post, User
-from .. import db
+from .. import db, post_counts
+from ..pagination import KeysetPage
+from ..querybudget import query_budget
+from ..database import replica_reads
+from ..conditional import conditional, listing_validator
 api_bp = Blueprint('api', __name__)
 
 @api_bp.route('/posts', methods=['GET'])
+@query_budget(4)
+@replica_reads
+@conditional(listing_validator)
 def posts():
-    posts = Post.query.order_by(Post.created_at.desc()).limit(20).all()
+    # Keyset pagination: pass the X-Next-Cursor value back as ?after=
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    page = KeysetPage(Post.query, limit, after=request.args.get('after'))
     out = []
-    for p in posts:
+    for p in page.items:
         out.append({
             'id': p.id,
             'title': p.title,
@@ -15,4 +24,9 @@ def posts():
             'excerpt': p.content[:200],
             'url': url_for('blog.view_post', slug=p.slug, _external=True)
         })
-    return jsonify(out)
+    resp = jsonify(out)
+    resp.headers['X-Total-Count'] = post_counts.count(('api.posts',), Post.query)
+    if page.has_next:
+        resp.headers['X-Next-Cursor'] = page.next_cursor
+        resp.headers['Link'] = '<%s>; rel="next"' % url_for('api.posts', after=page.next_cursor, limit=limit, _external=True)
+    return resp
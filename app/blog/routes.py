@@ -1,30 +1,22 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash, g, jsonify, abort
 from flask_login import login_required, current_user
 from ..models import Post, Category, Comment, Reply, db
-import os
+from .. import view_counter, search_index, post_counts, image_derivatives, post_projection
+from ..pagination import KeysetPage, encode_cursor
+from ..querybudget import query_budget
+from ..database import replica_reads
+from ..pagecache import cached_page
+from ..conditional import conditional, post_validator, listing_validator
+from ..media import send_media, media_kind
+from ..likes import set_like, liked_ids
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 
 blog_bp = Blueprint("blog", __name__)
-
-# ==========================
-# HELPER TABLES FOR LIKES
-# ==========================
-from sqlalchemy import Table, Column, Integer, ForeignKey
-
-# Association tables for likes (many-to-many)
-from .. import db
-
-post_likes = db.Table(
-    "post_likes",
-    db.Column("user_id", db.Integer, db.ForeignKey("user.id")),
-    db.Column("post_id", db.Integer, db.ForeignKey("post.id")),
-)
-
-comment_likes = db.Table(
-    "comment_likes",
-    db.Column("user_id", db.Integer, db.ForeignKey("user.id")),
-    db.Column("comment_id", db.Integer, db.ForeignKey("comment.id")),
-)
+blog_bp.add_app_template_global(media_kind)
+blog_bp.add_app_template_global(image_derivatives.srcset, "responsive_image")
+blog_bp.add_app_template_global(encode_cursor)
 
 ALLOWED = {"png", "jpg", "jpeg", "gif", "mp4", "webm", "ogg", "mp3", "wav", "m4a"}
 
@@ -36,25 +28,51 @@ def allowed_file(fn):
 # ==========================
 # BLOG HOMEPAGE (ALL POSTS)
 # ==========================
+def _index_validator():
+    # Search results are ranked, not date-ordered: no cheap validator
+    if request.args.get("q", "").strip():
+        return None
+    return listing_validator()
+
+
 @blog_bp.route("/")
+@query_budget(6)
+@replica_reads
+@conditional(_index_validator)
+@cached_page(tags=lambda: ["listing"], params=("q", "cat", "after", "before", "page"))
 def index():
     q = request.args.get("q", "").strip()
     cat = request.args.get("cat")
-    page = int(request.args.get("page", 1))
+    after = request.args.get("after")
+    before = request.args.get("before")
+    page = request.args.get("page", 1, type=int)
     per = 6
+    # Search results, and old ?page=N links, use offset paging
+    offset_paging = bool(q) or ("page" in request.args and not (after or before))
+
+    listed = None
+    if post_projection.reading and not q:
+        # From the MongoDB read model (app/projection.py); search stays on SQL
+        listed = post_projection.listing(per, cat=cat, after=after, before=before,
+                                         page=page if offset_paging else None)
+    if listed is None:
+        listed = _list_posts(per, q, cat, after, before, page if offset_paging else None)
+    posts, total_posts, prev_cursor, next_cursor = listed
 
-    query = Post.query.filter(Post.status == "published")
-
-    if q:
-        query = query.filter(Post.title.ilike(f"%{q}%"))
-    if cat:
-        query = query.join(Category).filter(Category.name == cat)
-
-    posts = query.order_by(Post.created_at.desc()).limit(per).offset((page - 1) * per).all()
-    total_posts = query.count()
     total_pages = (total_posts + per - 1) // per
-    has_prev = page > 1
-    has_next = page < total_pages
+    args = {"q": q or None, "cat": cat or None}
+    prev_url = next_url = None
+    if offset_paging:
+        if page > 1:
+            prev_url = url_for("blog.index", page=page - 1, **args)
+        if page < total_pages:
+            next_url = url_for("blog.index", page=page + 1, **args)
+    else:
+        # ``page`` only travels along so the "N of M" label stays right
+        if prev_cursor:
+            prev_url = url_for("blog.index", before=prev_cursor, page=max(page - 1, 1), **args)
+        if next_cursor:
+            next_url = url_for("blog.index", after=next_cursor, page=page + 1, **args)
 
     categories = Category.query.order_by(Category.name).all()
 
@@ -64,23 +82,69 @@ def index():
         categories=categories,
         page=page,
         total_pages=total_pages,
-        has_prev=has_prev,
-        has_next=has_next,
+        has_prev=prev_url is not None,
+        has_next=next_url is not None,
+        prev_url=prev_url,
+        next_url=next_url,
         q=q,
         cat=cat,
     )
 
 
+def _list_posts(per, q, cat, after, before, page):
+    """``(posts, total, prev_cursor, next_cursor)`` from SQL; offset paged
+    when ``page`` is given (no cursors then)."""
+    # blog/index.html shows post.user.username on every card
+    query = Post.query.options(joinedload(Post.user)).filter(Post.status == "published")
+
+    if cat:
+        query = query.join(Category).filter(Category.name == cat)
+
+    if q:
+        # Ranked full-text search (see app/search.py). Counts for arbitrary
+        # search strings aren't worth caching.
+        query = search_index.search(query, q)
+        total_posts = query.order_by(None).count()
+    else:
+        total_posts = post_counts.count(("blog.index", cat), query)
+
+    if page is not None:
+        if not q:
+            query = query.order_by(Post.created_at.desc(), Post.id.desc())
+        return query.limit(per).offset((page - 1) * per).all(), total_posts, None, None
+
+    # Keyset pagination on (created_at, id): constant cost at any depth
+    result = KeysetPage(query, per, after=after, before=before)
+    return result.items, total_posts, result.prev_cursor, result.next_cursor
+
+
 # ==========================
 # SINGLE POST VIEW + COMMENTS
 # ==========================
+def _count_cached_view(context):
+    view_counter.incr(context["post_id"])
+
+
 @blog_bp.route("/post/<slug>", methods=["GET", "POST"])
+@query_budget(lambda: 6 + view_counter.write_statements)
+@replica_reads
+@conditional(post_validator, on_not_modified=_count_cached_view)
+@cached_page(tags=lambda slug: [f"post:{slug}"], on_hit=_count_cached_view)
 def view_post(slug):
-    post = Post.query.filter_by(slug=slug).first_or_404()
+    if request.method == "GET" and post_projection.reading:
+        # The whole first screen from one MongoDB document (app/projection.py)
+        projected = post_projection.page(slug)
+        if projected is not None:
+            view_counter.incr(projected.post.id)
+            g.page_cache_context = {"post_id": projected.post.id}
+            return _render_post(slug, projected.post, projected.comments, projected.comment_total,
+                                projected.reply_previews, projected.reply_totals, projected.next_comments_cursor)
 
-    # Increment view count
-    post.views = (post.views or 0) + 1
-    db.session.commit()
+    post = Post.query.options(joinedload(Post.user)).filter_by(slug=slug).first_or_404()
+
+    # Increment view count (buffered and written in batches, see app/counters.py)
+    view_counter.incr(post.id)
+    g.page_cache_context = {"post_id": post.id}
 
     if request.method == "POST":
         if not current_user.is_authenticated:
@@ -96,8 +160,87 @@ def view_post(slug):
 
         return redirect(url_for("blog.view_post", slug=slug))
 
-    comments = Comment.query.filter_by(post_id=post.id).order_by(Comment.created_at.desc()).all()
-    return render_template("blog/new_post.html", post=post, comments=comments)
+    # First page of the thread plus a preview of each comment's replies;
+    # the rest loads on demand from comments_page / replies_page
+    page, previews, totals = _comment_page(post.id)
+    comment_total = db.session.scalar(select(func.count(Comment.id)).where(Comment.post_id == post.id))
+    return _render_post(slug, post, page.items, comment_total, previews, totals, page.next_cursor)
+
+
+def _render_post(slug, post, comments, comment_total, previews, totals, next_cursor):
+    return render_template(
+        "blog/new_post.html", post=post, comments=comments, comment_total=comment_total,
+        reply_previews=previews, reply_totals=totals,
+        next_comments_url=url_for("blog.comments_page", slug=slug, after=next_cursor) if next_cursor else None,
+    )
+
+
+def _comment_page(post_id, after=None):
+    """A page of comments (with authors) and their reply previews: 2 queries."""
+    page = KeysetPage(
+        Comment.query.filter_by(post_id=post_id).options(joinedload(Comment.user)),
+        current_app.config["COMMENTS_PER_PAGE"], after=after, model=Comment,
+    )
+    previews, totals = _reply_previews([c.id for c in page.items], current_app.config["REPLY_PREVIEW"])
+    return page, previews, totals
+
+
+def _reply_previews(comment_ids, limit):
+    """The first ``limit`` replies of each comment and each comment's reply
+    count, from one windowed query."""
+    previews, totals = {}, {}
+    if not comment_ids:
+        return previews, totals
+    ranked = (
+        select(
+            Reply.id,
+            func.row_number().over(partition_by=Reply.comment_id, order_by=(Reply.created_at, Reply.id)).label("rn"),
+            func.count().over(partition_by=Reply.comment_id).label("total"),
+        )
+        .where(Reply.comment_id.in_(comment_ids))
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(Reply, ranked.c.total)
+        .join(ranked, ranked.c.id == Reply.id)
+        .where(ranked.c.rn <= limit)
+        .options(joinedload(Reply.user))
+        .order_by(Reply.comment_id, Reply.created_at, Reply.id)
+    ).all()
+    for reply, total in rows:
+        previews.setdefault(reply.comment_id, []).append(reply)
+        totals[reply.comment_id] = total
+    return previews, totals
+
+
+@blog_bp.route("/post/<slug>/comments")
+@query_budget(5)
+@cached_page(tags=lambda slug: [f"post:{slug}"], params=("after",))
+def comments_page(slug):
+    """Next page of a post's comments: ``{"html", "next_url"}``."""
+    post_id = db.session.scalar(select(Post.id).where(Post.slug == slug))
+    if post_id is None:
+        abort(404)
+    page, previews, totals = _comment_page(post_id, after=request.args.get("after"))
+    return jsonify({
+        "html": render_template("blog/_comment_page.html", comments=page.items,
+                                reply_previews=previews, reply_totals=totals),
+        "next_url": url_for("blog.comments_page", slug=slug, after=page.next_cursor) if page.has_next else None,
+    })
+
+
+@blog_bp.route("/comment/<int:comment_id>/replies")
+@query_budget(3)
+def replies_page(comment_id):
+    """Replies after ``after``, oldest first: ``{"html", "next_url"}``."""
+    page = KeysetPage(
+        Reply.query.filter_by(comment_id=comment_id).options(joinedload(Reply.user)),
+        current_app.config["REPLIES_PER_PAGE"], after=request.args.get("after"), model=Reply, newest_first=False,
+    )
+    return jsonify({
+        "html": render_template("blog/_reply_page.html", replies=page.items),
+        "next_url": url_for("blog.replies_page", comment_id=comment_id, after=page.next_cursor) if page.has_next else None,
+    })
 
 
 # ==========================
@@ -119,57 +262,71 @@ def add_reply(comment_id):
 
 
 # ==========================
-# LIKE A POST (once per user)
+# LIKES (see app/likes.py)
 # ==========================
+MAX_LIKE_IDS = 200  # per kind, for blog.likes_state
+
+
+def _like_response(kind, target_id, liked, slug):
+    changed, count = set_like(kind, target_id, current_user.id, liked)
+    db.session.commit()
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"liked": liked, "changed": changed, "likes": count})
+
+    noun = "post" if kind == "post" else "comment"
+    if changed:
+        flash(f"You liked this {noun}!" if liked else f"You unliked this {noun}.", "success")
+    else:
+        flash(f"You already liked this {noun}!" if liked else f"You haven't liked this {noun}.", "info")
+    return redirect(url_for("blog.view_post", slug=slug))
+
+
 @blog_bp.route("/like/<int:post_id>", methods=["POST"])
 @login_required
 def like_post(post_id):
     post = Post.query.get_or_404(post_id)
+    return _like_response("post", post.id, True, post.slug)
 
-    # Check if user has already liked this post
-    result = db.session.execute(
-        post_likes.select().where(
-            (post_likes.c.user_id == current_user.id) &
-            (post_likes.c.post_id == post_id)
-        )
-    ).fetchone()
 
-    if result:
-        flash("You already liked this post!", "info")
-    else:
-        db.session.execute(post_likes.insert().values(user_id=current_user.id, post_id=post_id))
-        post.likes = (post.likes or 0) + 1
-        db.session.commit()
-        flash("You liked this post!", "success")
-
-    return redirect(url_for("blog.view_post", slug=post.slug))
+@blog_bp.route("/unlike/<int:post_id>", methods=["POST"])
+@login_required
+def unlike_post(post_id):
+    post = Post.query.get_or_404(post_id)
+    return _like_response("post", post.id, False, post.slug)
 
 
-# ==========================
-# LIKE A COMMENT (once per user)
-# ==========================
 @blog_bp.route("/like_comment/<int:comment_id>", methods=["POST"])
 @login_required
 def like_comment(comment_id):
-    comment = Comment.query.get_or_404(comment_id)
+    comment = Comment.query.options(joinedload(Comment.post)).get_or_404(comment_id)
+    return _like_response("comment", comment.id, True, comment.post.slug)
 
-    # Check if user has already liked this comment
-    result = db.session.execute(
-        comment_likes.select().where(
-            (comment_likes.c.user_id == current_user.id) &
-            (comment_likes.c.comment_id == comment_id)
-        )
-    ).fetchone()
 
-    if result:
-        flash("You already liked this comment!", "info")
-    else:
-        db.session.execute(comment_likes.insert().values(user_id=current_user.id, comment_id=comment_id))
-        comment.likes = (comment.likes or 0) + 1
-        db.session.commit()
-        flash("You liked this comment!", "success")
+@blog_bp.route("/unlike_comment/<int:comment_id>", methods=["POST"])
+@login_required
+def unlike_comment(comment_id):
+    comment = Comment.query.options(joinedload(Comment.post)).get_or_404(comment_id)
+    return _like_response("comment", comment.id, False, comment.post.slug)
 
-    return redirect(url_for("blog.view_post", slug=comment.post.slug))
+
+@blog_bp.route("/likes")
+@query_budget(2)
+def likes_state():
+    """?posts=1,2&comments=3,4 -> which of them the current user has liked.
+
+    Pages are cached without per-user state, so they ask for it here.
+    """
+    def ids(name):
+        values = {int(v) for v in request.args.get(name, "").split(",") if v.strip().isdigit()}
+        return sorted(values)[:MAX_LIKE_IDS]
+
+    if not current_user.is_authenticated:
+        return jsonify({"posts": [], "comments": []})
+    found = liked_ids(current_user.id, ids("posts"), ids("comments"))
+    response = jsonify({"posts": sorted(found["posts"]), "comments": sorted(found["comments"])})
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
 
 
 # ==========================
@@ -200,4 +357,5 @@ def edit_comment(comment_id):
 # ==========================
 @blog_bp.route("/media/<filename>")
 def media(filename):
-    return current_app.send_static_file(os.path.join("uploads", filename))
+    # Range requests, immutable caching and proxy offload: see app/media.py
+    return send_media(filename)
@@ -0,0 +1,90 @@
+import os
+import threading
+
+
+# ==========================
+# LAZY CLIENTS
+# ==========================
+# MongoDB and mail are only needed by a few code paths (the post
+# projection, outgoing mail), so neither the client nor the library behind
+# it is loaded in create_app: importing pymongo alone costs a worker
+# ~150 ms, and a mongodb+srv:// URI would add DNS lookups on top. Each is
+# created on first use, once per process, so a client built in a
+# preloading gunicorn master is never shared with the forked workers.
+class LazyMongo:
+    """Stands in for Flask-PyMongo: ``mongo.cx`` is the MongoClient for
+    MONGO_URI and ``mongo.db`` the database named in the URI (or None)."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault("MONGO_URI", None)
+        app.extensions["pymongo"] = self
+
+    def _connect(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                from pymongo import MongoClient
+                from pymongo.errors import ConfigurationError
+
+                uri = self.app.config["MONGO_URI"]
+                if not uri:
+                    raise RuntimeError("MONGO_URI is not set")
+                # Leave the parent's client alone: closing it here would
+                # close the parent's sockets too
+                client = MongoClient(uri, connect=False)
+                try:
+                    self._db = client.get_default_database()
+                except ConfigurationError:  # no database in the URI
+                    self._db = None
+                self._client = client
+                self._pid = pid
+
+    @property
+    def cx(self):
+        self._connect()
+        return self._client
+
+    @property
+    def db(self):
+        self._connect()
+        return self._db
+
+
+class LazyMail:
+    """Stands in for Flask-Mail's ``Mail``; Flask-Mail is set up on the first
+    ``send``, ``connect`` or ``record_messages``."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._mail = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._mail is None:
+                from flask_mail import Mail
+
+                self._mail = Mail(self.app)
+        return self._mail
+
+    def __getattr__(self, name):
+        # Only reached for names not set in __init__: send, connect, ...
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.client, name)
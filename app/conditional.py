@@ -0,0 +1,113 @@
+import hashlib
+from functools import wraps
+
+from flask import request, session, current_app, make_response
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from .pagecache import EVERYTHING
+
+
+# ==========================
+# CONDITIONAL GET (ETag / Last-Modified)
+# ==========================
+def conditional(validator, on_not_modified=None):
+    """Answer If-None-Match / If-Modified-Since with 304 before the view runs.
+
+    ``validator`` is called with the view's arguments and returns a dict
+    with ``parts`` (values that change whenever the page would) and
+    ``last_modified``, or None to skip validation. It runs on every GET,
+    before the page cache, so it should be one indexed lookup.
+    ``on_not_modified`` gets that dict when a 304 is sent.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # A pending flash shows on whichever page renders next: not on a 304
+            if request.method not in ("GET", "HEAD") or "_flashes" in session:
+                return f(*args, **kwargs)
+            result = validator(*args, **kwargs)
+            if result is None:
+                return f(*args, **kwargs)
+
+            # The page varies by query string and by who is logged in
+            parts = [request.full_path, session.get("_user_id")] + list(result["parts"])
+            etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+            last_modified = result.get("last_modified")
+
+            if _not_modified(etag, last_modified):
+                if on_not_modified:
+                    on_not_modified(result)
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            response.vary.add("Cookie")
+            return response
+        return decorated_function
+    return decorator
+
+
+def _not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def _latest(*values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+# ==========================
+# VALIDATORS
+# ==========================
+# Validators must stay cheaper than the page cache they sit in front of, so
+# they read the page's tag versions (app/pagecache.py), by primary key,
+# rather than the posts and comments on it.
+def post_validator(slug):
+    """The post's id and edit time and its tag versions, by primary key."""
+    from . import db
+    from .models import Post, ContentVersion
+
+    page, everything = aliased(ContentVersion), aliased(ContentVersion)
+    row = db.session.execute(
+        select(Post.id, Post.updated_at, page.version, page.updated_at, everything.version, everything.updated_at)
+        .select_from(Post)
+        .outerjoin(page, page.tag == f"post:{slug}")
+        .outerjoin(everything, everything.tag == EVERYTHING)
+        .where(Post.slug == slug)
+    ).first()
+    if row is None:
+        return None
+    return {
+        "parts": tuple(row),
+        "last_modified": _latest(row[1], row[3], row[5]),
+        "post_id": row[0],
+    }
+
+
+def listing_validator():
+    """The tag versions of the post listings, by primary key.
+
+    "listing" is bumped by any post or category change, published or not,
+    so every listing (filtered ones and the API's) can share it.
+    """
+    from . import db
+    from .models import ContentVersion
+
+    rows = db.session.execute(
+        select(ContentVersion.tag, ContentVersion.version, ContentVersion.updated_at)
+        .where(ContentVersion.tag.in_(("listing", EVERYTHING)))
+        .order_by(ContentVersion.tag)
+    ).all()
+    return {"parts": tuple(tuple(row) for row in rows), "last_modified": _latest(*(row[2] for row in rows))}
@@ -0,0 +1,140 @@
+import atexit
+import os
+import threading
+from collections import Counter
+
+from sqlalchemy import bindparam, func
+
+from .stats import record_post_counts
+
+
+# ==========================
+# WRITE-BEHIND VIEW COUNTER
+# ==========================
+class ViewCounter:
+    """Collects post view increments in memory and writes them in batches.
+
+    Each worker process keeps its own pending counts and flushes them as a
+    single executemany UPDATE when the flush interval elapses, when the
+    number of pending views reaches the threshold, or when the process exits.
+    Set VIEW_COUNTER_MODE = "sync" to write every view straight away.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._total = 0
+        self._pid = None
+        self._stop = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("VIEW_COUNTER_MODE", "batched")
+        app.config.setdefault("VIEW_COUNTER_FLUSH_INTERVAL", 5)
+        app.config.setdefault("VIEW_COUNTER_FLUSH_THRESHOLD", 200)
+        self.app = app
+        app.extensions["view_counter"] = self
+
+    @property
+    def batched(self):
+        return self.app.config["VIEW_COUNTER_MODE"] != "sync"
+
+    @property
+    def write_statements(self):
+        """SQL statements incr() runs in the request: none when batched,
+        else the UPDATE plus, with STATS_ENABLED, the post lookup and the
+        three rollup upserts of record_post_counts."""
+        if self.batched:
+            return 0
+        return 5 if self.app.config.get("STATS_ENABLED", True) else 1
+
+    def incr(self, post_id, n=1):
+        if not self.batched:
+            self._write({post_id: n})
+            return
+
+        self._ensure_worker()
+        with self._lock:
+            self._pending[post_id] += n
+            self._total += n
+            full = self._total >= self.app.config["VIEW_COUNTER_FLUSH_THRESHOLD"]
+        if full:
+            self.flush()
+
+    def pending(self, post_id):
+        """Views recorded by this worker that are not in the database yet."""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+            self._total = 0
+        if not batch:
+            return 0
+
+        try:
+            with self.app.app_context():
+                self._write(batch)
+        except Exception:
+            # Put the counts back so the next flush retries them
+            with self._lock:
+                self._pending.update(batch)
+                self._total += sum(batch.values())
+            self.app.logger.exception("Failed to flush %d view counts", len(batch))
+            return 0
+        return len(batch)
+
+    def _write(self, counts):
+        from . import db
+        from .models import Post
+
+        table = Post.__table__
+        stmt = (
+            table.update()
+            .where(table.c.id == bindparam("pid"))
+            # Keep updated_at as is: a view isn't an edit, and conditional
+            # responses (app/conditional.py) validate against updated_at
+            .values(views=func.coalesce(table.c.views, 0) + bindparam("n"), updated_at=table.c.updated_at)
+        )
+        rows = [{"pid": pid, "n": n} for pid, n in counts.items()]
+        with db.engine.begin() as conn:
+            conn.execute(stmt, rows)
+            if self.app.config.get("STATS_ENABLED", True):
+                record_post_counts(conn, "views", counts)
+        projection = self.app.extensions.get("post_projection")
+        if projection is not None:
+            projection.add_views(counts)
+
+    # --------------------------
+    # Background flusher
+    # --------------------------
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # Forked from a parent that already counted views: those belong
+            # to the parent, not to this worker.
+            if self._pid is not None:
+                self._pending = Counter()
+                self._total = 0
+            self._pid = pid
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="view-counter-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = self.app.config["VIEW_COUNTER_FLUSH_INTERVAL"]
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
@@ -0,0 +1,210 @@
+import os
+import time
+import weakref
+from functools import wraps
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, event, text
+
+# Engines to reset in forked children, see _dispose_after_fork
+_engines = weakref.WeakSet()
+
+
+# ==========================
+# DATABASE PROFILE
+# ==========================
+# SQLite out of the box journals with a rollback file, so a writer locks
+# out every reader, and gives up on a lock after Python's 5 s default.
+# With SQLITE_PROFILE on, every new connection switches to WAL (readers
+# and one writer run side by side), waits SQLITE_BUSY_TIMEOUT for locks,
+# fsyncs at checkpoints only (synchronous=NORMAL, still safe in WAL),
+# reads through a memory map and keeps a larger page cache. Other
+# databases get pool settings sized from DB_POOL_SIZE and friends.
+def engine_options(config):
+    """Defaults for SQLALCHEMY_ENGINE_OPTIONS for the configured database."""
+    if config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        # pysqlite's own lock wait, in seconds; the busy_timeout pragma
+        # below sets the same thing on connections made elsewhere
+        return {"connect_args": {"timeout": config["SQLITE_BUSY_TIMEOUT"] / 1000}}
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": True,  # drop connections the server closed while idle
+    }
+
+
+def sqlite_pragmas(config):
+    return {
+        "journal_mode": config["SQLITE_JOURNAL_MODE"],
+        "busy_timeout": config["SQLITE_BUSY_TIMEOUT"],
+        "synchronous": config["SQLITE_SYNCHRONOUS"],
+        "mmap_size": config["SQLITE_MMAP_SIZE"],
+        "cache_size": config["SQLITE_CACHE_SIZE"],
+        "temp_store": "memory",
+    }
+
+
+def _set_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def _dispose_after_fork():
+    # A child must not use connections opened by its parent (gunicorn with
+    # preload_app, `flask jobs worker -p N`): forget them without closing,
+    # which would close them for the parent too
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+def init_database(app):
+    """Fill in engine options; call before db.init_app()."""
+    app.config.setdefault("SQLITE_PROFILE", True)
+    app.config.setdefault("SQLITE_JOURNAL_MODE", "wal")
+    app.config.setdefault("SQLITE_BUSY_TIMEOUT", 5000)
+    app.config.setdefault("SQLITE_SYNCHRONOUS", "normal")
+    app.config.setdefault("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+    app.config.setdefault("SQLITE_CACHE_SIZE", -64 * 1024)  # negative: KiB
+    app.config.setdefault("DB_POOL_SIZE", 5)
+    app.config.setdefault("DB_MAX_OVERFLOW", 10)
+    app.config.setdefault("DB_POOL_TIMEOUT", 10)
+    app.config.setdefault("DB_POOL_RECYCLE", 1800)
+    app.config.setdefault("SQLALCHEMY_REPLICA_URI", None)
+    app.config.setdefault("DB_REPLICA_MAX_LAG", 2)
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    for name, value in engine_options(app.config).items():
+        options.setdefault(name, value)
+    if app.config["SQLALCHEMY_REPLICA_URI"]:
+        binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+        binds.setdefault(REPLICA, app.config["SQLALCHEMY_REPLICA_URI"])
+
+
+def configure_engines(app):
+    """Apply the profile to the engines db.init_app() created."""
+    from . import db
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        _engines.add(engine)
+        in_memory = engine.url.database in (None, "", ":memory:")
+        if engine.dialect.name == "sqlite" and app.config["SQLITE_PROFILE"] and not in_memory:
+            handler = _set_pragmas(sqlite_pragmas(app.config))
+            event.listen(engine, "connect", handler)
+    if app.config["SQLALCHEMY_REPLICA_URI"]:
+        ReadReplica(app)
+
+
+# ==========================
+# READ REPLICA
+# ==========================
+# With SQLALCHEMY_REPLICA_URI set, GET and HEAD requests to views marked
+# @replica_reads send their SELECTs to the replica; everything else, and
+# every write, goes to the primary. A user who just wrote (a POST, PUT or
+# DELETE that changed rows) reads from the primary for the next
+# DB_REPLICA_MAX_LAG seconds, so they see their own change even if the
+# replica hasn't caught up yet. A replica further behind than that is
+# skipped until it catches up (checked on PostgreSQL).
+REPLICA = "replica"
+STICKY_KEY = "_db_primary_until"
+
+
+def replica_reads(f):
+    """Let a read-only view's GET and HEAD requests query the replica.
+
+    Put it under the route decorator, like @query_budget.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        return f(*args, **kwargs)
+    decorated_function.replica_reads = True
+    return decorated_function
+
+
+class RoutingSession(Session):
+    """Session that sends a replica request's reads to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and has_request_context() and g.get("db_replica")):
+            return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReadReplica:
+    LAG_CHECK_INTERVAL = 5  # seconds between replica lag checks, per worker
+
+    def __init__(self, app):
+        from . import db
+
+        self.app = app
+        self.max_lag = app.config["DB_REPLICA_MAX_LAG"]
+        self.lag_checked = 0
+        self.lag_ok = True
+        with app.app_context():
+            self.engine = db.engines[REPLICA]
+            primary = db.engine
+        app.extensions["read_replica"] = self
+        app.before_request(self._route)
+        app.after_request(self._stick)
+        if not event.contains(primary, "before_cursor_execute", _note_write):
+            event.listen(primary, "before_cursor_execute", _note_write)
+
+    def _route(self):
+        view = self.app.view_functions.get(request.endpoint)
+        g.db_replica = (
+            getattr(view, "replica_reads", False)
+            and request.method in ("GET", "HEAD")
+            and session.get(STICKY_KEY, 0) < time.time()
+            and self.healthy()
+        )
+
+    def _stick(self, response):
+        # Writes on GET (sync view counting) are the reader's own business
+        # and don't need read-your-writes
+        if g.get("db_wrote") and request.method not in ("GET", "HEAD"):
+            session[STICKY_KEY] = time.time() + self.max_lag
+        return response
+
+    def healthy(self):
+        now = time.monotonic()
+        if now - self.lag_checked >= self.LAG_CHECK_INTERVAL:
+            self.lag_checked = now
+            try:
+                lag = replica_lag(self.engine)
+            except Exception:
+                self.app.logger.exception("Checking the read replica failed, reading from the primary")
+                lag = None
+            self.lag_ok = lag is not None and lag <= self.max_lag
+            if lag is not None and not self.lag_ok:
+                self.app.logger.warning("Read replica is %.1f s behind, reading from the primary", lag)
+        return self.lag_ok
+
+
+def replica_lag(engine):
+    """Seconds the replica is behind its primary, 0 where it can't tell."""
+    if engine.dialect.name != "postgresql":
+        return 0
+    with engine.connect() as conn:
+        # An idle primary sends nothing to replay: caught up, not behind
+        return conn.scalar(text(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+            " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"))
+
+
+def _note_write(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        g.db_wrote = True
@@ -0,0 +1,219 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+
+from .jobs import task
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it pages use the original
+    Image = None
+
+# Derivative name -> target width in pixels
+SIZES = {"thumb": 320, "card": 800, "full": 1600}
+SOURCE_EXTS = {"jpg", "jpeg", "png"}
+
+
+def derivative_name(filename, size, webp=False):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{size}{'.webp' if webp else ext}"
+
+
+# ==========================
+# RESPONSIVE IMAGE DERIVATIVES
+# ==========================
+class ImageDerivatives:
+    """Builds resized copies of uploaded images in a background thread pool.
+
+    Each upload gets thumb/card/full widths in its own format plus WebP,
+    written next to the original as ``<name>.<size><ext>``. Templates ask
+    ``srcset()`` for whatever exists so far and fall back to the original
+    until the derivatives are ready.
+
+    Only widths below the original's are built, so the original itself is
+    always the widest candidate in a srcset.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._ready = set()
+        self._widths = {}  # original filename -> its width in pixels
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("IMAGE_DERIVATIVES_ENABLED", True)
+        app.config.setdefault("IMAGE_WORKERS", 2)
+        app.config.setdefault("IMAGE_DERIVATIVES_MODE", "thread")
+        self.app = app
+        app.extensions["image_derivatives"] = self
+        app.cli.add_command(images_cli)
+
+    @property
+    def enabled(self):
+        return Image is not None and self.app.config["IMAGE_DERIVATIVES_ENABLED"]
+
+    def folder(self):
+        return os.path.join(self.app.static_folder, "uploads", "media")
+
+    def _pool(self):
+        # One pool per worker process; a pool inherited across fork has no threads
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self._executor = ThreadPoolExecutor(self.app.config["IMAGE_WORKERS"], thread_name_prefix="image-derivatives")
+                self._pid = pid
+            return self._executor
+
+    def submit(self, filename):
+        if not filename or not self.enabled or filename.rsplit(".", 1)[-1].lower() not in SOURCE_EXTS:
+            return None
+        if self.app.config["IMAGE_DERIVATIVES_MODE"] == "queue":
+            # Survives restarts and runs in `flask jobs worker`, not the web worker
+            from . import job_queue
+            return job_queue.enqueue("images.generate", args=(filename,))
+        return self._pool().submit(self._generate_logged, filename)
+
+    def _generate_logged(self, filename):
+        try:
+            return self.generate(filename)
+        except Exception:
+            self.app.logger.exception("Could not build image derivatives for %s", filename)
+
+    def generate(self, filename):
+        folder = self.folder()
+        with Image.open(os.path.join(folder, filename)) as source:
+            image = ImageOps.exif_transpose(source)
+            fmt = source.format
+            self._widths[filename] = image.width
+            written = []
+            for size, width in SIZES.items():
+                if image.width <= width:
+                    continue
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.LANCZOS)
+                # WebP first: srcset() treats a size as ready once the
+                # original-format file exists
+                for webp in (True, False):
+                    self._save(resized, os.path.join(folder, derivative_name(filename, size, webp)), "WEBP" if webp else fmt)
+                    written.append(derivative_name(filename, size, webp))
+        return written
+
+    def _save(self, image, path, fmt):
+        if fmt == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif fmt == "WEBP" and image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        options = {
+            "JPEG": {"quality": 82, "optimize": True, "progressive": True},
+            "WEBP": {"quality": 80, "method": 4},
+            "PNG": {"optimize": True},
+        }.get(fmt, {})
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        os.close(fd)
+        try:
+            image.save(tmp, fmt, **options)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def original_width(self, filename):
+        """The original's width as shown (EXIF rotation applied), or None."""
+        if filename not in self._widths:
+            if Image is None:
+                return None
+            try:
+                # Only reads the header, not the pixels
+                with Image.open(os.path.join(self.folder(), filename)) as image:
+                    width, height = image.size
+                    if image.getexif().get(0x0112) in (5, 6, 7, 8):  # rotated a quarter turn
+                        width = height
+            except OSError:
+                return None
+            self._widths[filename] = width
+        return self._widths[filename]
+
+    def forget(self, filename):
+        """Drop what is remembered about ``filename`` once it is deleted."""
+        self._widths.pop(filename, None)
+        for size in SIZES:
+            self._ready.discard(derivative_name(filename, size))
+
+    # --------------------------
+    # Template helper
+    # --------------------------
+    def srcset(self, filename):
+        """Widths available for an image, e.g. for <img srcset>.
+
+        Returns ``{"src", "srcset", "webp_srcset"}``; the two srcsets are
+        empty while derivatives are missing, so callers just use ``src``.
+        Both end with the original at its own width: with w-descriptors the
+        browser ignores ``src``, and WebP copies exist only for smaller sizes.
+        """
+        src = url_for("blog.media", filename=filename)
+        out = {"src": src, "srcset": "", "webp_srcset": ""}
+        if filename.rsplit(".", 1)[-1].lower() not in SOURCE_EXTS:
+            return out
+
+        folder = self.folder()
+        plain, webp = [], []
+        for size, width in sorted(SIZES.items(), key=lambda item: item[1]):
+            name = derivative_name(filename, size)
+            if name in self._ready or os.path.exists(os.path.join(folder, name)):
+                self._ready.add(name)
+                plain.append(f"{url_for('blog.media', filename=name)} {width}w")
+                webp.append(f"{url_for('blog.media', filename=derivative_name(filename, size, True))} {width}w")
+        width = self.original_width(filename) if plain else None
+        if width:
+            plain.append(f"{src} {width}w")
+            webp.append(f"{src} {width}w")
+            out["srcset"] = ", ".join(plain)
+            out["webp_srcset"] = ", ".join(webp)
+        return out
+
+
+@task("images.generate", queue="media", max_attempts=3)
+def generate_task(filename):
+    images = current_app.extensions["image_derivatives"]
+    if images.enabled and os.path.exists(os.path.join(images.folder(), filename)):
+        images.generate(filename)
+
+
+# ==========================
+# CLI: flask images generate
+# ==========================
+images_cli = AppGroup("images", help="Manage responsive image derivatives.")
+
+
+@images_cli.command("generate")
+@click.option("--force", is_flag=True, help="Rebuild derivatives that already exist.")
+def generate_command(force):
+    """Build derivatives for every uploaded image (run after deploying)."""
+    images = current_app.extensions["image_derivatives"]
+    if not images.enabled:
+        raise click.ClickException("Pillow is not installed or IMAGE_DERIVATIVES_ENABLED is off.")
+
+    folder = images.folder()
+    sizes = tuple(f".{size}" for size in SIZES)
+    done = 0
+    for name in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower().lstrip(".") not in SOURCE_EXTS or stem.endswith(sizes):
+            continue
+        if not force and os.path.exists(os.path.join(folder, derivative_name(name, "thumb"))):
+            continue
+        try:
+            images.generate(name)
+            done += 1
+        except Exception as exc:
+            click.echo(f"Skipping {name}: {exc}")
+    click.echo(f"Built derivatives for {done} images.")
@@ -0,0 +1,313 @@
+import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, func, or_, select, update
+
+# Task name -> {"fn", "queue", "priority", "max_attempts", "timeout"}
+TASKS = {}
+
+
+def task(name, queue="default", priority=0, max_attempts=None, timeout=None):
+    """Register a function as a background task under ``name``.
+
+    Arguments must be JSON-serialisable; the function runs inside an app
+    context in a `flask jobs worker` process. ``timeout`` is the visibility
+    timeout in seconds: a job still running after it is handed to another
+    worker, so tasks should be safe to run twice.
+    """
+    def decorator(f):
+        TASKS[name] = {"fn": f, "queue": queue, "priority": priority,
+                       "max_attempts": max_attempts, "timeout": timeout}
+        return f
+    return decorator
+
+
+# ==========================
+# PERSISTENT JOB QUEUE
+# ==========================
+class JobQueue:
+    """Background jobs stored in the app database (the ``job`` table).
+
+    enqueue() adds a row to the caller's session, so a job only exists once
+    the request that created it commits. Workers claim one job at a time
+    with a conditional UPDATE and hold it for the task's visibility timeout;
+    failures are retried with exponential backoff until max_attempts.
+    Set JOB_QUEUE_EAGER = True to run tasks inline instead (no worker).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("JOB_QUEUE_EAGER", False)
+        app.config.setdefault("JOB_MAX_ATTEMPTS", 5)
+        app.config.setdefault("JOB_VISIBILITY_TIMEOUT", 300)
+        app.config.setdefault("JOB_RETRY_BACKOFF", 10)
+        app.config.setdefault("JOB_RETRY_BACKOFF_MAX", 3600)
+        app.config.setdefault("JOB_POLL_INTERVAL", 1.0)
+        self.app = app
+        app.extensions["job_queue"] = self
+        app.cli.add_command(jobs_cli)
+
+    def enqueue(self, name, args=(), kwargs=None, priority=None, delay=0, queue=None, max_attempts=None):
+        """Queue ``name(*args, **kwargs)`` and return the Job.
+
+        The job is added to db.session and becomes visible to workers when
+        that session commits.
+        """
+        from . import db
+        from .models import Job
+
+        if name not in TASKS:
+            raise ValueError(f"Unknown task {name!r}")
+        spec = TASKS[name]
+        payload = json.dumps({"args": list(args), "kwargs": kwargs or {}})
+
+        if self.app.config["JOB_QUEUE_EAGER"]:
+            spec["fn"](*args, **(kwargs or {}))
+            return None
+
+        job = Job(
+            queue=queue or spec["queue"],
+            task=name,
+            payload=payload,
+            priority=spec["priority"] if priority is None else priority,
+            max_attempts=max_attempts or spec["max_attempts"] or self.app.config["JOB_MAX_ATTEMPTS"],
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+        )
+        db.session.add(job)
+        return job
+
+    # --------------------------
+    # Worker side
+    # --------------------------
+    def claim(self, queues, worker_id):
+        """Take the next runnable job, or return None.
+
+        Runnable means queued and due, or running with an expired lease (its
+        worker died). The select and the claiming UPDATE are separate short
+        transactions; the UPDATE repeats the conditions, so when two workers
+        pick the same row only one of them gets it.
+        """
+        from . import db
+        from .models import Job
+
+        table = Job.__table__
+        for _ in range(5):
+            now = datetime.utcnow()
+            runnable = and_(
+                table.c.queue.in_(queues),
+                table.c.run_at <= now,
+                or_(table.c.status == "queued",
+                    and_(table.c.status == "running", table.c.locked_until < now)),
+            )
+            with db.engine.begin() as conn:
+                row = conn.execute(
+                    select(table.c.id, table.c.task, table.c.payload, table.c.attempts, table.c.max_attempts)
+                    .where(runnable)
+                    .order_by(table.c.priority.desc(), table.c.run_at, table.c.id)
+                    .limit(1)
+                ).first()
+            if row is None:
+                return None
+
+            timeout = (TASKS.get(row.task) or {}).get("timeout") or self.app.config["JOB_VISIBILITY_TIMEOUT"]
+            with db.engine.begin() as conn:
+                claimed = conn.execute(
+                    update(table)
+                    .where(table.c.id == row.id, table.c.attempts == row.attempts, runnable)
+                    .values(status="running", attempts=table.c.attempts + 1, locked_by=worker_id,
+                            locked_until=now + timedelta(seconds=timeout))
+                ).rowcount
+            if not claimed:
+                continue  # Another worker won the race
+
+            attempt = row.attempts + 1
+            if attempt > row.max_attempts:
+                # Only reachable when the previous holder died mid-run
+                self._finish(row.id, worker_id, attempt, "failed",
+                             last_error="Visibility timeout expired on the last attempt")
+                continue
+            return {"id": row.id, "task": row.task, "payload": row.payload,
+                    "attempt": attempt, "max_attempts": row.max_attempts}
+        return None
+
+    def run(self, job, worker_id):
+        """Run a claimed job and record the outcome. Returns True on success."""
+        spec = TASKS.get(job["task"])
+        try:
+            if spec is None:
+                raise LookupError(f"Unknown task {job['task']!r}")
+            payload = json.loads(job["payload"])
+            # A fresh app context per job, so each gets its own db.session
+            with self.app.app_context():
+                spec["fn"](*payload["args"], **payload["kwargs"])
+        except Exception:
+            error = traceback.format_exc()
+            self.app.logger.warning("Job %s (%s) attempt %d/%d failed:\n%s", job["id"], job["task"],
+                                    job["attempt"], job["max_attempts"], error)
+            if job["attempt"] >= job["max_attempts"]:
+                self._finish(job["id"], worker_id, job["attempt"], "failed", last_error=error)
+            else:
+                self._finish(job["id"], worker_id, job["attempt"], "queued", last_error=error,
+                             run_at=datetime.utcnow() + timedelta(seconds=self.backoff(job["attempt"])))
+            return False
+        self._finish(job["id"], worker_id, job["attempt"], "done")
+        return True
+
+    def backoff(self, attempt):
+        """Seconds before retrying after ``attempt`` failed: exponential, jittered."""
+        delay = min(self.app.config["JOB_RETRY_BACKOFF"] * 2 ** (attempt - 1), self.app.config["JOB_RETRY_BACKOFF_MAX"])
+        return delay * random.uniform(0.75, 1.25)
+
+    def _finish(self, job_id, worker_id, attempt, status, **values):
+        from . import db
+        from .models import Job
+
+        table = Job.__table__
+        if status in ("done", "failed"):
+            values["finished_at"] = datetime.utcnow()
+        with db.engine.begin() as conn:
+            # Guarded on our lease: if it expired and another worker took the
+            # job, that worker owns the outcome
+            conn.execute(
+                update(table)
+                .where(table.c.id == job_id, table.c.locked_by == worker_id, table.c.attempts == attempt)
+                .values(status=status, locked_by=None, locked_until=None, **values)
+            )
+
+    def work(self, queues=("default",), burst=False, max_jobs=None):
+        """Process jobs until SIGTERM/SIGINT (or, with ``burst``, until idle)."""
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        stopping = []
+        if threading.current_thread() is threading.main_thread():
+            # Finish the current job, then exit
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda *_: stopping.append(True))
+
+        done = 0
+        with self.app.app_context():
+            while not stopping and (max_jobs is None or done < max_jobs):
+                job = self.claim(list(queues), worker_id)
+                if job is None:
+                    if burst:
+                        break
+                    time.sleep(self.app.config["JOB_POLL_INTERVAL"])
+                    continue
+                self.run(job, worker_id)
+                done += 1
+        return done
+
+
+# ==========================
+# BUILT-IN TASKS
+# ==========================
+@task("mail.send", queue="mail", max_attempts=8)
+def send_mail(subject, recipients, body, html=None, sender=None):
+    """Send an email through Flask-Mail, e.g.
+    ``job_queue.enqueue("mail.send", kwargs={"subject": ..., "recipients": [...], "body": ...})``."""
+    from flask_mail import Message
+    from . import mail
+
+    mail.send(Message(subject, recipients=recipients, body=body, html=html, sender=sender))
+
+
+# ==========================
+# CLI: flask jobs
+# ==========================
+jobs_cli = AppGroup("jobs", help="Run and inspect background jobs.")
+
+
+def _work_in_child(app, queues, burst):
+    # Connections inherited from the parent were already dropped after the
+    # fork, see app/database.py
+    app.extensions["job_queue"].work(queues, burst=burst)
+
+
+@jobs_cli.command("worker")
+@click.option("--queue", "-q", "queues", multiple=True, default=["default", "mail", "media"], show_default=True,
+              help="Queue to take jobs from (repeatable).")
+@click.option("--processes", "-p", default=1, show_default=True, help="Worker processes to run.")
+@click.option("--burst", is_flag=True, help="Exit once the queues are empty.")
+def worker_command(queues, processes, burst):
+    """Run background jobs until stopped."""
+    app = current_app._get_current_object()
+    queue = app.extensions["job_queue"]
+    if processes <= 1:
+        done = queue.work(queues, burst=burst)
+        click.echo(f"Worker stopped after {done} jobs.")
+        return
+
+    context = multiprocessing.get_context("fork")
+    children = [context.Process(target=_work_in_child, args=(app, queues, burst)) for _ in range(processes)]
+    for child in children:
+        child.start()
+
+    def stop(*_):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for child in children:
+        child.join()
+
+
+@jobs_cli.command("status")
+def status_command():
+    """Show job counts per queue and status."""
+    from . import db
+    from .models import Job
+
+    rows = db.session.execute(
+        select(Job.queue, Job.status, func.count(Job.id)).group_by(Job.queue, Job.status).order_by(Job.queue, Job.status)
+    ).all()
+    if not rows:
+        click.echo("No jobs.")
+    for queue, status, count in rows:
+        click.echo(f"{queue:<12} {status:<8} {count}")
+
+
+@jobs_cli.command("retry")
+@click.argument("job_ids", nargs=-1, type=int)
+def retry_command(job_ids):
+    """Requeue failed jobs (all of them, or the given ids)."""
+    from . import db
+    from .models import Job
+
+    stmt = update(Job).where(Job.status == "failed")
+    if job_ids:
+        stmt = stmt.where(Job.id.in_(job_ids))
+    count = db.session.execute(
+        stmt.values(status="queued", attempts=0, run_at=datetime.utcnow(), finished_at=None)
+    ).rowcount
+    db.session.commit()
+    click.echo(f"Requeued {count} jobs.")
+
+
+@jobs_cli.command("purge")
+@click.option("--days", default=7, show_default=True, help="Delete finished jobs older than this.")
+def purge_command(days):
+    """Delete old done and failed jobs."""
+    from . import db
+    from .models import Job
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    count = db.session.execute(
+        Job.__table__.delete().where(Job.status.in_(("done", "failed")), Job.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    click.echo(f"Deleted {count} finished jobs.")
@@ -0,0 +1,105 @@
+from sqlalchemy import func, literal, select, union_all
+
+from . import db
+from .pagecache import invalidate_on_commit
+from .projection import refresh_on_commit
+from .stats import record_post_counts
+
+
+# ==========================
+# LIKE ENGINE
+# ==========================
+# A like is a row in post_like/comment_like (unique per user and target)
+# plus a denormalised counter on the target. Both change in the caller's
+# transaction: the row with an insert-or-ignore / delete, the counter with
+# an UPDATE relative to its current value, and only when the row actually
+# changed. Concurrent likes therefore never lose counts, and repeating a
+# like or unlike is a no-op.
+def _kinds():
+    from .models import Post, Comment, PostLike, CommentLike
+
+    return {
+        "post": (PostLike.__table__, Post.__table__, "post_id"),
+        "comment": (CommentLike.__table__, Comment.__table__, "comment_id"),
+    }
+
+
+def _insert_ignore(table, values):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        exists = db.session.execute(
+            select(table.c.id).where(*[table.c[k] == v for k, v in values.items()])).first()
+        if exists:
+            return 0
+        return db.session.execute(table.insert().values(values)).rowcount
+    return db.session.execute(insert(table).values(values).on_conflict_do_nothing()).rowcount
+
+
+def set_like(kind, target_id, user_id, liked=True):
+    """Like (or with ``liked=False`` unlike) a post or comment.
+
+    Returns ``(changed, count)``: whether the user's state changed and the
+    target's like count afterwards. The caller commits.
+    """
+    likes, target, column = _kinds()[kind]
+    values = {"user_id": user_id, column: target_id}
+    if liked:
+        changed = _insert_ignore(likes, values)
+    else:
+        changed = db.session.execute(
+            likes.delete().where(likes.c.user_id == user_id, likes.c[column] == target_id)).rowcount
+
+    if changed:
+        delta = 1 if liked else -1
+        db.session.execute(
+            target.update()
+            .where(target.c.id == target_id)
+            # A like isn't an edit: keep updated_at, which the conditional
+            # GET validators read (the post's content version covers likes)
+            .values(likes=func.coalesce(target.c.likes, 0) + delta, updated_at=target.c.updated_at)
+        )
+        if kind == "post":
+            record_post_counts(db.session.connection(), "likes", {target_id: delta})
+        _invalidate(kind, target_id)
+
+    count = db.session.execute(select(target.c.likes).where(target.c.id == target_id)).scalar()
+    return bool(changed), count or 0
+
+
+def _invalidate(kind, target_id):
+    # These are Core statements, so the page cache's and the projection's
+    # flush hooks can't see them
+    from .models import Post, Comment
+
+    stmt = select(Post.id, Post.slug)
+    if kind == "post":
+        stmt = stmt.where(Post.id == target_id)
+    else:
+        stmt = stmt.join(Comment, Comment.post_id == Post.id).where(Comment.id == target_id)
+    row = db.session.execute(stmt).first()
+    if row:
+        invalidate_on_commit(db.session, f"post:{row.slug}")
+        refresh_on_commit(db.session, row.id)
+
+
+def liked_ids(user_id, post_ids=(), comment_ids=()):
+    """Which of the given posts and comments ``user_id`` has liked, in one
+    query. Returns ``{"posts": set(...), "comments": set(...)}``."""
+    kinds = _kinds()
+    selects = []
+    for kind, ids in (("post", post_ids), ("comment", comment_ids)):
+        if ids:
+            likes, _, column = kinds[kind]
+            selects.append(
+                select(literal(kind).label("kind"), likes.c[column].label("target_id"))
+                .where(likes.c.user_id == user_id, likes.c[column].in_(list(ids)))
+            )
+    found = {"posts": set(), "comments": set()}
+    if selects:
+        for kind, target_id in db.session.execute(union_all(*selects) if len(selects) > 1 else selects[0]):
+            found[kind + "s"].add(target_id)
+    return found
@@ -0,0 +1,352 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import Request, current_app, has_app_context, send_from_directory, abort
+from flask.cli import AppGroup
+from sqlalchemy import and_, bindparam, event, func, inspect, select
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 1024 * 1024
+# Content-hashed uploads and their resized copies (app/images.py)
+HASHED_NAME_RE = re.compile(r"^[0-9a-f]{32}(\.(thumb|card|full))?\.[A-Za-z0-9]+$")
+ONE_YEAR = 365 * 24 * 3600
+
+
+# ==========================
+# UPLOAD STORAGE
+# ==========================
+# Uploads are content-addressed: the stored name is the first 32 hex digits
+# of the file's sha256 plus its extension, so re-uploading the same bytes
+# reuses the existing file. MediaBlob rows count how many posts use each
+# file; the file is removed when the last one goes (see _adjust_refs).
+#
+# An upload stays in the staging folder until the transaction that records
+# it commits, and is deleted if it rolls back, so a failed post leaves no
+# file behind. Garbage collection skips blobs claimed within MEDIA_GC_GRACE
+# seconds: a post that is about to reference an unused file keeps it.
+EXT_ALIASES = {".jpeg": ".jpg"}
+
+
+def media_folder():
+    return os.path.join(current_app.static_folder, "uploads", "media")
+
+
+def staging_folder():
+    return os.path.join(media_folder(), ".incoming")
+
+
+class HashingUpload:
+    """File stream for multipart uploads that hashes as it is written.
+
+    Werkzeug writes each uploaded file into this while parsing the request
+    body chunk by chunk, so the upload goes straight to a staging file on
+    the same filesystem as the media folder, already hashed, and
+    save_upload() only has to rename it into place.
+    """
+
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=folder, suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self.claimed = False
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self):
+        self._file.close()
+        if not self.claimed:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename:
+            return HashingUpload(staging_folder())
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def save_upload(file):
+    """Store an uploaded file by content and return its media filename.
+
+    Returns None for an empty or nameless upload. The caller attaches the
+    name to a post; the reference count follows from that in the session
+    hooks below. The file is moved into the media folder once the session
+    commits (see _publish_uploads).
+    """
+    from . import db
+    from .models import MediaBlob
+
+    if not secure_filename(file.filename or ""):
+        return None
+    ext = os.path.splitext(secure_filename(file.filename))[1].lower()
+    ext = EXT_ALIASES.get(ext, ext)
+
+    stream = file.stream
+    if not isinstance(stream, HashingUpload):
+        # Not parsed through UploadRequest: copy it into a staging file
+        staged = HashingUpload(staging_folder())
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            staged.write(chunk)
+        stream = staged
+    if not stream.size:
+        stream.close()
+        return None
+
+    digest = stream.hexdigest()
+    filename = f"{digest[:32]}{ext}"
+    stream.flush()
+    stream.claimed = True
+    stream.close()
+    pending = db.session.info.setdefault("pending_media", {})
+    if filename in pending:
+        os.unlink(stream.path)  # Same bytes twice in one transaction
+    else:
+        pending[filename] = stream.path
+    MediaBlob.ensure(db.session, digest, filename, stream.size)
+    return filename
+
+
+def _publish_uploads(session):
+    """after_commit: move this transaction's uploads into the media folder."""
+    pending = session.info.pop("pending_media", None)
+    if not pending:
+        return
+    from . import image_derivatives
+
+    folder = media_folder()
+    for filename, staged in pending.items():
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.unlink(staged)  # Same bytes already stored
+        else:
+            os.replace(staged, path)
+            image_derivatives.submit(filename)
+
+
+def _discard_uploads(session, transaction):
+    """after_transaction_end: uploads still pending were never committed
+    (rolled back, or the session closed on an error), drop them."""
+    if transaction.parent is not None:
+        return
+    for staged in session.info.pop("pending_media", {}).values():
+        try:
+            os.unlink(staged)
+        except OSError:
+            pass
+
+
+def _adjust_refs(session, flush_context):
+    """after_flush: count posts gaining or losing a media file."""
+    from .models import Post, MediaBlob
+
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Post) and obj.media_filename:
+            deltas[obj.media_filename] = deltas.get(obj.media_filename, 0) + 1
+    for obj in session.deleted:
+        if isinstance(obj, Post) and obj.media_filename:
+            deltas[obj.media_filename] = deltas.get(obj.media_filename, 0) - 1
+    for obj in session.dirty:
+        if isinstance(obj, Post):
+            history = inspect(obj).attrs.media_filename.history
+            for name in history.added:
+                if name:
+                    deltas[name] = deltas.get(name, 0) + 1
+            for name in history.deleted:
+                if name:
+                    deltas[name] = deltas.get(name, 0) - 1
+
+    deltas = {name: n for name, n in deltas.items() if n}
+    if not deltas:
+        return
+    table = MediaBlob.__table__
+    session.connection().execute(
+        table.update()
+        .where(table.c.filename == bindparam("name"))
+        .values(ref_count=table.c.ref_count + bindparam("delta")),
+        [{"name": name, "delta": n} for name, n in deltas.items()],
+    )
+    released = [name for name, n in deltas.items() if n < 0]
+    if released:
+        session.info.setdefault("released_media", set()).update(released)
+
+
+def _collect_released(session):
+    """after_commit: delete files no post references any more."""
+    names = session.info.pop("released_media", None)
+    if names and has_app_context():
+        collect_garbage(names)
+
+
+def _forget_released(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("released_media", None)
+
+
+def collect_garbage(names=None):
+    """Delete unreferenced blobs (all of them, or just ``names``) and their
+    derivative images, except those claimed within MEDIA_GC_GRACE.
+    Returns the filenames removed."""
+    from . import db
+    from .models import MediaBlob
+    from .images import SIZES, derivative_name
+
+    table = MediaBlob.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config["MEDIA_GC_GRACE"])
+    unused = and_(table.c.ref_count <= 0, func.coalesce(table.c.claimed_at, table.c.created_at) < cutoff)
+    removed = []
+    with db.engine.begin() as conn:
+        stmt = select(table.c.filename).where(unused)
+        if names is not None:
+            stmt = stmt.where(table.c.filename.in_(names))
+        for (name,) in conn.execute(stmt).fetchall():
+            # Re-check in the DELETE so a post that just picked the file up keeps it
+            deleted = conn.execute(table.delete().where(table.c.filename == name, unused)).rowcount
+            if deleted:
+                removed.append(name)
+
+    folder = media_folder()
+    images = current_app.extensions.get("image_derivatives")
+    for name in removed:
+        if images is not None:
+            images.forget(name)
+        for victim in [name] + [derivative_name(name, size, webp) for size in SIZES for webp in (False, True)]:
+            try:
+                os.unlink(os.path.join(folder, victim))
+            except OSError:
+                pass
+    return removed
+
+
+def collect_orphans():
+    """Delete content-hashed files in the media folder that no MediaBlob
+    row owns (and their derivatives), once older than MEDIA_GC_GRACE.
+    Files under other names predate hashing and are left alone."""
+    from . import db
+    from .models import MediaBlob
+
+    owned = {name.split(".", 1)[0] for name in db.session.scalars(select(MediaBlob.filename))}
+    cutoff = time.time() - current_app.config["MEDIA_GC_GRACE"]
+    removed = []
+    with os.scandir(media_folder()) as entries:
+        for item in entries:
+            if (item.is_file() and HASHED_NAME_RE.search(item.name)
+                    and item.name.split(".", 1)[0] not in owned and item.stat().st_mtime < cutoff):
+                try:
+                    os.unlink(item.path)
+                    removed.append(item.name)
+                except OSError:
+                    pass
+    return removed
+
+
+# ==========================
+# DELIVERY
+# ==========================
+def send_media(filename):
+    """Serve an upload with Range support, long-lived caching and optional
+    hand-off to the front proxy (MEDIA_OFFLOAD)."""
+    if secure_filename(filename) != filename:
+        abort(404)
+    folder = media_folder()
+    if not os.path.isfile(os.path.join(folder, filename)):
+        # Uploads from before media/ existed live directly in uploads/
+        folder = os.path.dirname(folder)
+        if not os.path.isfile(os.path.join(folder, filename)):
+            abort(404)
+
+    immutable = bool(HASHED_NAME_RE.search(filename))
+    max_age = ONE_YEAR if immutable else current_app.config["MEDIA_MAX_AGE"]
+
+    if current_app.config["MEDIA_OFFLOAD"] == "x-accel-redirect":
+        # nginx serves the bytes, Ranges and validators from an internal
+        # location mapped onto the uploads folder
+        location = current_app.config["MEDIA_ACCEL_PREFIX"].rstrip("/")
+        if folder == media_folder():
+            location += "/media"
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        response.headers["X-Accel-Redirect"] = f"{location}/{filename}"
+        response.cache_control.max_age = max_age
+    else:
+        # conditional=True answers Range with 206 and If-None-Match with 304;
+        # under gunicorn the body goes out via wsgi.file_wrapper (sendfile).
+        # MEDIA_OFFLOAD = "x-sendfile" sets Flask's USE_X_SENDFILE instead.
+        response = send_from_directory(folder, filename, max_age=max_age, conditional=True)
+
+    response.headers["Accept-Ranges"] = "bytes"
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+def media_kind(filename):
+    ext = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    if ext in ("mp4", "webm"):
+        return "video"
+    if ext in ("mp3", "wav", "m4a", "ogg"):
+        return "audio"
+    return "image"
+
+
+# ==========================
+# SETUP + CLI: flask media gc
+# ==========================
+def init_media(app):
+    app.config.setdefault("MEDIA_GC_GRACE", 3600)
+    app.request_class = UploadRequest
+    app.cli.add_command(media_cli)
+    for name, fn in (("after_flush", _adjust_refs), ("after_commit", _publish_uploads),
+                     ("after_commit", _collect_released), ("after_soft_rollback", _forget_released),
+                     ("after_transaction_end", _discard_uploads)):
+        if not event.contains(Session, name, fn):
+            event.listen(Session, name, fn)
+
+
+media_cli = AppGroup("media", help="Manage uploaded media files.")
+
+
+@media_cli.command("gc")
+@click.option("--staging-age", default=3600, help="Remove staged uploads older than this many seconds.")
+def gc_command(staging_age):
+    """Delete media no post uses any more, files no blob row owns and
+    abandoned staged uploads."""
+    removed = collect_garbage()
+    orphans = collect_orphans()
+    stale = 0
+    folder = staging_folder()
+    if os.path.isdir(folder):
+        cutoff = time.time() - staging_age
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                stale += 1
+    click.echo(f"Removed {len(removed)} unreferenced files, {len(orphans)} files without a blob row "
+               f"and {stale} stale staged uploads.")
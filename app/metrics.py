@@ -0,0 +1,274 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+
+try:
+    import fcntl
+except ImportError:  # Windows: slots are claimed without a file lock
+    fcntl = None
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf)  # seconds
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+CACHES = ("page", "count")
+UNMATCHED = "unmatched"  # requests no route matched (404s, 405s)
+
+PID = struct.Struct("q")
+DOUBLE = struct.Struct("d")
+
+
+# ==========================
+# SHARED METRICS FILE
+# ==========================
+# Gunicorn runs several worker processes, so counters kept in one worker's
+# memory only ever show a slice of the traffic. Instead all workers on a
+# host map the same file, METRICS_DIR/metrics-<layout>.bin, which holds
+# METRICS_SLOTS slots of doubles. A worker claims a free slot (or one whose
+# process is gone) once, under a file lock, and from then on only adds to
+# its own slot: no other process writes there, so recording takes no
+# cross-process lock. The exporter sums the slots.
+#
+# Which double means what (the layout) follows from the app's endpoints
+# and database binds, so every worker of one deploy agrees on it; a
+# deploy that changes it gets a file of its own.
+class Metrics:
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._slot = None
+        self._index = None
+        self._mm = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault("METRICS_ENABLED", True)
+        app.config.setdefault("METRICS_DIR", None)
+        app.config.setdefault("METRICS_SLOTS", 64)
+        app.config.setdefault("METRICS_TOKEN", None)
+        app.extensions["metrics"] = self
+        if not app.config["METRICS_ENABLED"]:
+            return
+        app.before_request(self._start)
+        app.after_request(self._record)
+        from . import db
+
+        with app.app_context():
+            engines = dict(db.engines)
+        for key, engine in engines.items():
+            self.watch_engine(engine, "default" if key is None else key)
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config["METRICS_ENABLED"]
+
+    # --------------------------
+    # Layout and slots
+    # --------------------------
+    def _keys(self):
+        from . import db
+
+        with self.app.app_context():
+            binds = sorted("default" if key is None else key for key in db.engines)
+        keys = []
+        for endpoint in sorted(self.app.view_functions) + [UNMATCHED]:
+            keys += [("requests", endpoint, status) for status in STATUS_CLASSES]
+            keys += [("bucket", endpoint, le) for le in BUCKETS]
+            keys.append(("seconds", endpoint))
+        for bind in binds:
+            keys += [("pool_in_use", bind), ("pool_checkouts", bind)]
+        for cache in CACHES:
+            keys += [("cache", cache, "hit"), ("cache", cache, "miss")]
+        return keys
+
+    def _open(self):
+        keys = self._keys()
+        index = {key: i for i, key in enumerate(keys)}
+        layout = hashlib.sha1(repr(keys).encode()).hexdigest()[:12]
+        slot_size = PID.size + DOUBLE.size * len(keys)
+        size = slot_size * self.app.config["METRICS_SLOTS"]
+        folder = self.app.config["METRICS_DIR"] or os.path.join(self.app.instance_path, "metrics")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"metrics-{layout}.bin")
+        with open(path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if os.path.getsize(path) < size:
+                    f.truncate(size)  # zero-filled
+                mm = mmap.mmap(f.fileno(), size)
+                slot = self._claim(mm, slot_size, index)
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return mm, slot, index
+
+    def _claim(self, mm, slot_size, index):
+        for slot in range(0, len(mm), slot_size):
+            owner = PID.unpack_from(mm, slot)[0]
+            if owner and _alive(owner):
+                continue
+            # Counters carry on from the last owner's totals; gauges start over
+            PID.pack_into(mm, slot, os.getpid())
+            for key, i in index.items():
+                if key[0] == "pool_in_use":
+                    DOUBLE.pack_into(mm, slot + PID.size + i * DOUBLE.size, 0.0)
+            return slot
+        self.app.logger.warning("All %d metrics slots are taken, this process isn't counted",
+                                self.app.config["METRICS_SLOTS"])
+        return None
+
+    def _ensure_slot(self):
+        # Once per process; a forked child claims a slot of its own
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._mm, self._slot, self._index = self._open()
+                    self._pid = pid
+        return self._slot
+
+    def add(self, key, value=1.0):
+        if not self.enabled:
+            return
+        slot = self._ensure_slot()
+        i = self._index.get(key)
+        if slot is None or i is None:
+            return
+        offset = slot + PID.size + i * DOUBLE.size
+        # Only this process writes here; the lock is for its own threads
+        with self._lock:
+            DOUBLE.pack_into(self._mm, offset, DOUBLE.unpack_from(self._mm, offset)[0] + value)
+
+    def cache(self, name, hit):
+        self.add(("cache", name, "hit" if hit else "miss"))
+
+    # --------------------------
+    # Recording requests
+    # --------------------------
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+
+    def _record(self, response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        took = time.perf_counter() - started
+        endpoint = request.endpoint or UNMATCHED
+        self.add(("requests", endpoint, f"{response.status_code // 100}xx"))
+        self.add(("bucket", endpoint, next(le for le in BUCKETS if took <= le)))
+        self.add(("seconds", endpoint), took)
+        cache = response.headers.get("X-Cache")
+        if cache in ("HIT", "MISS"):
+            self.cache("page", cache == "HIT")
+        return response
+
+    def watch_engine(self, engine, bind):
+        """Count ``engine``'s pool checkouts and connections in use."""
+        def checkout(dbapi_connection, connection_record, connection_proxy):
+            self.add(("pool_in_use", bind))
+            self.add(("pool_checkouts", bind))
+
+        def checkin(dbapi_connection, connection_record):
+            self.add(("pool_in_use", bind), -1.0)
+
+        event.listen(engine, "checkout", checkout)
+        event.listen(engine, "checkin", checkin)
+
+    # --------------------------
+    # Export
+    # --------------------------
+    def totals(self):
+        """``({key: value summed over slots}, live workers)``."""
+        self._ensure_slot()
+        mm, index = self._mm, self._index
+        slot_size = PID.size + DOUBLE.size * len(index)
+        sums = [0.0] * len(index)
+        workers = 0
+        for slot in range(0, len(mm), slot_size):
+            owner = PID.unpack_from(mm, slot)[0]
+            if not owner:
+                continue
+            alive = _alive(owner)
+            workers += alive
+            values = struct.unpack_from(f"{len(index)}d", mm, slot + PID.size)
+            for key, i in index.items():
+                # A gone process's connections are gone with it
+                if alive or key[0] != "pool_in_use":
+                    sums[i] += values[i]
+        return {key: sums[i] for key, i in index.items()}, workers
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        totals, workers = self.totals()
+        endpoints = sorted({key[1] for key in totals if key[0] == "requests"})
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family("blog_http_requests_total", "counter", "Requests served, by endpoint and status class.")
+        for endpoint in endpoints:
+            for status in STATUS_CLASSES:
+                value = totals[("requests", endpoint, status)]
+                if value:
+                    lines.append(f"blog_http_requests_total{{{_labels(endpoint)},status=\"{status}\"}} {_number(value)}")
+
+        family("blog_http_request_duration_seconds", "histogram", "Time from before_request to after_request.")
+        for endpoint in endpoints:
+            count = 0.0
+            for le in BUCKETS:
+                count += totals[("bucket", endpoint, le)]
+                lines.append(f"blog_http_request_duration_seconds_bucket{{{_labels(endpoint)},"
+                             f"le=\"{'+Inf' if le == math.inf else le}\"}} {_number(count)}")
+            if not count:
+                del lines[-len(BUCKETS):]
+                continue
+            lines.append(f"blog_http_request_duration_seconds_sum{{{_labels(endpoint)}}} "
+                         f"{_number(totals[('seconds', endpoint)])}")
+            lines.append(f"blog_http_request_duration_seconds_count{{{_labels(endpoint)}}} {_number(count)}")
+
+        binds = sorted(key[1] for key in totals if key[0] == "pool_in_use")
+        family("blog_db_pool_connections_in_use", "gauge", "Database connections checked out, live workers only.")
+        lines += [f"blog_db_pool_connections_in_use{{bind=\"{b}\"}} {_number(totals[('pool_in_use', b)])}"
+                  for b in binds]
+        family("blog_db_pool_checkouts_total", "counter", "Database connections checked out of the pool.")
+        lines += [f"blog_db_pool_checkouts_total{{bind=\"{b}\"}} {_number(totals[('pool_checkouts', b)])}"
+                  for b in binds]
+
+        family("blog_cache_requests_total", "counter", "Page cache and listing count cache lookups.")
+        lines += [f"blog_cache_requests_total{{cache=\"{c}\",result=\"{r}\"}} {_number(totals[('cache', c, r)])}"
+                  for c in CACHES for r in ("hit", "miss")]
+
+        family("blog_metrics_workers", "gauge", "Live processes recording into the metrics file.")
+        lines.append(f"blog_metrics_workers {workers}")
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(endpoint):
+    blueprint = endpoint.split(".")[0] if "." in endpoint else ""
+    return f"blueprint=\"{blueprint}\",endpoint=\"{endpoint}\""
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
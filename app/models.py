@@ -2,7 +2,6 @@ from app import db
 from flask_login import UserMixin
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy.sql import func
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -35,6 +34,42 @@ class Category(db.Model):
 
     posts = db.relationship("Post", back_populates="category", lazy=True)
 
+    # Offered on the admin's new post form (admin.new_post)
+    DEFAULTS = ("general", "politics", "religion", "sport", "entertainment", "Naija gist")
+
+    @classmethod
+    def ensure_defaults(cls, session):
+        """Insert the missing DEFAULTS; returns whether any were missing.
+
+        A name another request inserted in the meantime is skipped rather
+        than failing on the unique constraint.
+        """
+        from app.pagecache import invalidate_on_commit
+
+        existing = set(session.scalars(db.select(cls.name).where(cls.name.in_(cls.DEFAULTS))))
+        missing = [name for name in cls.DEFAULTS if name not in existing]
+        if not missing:
+            return False
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.exc import IntegrityError
+            for name in missing:
+                try:
+                    with session.begin_nested():
+                        session.add(cls(name=name))
+                except IntegrityError:
+                    pass
+            return True
+        session.execute(insert(cls).values([{"name": name} for name in missing])
+                        .on_conflict_do_nothing(index_elements=["name"]))
+        # Core insert: _collect_tags doesn't see it, and the index lists categories
+        invalidate_on_commit(session, "listing")
+        return True
+
     def __repr__(self):
         return f"<Category {self.name}>"
 
@@ -48,7 +83,7 @@ class Post(db.Model):
     views = db.Column(db.Integer, default=0)
     likes = db.Column(db.Integer, default=0)
     media_filename = db.Column(db.String(200), nullable=True)
-    created_at = db.Column(db.DateTime, default=func.now)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
@@ -64,6 +99,15 @@ class Post(db.Model):
     comments = db.relationship("Comment", back_populates="post", lazy=True, cascade="all, delete-orphan")
     likes_rel = db.relationship("PostLike", backref="post", cascade="all, delete-orphan")
 
+    # Indexes backing keyset pagination on (created_at, id), see app/pagination.py
+    __table_args__ = (
+        db.Index("ix_post_created_at_id", "created_at", "id"),
+        db.Index("ix_post_status_created_at_id", "status", "created_at", "id"),
+        db.Index("ix_post_category_status_created_at_id", "category_id", "status", "created_at", "id"),
+        # Top posts on the admin statistics page
+        db.Index("ix_post_views", "views"),
+    )
+
     def __repr__(self):
         return f"<Post {self.title}>"
 
@@ -72,6 +116,7 @@ class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     likes = db.Column(db.Integer, default=0)
 
     # Foreign keys
@@ -84,6 +129,11 @@ class Comment(db.Model):
     replies = db.relationship("Reply", back_populates="comment", lazy=True, cascade="all, delete-orphan")
     likes_rel = db.relationship("CommentLike", backref="comment", cascade="all, delete-orphan")
 
+    # A post's comment thread is paged newest first by (created_at, id)
+    __table_args__ = (
+        db.Index("ix_comment_post_created_at_id", "post_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Comment {self.id}>"
     
@@ -101,6 +151,11 @@ class Reply(db.Model):
     user = db.relationship("User", back_populates="replies", lazy=True)
     comment = db.relationship("Comment", back_populates="replies", lazy=True)
 
+    # Replies are previewed and paged oldest first by (created_at, id)
+    __table_args__ = (
+        db.Index("ix_reply_comment_created_at_id", "comment_id", "created_at", "id"),
+    )
+
 
 class PostLike(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -121,3 +176,110 @@ class CommentLike(db.Model):
     def __repr__(self):
         return f"<Reply {self.id}>"
 
+
+
+class MediaBlob(db.Model):
+    """One stored upload, shared by every post that uses the same bytes.
+
+    ref_count is kept by session hooks in app/media.py; the file is deleted
+    once it drops to zero.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    filename = db.Column(db.String(200), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Last time an upload picked this file; garbage collection leaves
+    # blobs claimed within MEDIA_GC_GRACE alone
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def ensure(cls, session, sha256, filename, size):
+        """Insert the row, or mark it claimed again if it exists already."""
+        now = datetime.utcnow()
+        values = dict(sha256=sha256, filename=filename, size=size, ref_count=0, created_at=now, claimed_at=now)
+        dialect = session.get_bind().dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            blob = cls.query.filter_by(filename=filename).first()
+            if blob is None:
+                session.add(cls(**values))
+            else:
+                blob.claimed_at = now
+            session.flush()
+            return
+        session.execute(insert(cls).values(**values).on_conflict_do_update(
+            index_elements=["filename"], set_={"claimed_at": now}))
+
+    def __repr__(self):
+        return f"<MediaBlob {self.filename} refs={self.ref_count}>"
+
+
+class Job(db.Model):
+    """A unit of background work, run by `flask jobs worker` (app/jobs.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False, default="default")
+    task = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")  # JSON args/kwargs
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher runs first
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Claim query: WHERE queue = ? AND status IN (...) ORDER BY priority DESC, run_at
+        db.Index("ix_job_queue_status_priority_run_at", "queue", "status", "priority", "run_at"),
+    )
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.task} {self.status}>"
+
+
+# ==========================
+# STATISTICS ROLLUPS (kept current by app/stats.py)
+# ==========================
+class CategoryStat(db.Model):
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 = uncategorized
+    posts = db.Column(db.Integer, nullable=False, default=0)
+    published = db.Column(db.Integer, nullable=False, default=0)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AuthorStat(db.Model):
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    posts = db.Column(db.Integer, nullable=False, default=0)
+    published = db.Column(db.Integer, nullable=False, default=0)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)  # on the author's posts
+
+
+class DailyStat(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    posts = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ==========================
+# CONTENT VERSIONS (kept current by app/pagecache.py)
+# ==========================
+class ContentVersion(db.Model):
+    # A page-cache tag ("listing", "post:<slug>"), bumped in the same
+    # transaction as every write that changes the pages under it
+    tag = db.Column(db.String(300), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,370 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from importlib import import_module
+from urllib.parse import urlencode
+
+import click
+from flask import g, request, session, current_app, has_app_context, make_response
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+
+# ==========================
+# CACHE STORES
+# ==========================
+class MemoryStore:
+    """Per-process LRU store with TTL."""
+
+    def __init__(self, app):
+        self.max_entries = app.config["PAGE_CACHE_MAX_ENTRIES"]
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, entry = item
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemStore:
+    """Store shared by every worker on the host, one file per entry.
+
+    A file's mtime is set to its expiry time, so sweep() can drop expired
+    entries, and then the ones closest to expiring while more than
+    PAGE_CACHE_MAX_ENTRIES remain, from directory listings alone. Each
+    worker sweeps at most every PAGE_CACHE_SWEEP_INTERVAL seconds, on set().
+    """
+
+    def __init__(self, app):
+        self.path = app.config["PAGE_CACHE_DIR"] or os.path.join(app.instance_path, "page_cache")
+        self.max_entries = app.config["PAGE_CACHE_MAX_ENTRIES"]
+        self.sweep_interval = app.config["PAGE_CACHE_SWEEP_INTERVAL"]
+        self._next_sweep = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._file(key)
+        try:
+            with open(path, "rb") as f:
+                expires, entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            _remove(path)
+            return None
+        return entry
+
+    def set(self, key, entry, ttl):
+        expires = time.time() + ttl
+        path = self._file(key)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((expires, entry), f, pickle.HIGHEST_PROTOCOL)
+        os.utime(tmp, (expires, expires))
+        os.replace(tmp, path)
+        if time.monotonic() >= self._next_sweep:
+            self._next_sweep = time.monotonic() + self.sweep_interval
+            self.sweep()
+
+    def sweep(self):
+        """Remove expired entries, then the oldest past max_entries.
+        Returns how many files were removed."""
+        now = time.time()
+        live, removed = [], 0
+        with os.scandir(self.path) as entries:
+            for item in entries:
+                try:
+                    expires = item.stat().st_mtime
+                except OSError:
+                    continue
+                # A .part file older than a minute is left over from a crash
+                if expires < now or (item.name.endswith(".part") and expires < now - 60):
+                    removed += _remove(item.path)
+                elif not item.name.endswith(".part"):
+                    live.append((expires, item.path))
+        if len(live) > self.max_entries:
+            live.sort()
+            for _, path in live[:len(live) - self.max_entries]:
+                removed += _remove(path)
+        return removed
+
+    def clear(self):
+        with os.scandir(self.path) as entries:
+            for item in entries:
+                if item.is_file():
+                    _remove(item.path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return 1
+    except OSError:
+        return 0
+
+
+STORES = {"memory": MemoryStore, "filesystem": FileSystemStore}
+
+
+# ==========================
+# TAG VERSIONS
+# ==========================
+# Every commit that changes a page bumps the page's tags ("listing",
+# "post:<slug>") in the content_version table, inside the same transaction
+# (_collect_tags finds them, _record_versions writes them). A cached page
+# remembers the versions it was rendered at and is a miss once they moved,
+# whichever worker made the change; conditional GETs (app/conditional.py)
+# validate against the same rows. EVERYTHING is bumped by bulk imports,
+# which change pages without going through the session hooks.
+EVERYTHING = "*"
+
+
+def bump_versions(conn, tags):
+    """Add one to each tag's version on ``conn``'s transaction."""
+    from .models import ContentVersion
+
+    table = ContentVersion.__table__
+    now = datetime.utcnow()
+    dialect = conn.dialect.name
+    for tag in sorted(tags):  # a fixed order, so concurrent writers can't deadlock
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(table).values(tag=tag, version=1, updated_at=now)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["tag"], set_={"version": table.c.version + 1, "updated_at": now}))
+            continue
+        updated = conn.execute(
+            table.update().where(table.c.tag == tag).values(version=table.c.version + 1, updated_at=now)
+        ).rowcount
+        if not updated:
+            conn.execute(table.insert().values(tag=tag, version=1, updated_at=now))
+
+
+def tag_versions(tags):
+    """``{tag: version}`` for ``tags`` and EVERYTHING, in one query."""
+    from . import db
+    from .models import ContentVersion
+
+    wanted = sorted(set(tags) | {EVERYTHING})
+    found = dict(db.session.execute(
+        select(ContentVersion.tag, ContentVersion.version).where(ContentVersion.tag.in_(wanted))
+    ).all())
+    return {tag: found.get(tag, 0) for tag in wanted}
+
+
+# ==========================
+# RENDERED PAGE CACHE
+# ==========================
+class PageCache:
+    """Caches whole rendered responses for anonymous GET requests.
+
+    Views opt in with @cached_page and name the tags the page depends on
+    (``"listing"`` for post listings, ``"post:<slug>"`` for a post page).
+    Committed changes to posts, comments, replies, likes and categories
+    bump those tags, which turns every entry stored under an older tag
+    version into a miss.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PAGE_CACHE_ENABLED", True)
+        app.config.setdefault("PAGE_CACHE_BACKEND", "memory")
+        app.config.setdefault("PAGE_CACHE_TTL", 60)
+        app.config.setdefault("PAGE_CACHE_MAX_ENTRIES", 2048)
+        app.config.setdefault("PAGE_CACHE_DIR", None)
+        app.config.setdefault("PAGE_CACHE_SWEEP_INTERVAL", 60)  # seconds, filesystem store
+        self.app = app
+        self.store = self._make_store(app)
+        app.extensions["page_cache"] = self
+        app.cli.add_command(page_cache_cli)
+        for name, fn in (("after_flush", _collect_tags), ("before_commit", _record_versions),
+                         ("after_commit", _forget_tags), ("after_soft_rollback", _discard_tags)):
+            if not event.contains(Session, name, fn):
+                event.listen(Session, name, fn)
+
+    def _make_store(self, app):
+        backend = app.config["PAGE_CACHE_BACKEND"]
+        if backend in STORES:
+            return STORES[backend](app)
+        # "package.module:ClassName" for a custom shared backend
+        module, _, name = backend.partition(":")
+        return getattr(import_module(module), name)(app)
+
+    def cacheable(self):
+        return (
+            self.app.config["PAGE_CACHE_ENABLED"]
+            and request.method in ("GET", "HEAD")
+            and "_user_id" not in session
+            and "_flashes" not in session
+        )
+
+    def set(self, key, response, tags, versions, context):
+        if response.status_code != 200 or "Set-Cookie" in response.headers:
+            return
+        headers = [(k, v) for k, v in response.headers.items() if k not in ("Content-Length", "X-Cache")]
+        entry = {"body": response.get_data(), "headers": headers, "tags": tags,
+                 "versions": versions, "context": context}
+        self.store.set(key, entry, self.app.config["PAGE_CACHE_TTL"])
+
+
+def cached_page(tags, params=(), on_hit=None):
+    """Serve a view from the page cache for anonymous readers.
+
+    ``tags`` is called with the view's arguments and returns the tags the
+    page depends on. ``params`` names the query parameters the view reads:
+    only those go into the cache key, in a fixed order, and a request with
+    any other parameter skips the cache rather than add an entry for it. The view can leave values in ``g.page_cache_context``;
+    they are stored with the page and passed to ``on_hit`` whenever it is
+    served from cache, e.g. to still count a post view.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache = current_app.extensions["page_cache"]
+            key = _cache_key(params)
+            if key is None or not cache.cacheable():
+                return f(*args, **kwargs)
+
+            # Read tag versions before the view reads any data: a change
+            # committed while it renders then leaves this entry already stale.
+            page_tags = sorted(tags(*args, **kwargs))
+            versions = tag_versions(page_tags)
+            entry = cache.store.get(key)
+            if entry is not None and entry["versions"] == versions:
+                if on_hit:
+                    on_hit(entry["context"])
+                response = current_app.response_class(entry["body"], headers=entry["headers"])
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            g.page_cache_context = {}
+            response = make_response(f(*args, **kwargs))
+            cache.set(key, response, page_tags, versions, g.pop("page_cache_context"))
+            response.headers["X-Cache"] = "MISS"
+            return response
+        return decorated_function
+    return decorator
+
+
+def _cache_key(params):
+    """The path plus the known query parameters, sorted; None when the
+    request carries a parameter the view doesn't read, or one twice."""
+    args = request.args
+    if any(name not in params or len(args.getlist(name)) > 1 for name in args):
+        return None
+    if not args:
+        return request.path
+    return request.path + "?" + urlencode(sorted(args.items()))
+
+
+# ==========================
+# INVALIDATION HOOKS
+# ==========================
+def _collect_tags(session, flush_context):
+    from .models import Post, Category, Comment, Reply, PostLike, CommentLike
+
+    if not has_app_context() or "page_cache" not in current_app.extensions:
+        return
+
+    tags = session.info.setdefault("page_cache_tags", set())
+    post_ids, comment_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Post):
+            tags.update(("listing", f"post:{obj.slug}"))
+            # A renamed slug leaves the page cached under the old URL too
+            tags.update(f"post:{slug}" for slug in inspect(obj).attrs.slug.history.deleted)
+        elif isinstance(obj, Category):
+            tags.add("listing")
+        elif isinstance(obj, (Comment, PostLike)):
+            post_ids.add(obj.post_id)
+        elif isinstance(obj, (Reply, CommentLike)):
+            comment_ids.add(obj.comment_id)
+
+    if comment_ids:
+        rows = session.connection().execute(select(Comment.post_id).where(Comment.id.in_(comment_ids)))
+        post_ids.update(post_id for (post_id,) in rows)
+    if post_ids:
+        rows = session.connection().execute(select(Post.slug).where(Post.id.in_(post_ids)))
+        tags.update(f"post:{slug}" for (slug,) in rows)
+
+
+def invalidate_on_commit(session, *tags):
+    """Bump ``tags`` when ``session`` commits. For changes made with Core
+    statements, which _collect_tags doesn't see."""
+    session.info.setdefault("page_cache_tags", set()).update(tags)
+
+
+def _record_versions(session):
+    # Flush first so _collect_tags has seen every change
+    session.flush()
+    tags = session.info.get("page_cache_tags")
+    if tags:
+        bump_versions(session.connection(), tags)
+
+
+def _forget_tags(session):
+    session.info.pop("page_cache_tags", None)
+
+
+def _discard_tags(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("page_cache_tags", None)
+
+
+# ==========================
+# CLI: flask page-cache clear|sweep
+# ==========================
+page_cache_cli = AppGroup("page-cache", help="Manage the rendered page cache.")
+
+
+@page_cache_cli.command("clear")
+def clear_command():
+    """Drop every cached page."""
+    current_app.extensions["page_cache"].store.clear()
+    click.echo("Page cache cleared.")
+
+
+@page_cache_cli.command("sweep")
+def sweep_command():
+    """Remove expired pages, and the oldest past PAGE_CACHE_MAX_ENTRIES."""
+    store = current_app.extensions["page_cache"].store
+    if not hasattr(store, "sweep"):
+        raise click.ClickException("This page cache store evicts on its own.")
+    click.echo(f"Removed {store.sweep()} cached pages.")
@@ -0,0 +1,158 @@
+import base64
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, event, inspect, or_
+from sqlalchemy.orm import Session
+
+
+# ==========================
+# KEYSET (CURSOR) PAGINATION
+# ==========================
+def encode_cursor(row):
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    """One page of rows ordered by ``(created_at, id)``, newest first.
+
+    ``after`` continues past the last row of the previous page and
+    ``before`` goes back from the first row of the next page, so the cost
+    of a page doesn't depend on how deep into the archive it is. Works on
+    Post by default; pass ``model`` for comments or replies, and
+    ``newest_first=False`` for oldest-first threads.
+    """
+
+    def __init__(self, query, per_page, after=None, before=None, model=None, newest_first=True):
+        if model is None:
+            from .models import Post as model
+
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+
+        def beyond(cursor, descending):
+            created_at, row_id = cursor
+            if descending:
+                return or_(model.created_at < created_at,
+                           and_(model.created_at == created_at, model.id < row_id))
+            return or_(model.created_at > created_at,
+                       and_(model.created_at == created_at, model.id > row_id))
+
+        def ordering(descending):
+            if descending:
+                return model.created_at.desc(), model.id.desc()
+            return model.created_at.asc(), model.id.asc()
+
+        if before:
+            query = query.filter(beyond(before, not newest_first)).order_by(*ordering(not newest_first))
+        else:
+            if after:
+                query = query.filter(beyond(after, newest_first))
+            query = query.order_by(*ordering(newest_first))
+
+        # One extra row tells us whether there is another page that way
+        rows = query.limit(per_page + 1).all()
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if before:
+            rows.reverse()
+
+        self.items = rows
+        self.has_next = bool(rows) and (more if not before else True)
+        self.has_prev = bool(rows) and (more if before else bool(after))
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.items[-1]) if self.has_next else None
+
+    @property
+    def prev_cursor(self):
+        return encode_cursor(self.items[0]) if self.has_prev else None
+
+
+# ==========================
+# CACHED POST COUNTS
+# ==========================
+class CountCache:
+    """Caches ``query.count()`` results for paginated post listings.
+
+    ``query`` may also be a function returning the count, for listings
+    that aren't read from SQL (PostProjection.listing).
+
+    Entries are dropped whenever a post is added, deleted, (un)published or
+    moved between categories, or a category is renamed or deleted, in this
+    worker. Other workers pick the change up once COUNT_CACHE_TTL expires.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._counts = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COUNT_CACHE_TTL", 60)
+        app.config.setdefault("COUNT_CACHE_MAX_ENTRIES", 1024)
+        self.app = app
+        app.extensions["count_cache"] = self
+        if not event.contains(Session, "after_flush", _invalidate_after_flush):
+            event.listen(Session, "after_flush", _invalidate_after_flush)
+
+    def count(self, key, query):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._counts.get(key)
+        fresh = hit is not None and hit[1] > now
+        metrics = self.app.extensions.get("metrics")
+        if metrics is not None:
+            metrics.cache("count", fresh)
+        if fresh:
+            return hit[0]
+
+        total = query() if callable(query) else query.order_by(None).count()
+        with self._lock:
+            self._counts.pop(key, None)
+            while len(self._counts) >= self.app.config["COUNT_CACHE_MAX_ENTRIES"]:
+                self._counts.pop(next(iter(self._counts)))
+            self._counts[key] = (total, now + self.app.config["COUNT_CACHE_TTL"])
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+def _invalidate_after_flush(session, flush_context):
+    from flask import current_app, has_app_context
+    from .models import Post, Category
+
+    cache = current_app.extensions.get("count_cache") if has_app_context() else None
+    if cache is None:
+        return
+
+    for obj in session.new:
+        if isinstance(obj, Post):
+            return cache.clear()
+    for obj in session.deleted:
+        if isinstance(obj, (Post, Category)):
+            return cache.clear()
+    for obj in session.dirty:
+        if isinstance(obj, Post):
+            attrs = inspect(obj).attrs
+            if attrs.status.history.has_changes() or attrs.category_id.history.has_changes():
+                return cache.clear()
+        elif isinstance(obj, Category) and inspect(obj).attrs.name.history.has_changes():
+            return cache.clear()
@@ -0,0 +1,409 @@
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from .pagination import decode_cursor, encode_cursor
+
+# Timestamps are stored as fixed-width strings, which sort like the
+# datetimes and, unlike BSON dates, keep the microseconds that the SQL
+# keyset cursors compare on
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def _ts(value):
+    return value.strftime(TIMESTAMP_FORMAT) if value else None
+
+
+def _dt(value):
+    return datetime.strptime(value, TIMESTAMP_FORMAT) if value else None
+
+
+# ==========================
+# POST PAGE PROJECTION
+# ==========================
+class PostProjection:
+    """A denormalised read model of published posts, kept in MongoDB.
+
+    One document per published post holds everything blog.view_post and
+    blog.index render: the post, its author and category, its counters and
+    the first page of comments with their reply previews. Documents are
+    rebuilt from SQL after every commit that touches the post (session
+    hooks below); view counts are added with $inc as they are flushed.
+
+    POST_PROJECTION is "off", "write" (maintain the documents, e.g. while
+    `flask projection rebuild` backfills) or "read" (also serve pages from
+    them). A missing document or a MongoDB error falls back to SQL. Set
+    ``database`` to a pymongo (or mongomock) database to use instead of
+    the app's PyMongo connection.
+    """
+
+    collection_name = "post_pages"
+
+    def __init__(self, app=None):
+        self.app = None
+        self.database = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("POST_PROJECTION", "off")
+        app.config.setdefault("POST_PROJECTION_DATABASE", "blog")
+        self.app = app
+        app.extensions["post_projection"] = self
+        app.cli.add_command(projection_cli)
+        for name, fn in (("after_flush", _collect_changes), ("after_commit", _apply_changes),
+                         ("after_soft_rollback", _discard_changes)):
+            if not event.contains(Session, name, fn):
+                event.listen(Session, name, fn)
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config["POST_PROJECTION"] in ("write", "read")
+
+    @property
+    def reading(self):
+        return self.app is not None and self.app.config["POST_PROJECTION"] == "read"
+
+    @property
+    def collection(self):
+        database = self.database
+        if database is None:
+            from . import mongo
+            database = mongo.db if mongo.db is not None else mongo.cx[self.app.config["POST_PROJECTION_DATABASE"]]
+        return database[self.collection_name]
+
+    def ensure_indexes(self):
+        self.collection.create_index("slug", unique=True)
+        self.collection.create_index([("created_at", -1), ("_id", -1)])
+        self.collection.create_index([("category.name", 1), ("created_at", -1), ("_id", -1)])
+
+    # --------------------------
+    # Reading
+    # --------------------------
+    def page(self, slug):
+        """The projected post page for ``slug`` as template objects, or None."""
+        try:
+            doc = self.collection.find_one({"slug": slug})
+        except Exception:
+            self.app.logger.exception("Post projection read failed, using SQL")
+            return None
+        if doc is None:
+            return None
+        comments = [_comment(c) for c in doc["comments"]]
+        return SimpleNamespace(
+            post=_post(doc),
+            comments=comments,
+            comment_total=doc["comment_total"],
+            reply_previews={c.id: c.replies for c in comments},
+            reply_totals={c.id: c.reply_total for c in comments},
+            next_comments_cursor=doc["next_comments_cursor"],
+        )
+
+    def listing(self, per_page, cat=None, after=None, before=None, page=None):
+        """Newest-first posts like KeysetPage (or, with ``page``, by offset).
+
+        Returns ``(posts, total, prev_cursor, next_cursor)``, or None when
+        the projection can't answer and the caller should use SQL.
+        """
+        query = {"category.name": cat} if cat else {}
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+        fields = {"comments": 0}
+        try:
+            total = self._count(cat, query)
+            if page is not None:
+                docs = list(self.collection.find(query, fields).sort([("created_at", -1), ("_id", -1)])
+                            .skip((page - 1) * per_page).limit(per_page))
+                return [_post(d) for d in docs], total, None, None
+
+            cursor, descending = before or after, not before
+            if cursor:
+                created_at, row_id = _ts(cursor[0]), cursor[1]
+                op = "$lt" if descending else "$gt"
+                query = {**query, "$or": [{"created_at": {op: created_at}},
+                                          {"created_at": created_at, "_id": {op: row_id}}]}
+            direction = -1 if descending else 1
+            docs = list(self.collection.find(query, fields)
+                        .sort([("created_at", direction), ("_id", direction)]).limit(per_page + 1))
+        except Exception:
+            self.app.logger.exception("Post projection read failed, using SQL")
+            return None
+
+        more = len(docs) > per_page
+        posts = [_post(d) for d in docs[:per_page]]
+        if before:
+            posts.reverse()
+        has_next = bool(posts) and (more if not before else True)
+        has_prev = bool(posts) and (more if before else bool(after))
+        return (posts, total, encode_cursor(posts[0]) if has_prev else None,
+                encode_cursor(posts[-1]) if has_next else None)
+
+    def _count(self, cat, query):
+        # Same key as the SQL listing: both count the published posts of ``cat``
+        def counter():
+            return self.collection.count_documents(query)
+
+        cache = self.app.extensions.get("count_cache")
+        return cache.count(("blog.index", cat), counter) if cache is not None else counter()
+
+    # --------------------------
+    # Writing
+    # --------------------------
+    def refresh(self, post_ids):
+        """Re-project ``post_ids`` from SQL; documents of posts that are gone
+        or unpublished are removed."""
+        from . import db
+
+        post_ids = set(post_ids)
+        if not post_ids:
+            return
+        with db.engine.connect() as conn:
+            docs = build_documents(conn, post_ids)
+        # Whole-document replaces, so concurrent refreshes can't interleave
+        # their fields; the last one (from the latest SQL state) wins
+        for doc in docs.values():
+            self.collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+        gone = post_ids - set(docs)
+        if gone:
+            self.collection.delete_many({"_id": {"$in": list(gone)}})
+
+    def add_views(self, counts):
+        """$inc view counts flushed by the ViewCounter; ``{post_id: n}``."""
+        if counts and self.enabled:
+            try:
+                for post_id, n in counts.items():
+                    self.collection.update_one({"_id": post_id}, {"$inc": {"views": n}})
+            except Exception:
+                self.app.logger.exception("Failed to add %d view counts to the post projection", len(counts))
+
+    def posts_mentioning(self, category_ids=(), user_ids=()):
+        """Ids of projected posts that embed one of these categories or users."""
+        clauses = []
+        if category_ids:
+            clauses.append({"category.id": {"$in": list(category_ids)}})
+        if user_ids:
+            users = {"$in": list(user_ids)}
+            clauses += [{"user.id": users}, {"comments.user.id": users}, {"comments.replies.user.id": users}]
+        if not clauses:
+            return set()
+        return {doc["_id"] for doc in self.collection.find({"$or": clauses}, {"_id": 1})}
+
+    def rebuild(self, chunk_size=500, log=None):
+        """Project every published post, in chunks, and drop stale documents.
+        Returns the number of documents written."""
+        from . import db
+        from .models import Post
+
+        self.ensure_indexes()
+        started = _ts(datetime.utcnow())
+        written, last = 0, 0
+        while True:
+            with db.engine.connect() as conn:
+                ids = conn.execute(
+                    select(Post.id).where(Post.status == "published", Post.id > last)
+                    .order_by(Post.id).limit(chunk_size)).scalars().all()
+            if not ids:
+                break
+            self.refresh(ids)
+            written += len(ids)
+            last = ids[-1]
+            if log:
+                log(f"{written} posts projected")
+        # Anything not rewritten since the rebuild started is no longer published
+        self.collection.delete_many({"projected_at": {"$lt": started}})
+        return written
+
+
+def _post(doc):
+    return SimpleNamespace(
+        id=doc["_id"], slug=doc["slug"], title=doc["title"], content=doc.get("content"), status=doc["status"],
+        views=doc["views"], likes=doc["likes"], media_filename=doc["media_filename"],
+        created_at=_dt(doc["created_at"]), updated_at=_dt(doc["updated_at"]),
+        user_id=doc["user"]["id"], user=SimpleNamespace(**doc["user"]),
+        category_id=doc["category"]["id"] if doc["category"] else None,
+        category=SimpleNamespace(**doc["category"]) if doc["category"] else None,
+    )
+
+
+def _comment(doc):
+    return SimpleNamespace(
+        id=doc["id"], content=doc["content"], likes=doc["likes"], created_at=_dt(doc["created_at"]),
+        user_id=doc["user"]["id"], user=SimpleNamespace(**doc["user"]), reply_total=doc["reply_total"],
+        replies=[SimpleNamespace(id=r["id"], content=r["content"], created_at=_dt(r["created_at"]),
+                                 comment_id=doc["id"], user_id=r["user"]["id"], user=SimpleNamespace(**r["user"]))
+                 for r in doc["replies"]],
+    )
+
+
+# ==========================
+# BUILDING DOCUMENTS
+# ==========================
+def build_documents(conn, post_ids):
+    """``{post_id: document}`` for the published ones of ``post_ids``: one
+    query each for the posts, their first comment pages and the reply
+    previews, however many posts there are."""
+    from .models import Post, User, Category, Comment, Reply
+
+    config = current_app.config
+    per_page, preview = config["COMMENTS_PER_PAGE"], config["REPLY_PREVIEW"]
+    now = _ts(datetime.utcnow())
+
+    rows = conn.execute(
+        select(Post.id, Post.slug, Post.title, Post.content, Post.status, Post.views, Post.likes,
+               Post.media_filename, Post.created_at, Post.updated_at, Post.user_id, User.username,
+               Post.category_id, Category.name.label("category_name"))
+        .join(User, Post.user_id == User.id)
+        .outerjoin(Category, Post.category_id == Category.id)
+        .where(Post.id.in_(list(post_ids)), Post.status == "published")
+    ).all()
+    docs = {
+        row.id: {
+            "_id": row.id, "slug": row.slug, "title": row.title, "content": row.content, "status": row.status,
+            "views": row.views or 0, "likes": row.likes or 0, "media_filename": row.media_filename,
+            "created_at": _ts(row.created_at), "updated_at": _ts(row.updated_at),
+            "user": {"id": row.user_id, "username": row.username},
+            "category": {"id": row.category_id, "name": row.category_name} if row.category_id else None,
+            "comment_total": 0, "comments": [], "next_comments_cursor": None, "projected_at": now,
+        }
+        for row in rows
+    }
+    if not docs:
+        return docs
+
+    # First page of each thread, newest first as in blog.view_post, plus
+    # one more row to tell whether there is a next page
+    ranked = (
+        select(Comment.id,
+               func.row_number().over(partition_by=Comment.post_id,
+                                      order_by=(Comment.created_at.desc(), Comment.id.desc())).label("rn"),
+               func.count().over(partition_by=Comment.post_id).label("total"))
+        .where(Comment.post_id.in_(list(docs)))
+        .subquery()
+    )
+    rows = conn.execute(
+        select(Comment.id, Comment.post_id, Comment.content, Comment.likes, Comment.created_at,
+               Comment.user_id, User.username, ranked.c.rn, ranked.c.total)
+        .join(ranked, ranked.c.id == Comment.id)
+        .join(User, Comment.user_id == User.id)
+        .where(ranked.c.rn <= per_page + 1)
+        .order_by(Comment.post_id, ranked.c.rn)
+    ).all()
+    comments = {}
+    for row in rows:
+        doc = docs[row.post_id]
+        doc["comment_total"] = row.total
+        if row.rn > per_page:
+            doc["next_comments_cursor"] = encode_cursor(last)
+            continue
+        last = row
+        comment = {"id": row.id, "content": row.content, "likes": row.likes or 0, "created_at": _ts(row.created_at),
+                   "user": {"id": row.user_id, "username": row.username}, "reply_total": 0, "replies": []}
+        doc["comments"].append(comment)
+        comments[row.id] = comment
+    if not comments:
+        return docs
+
+    ranked = (
+        select(Reply.id,
+               func.row_number().over(partition_by=Reply.comment_id, order_by=(Reply.created_at, Reply.id)).label("rn"),
+               func.count().over(partition_by=Reply.comment_id).label("total"))
+        .where(Reply.comment_id.in_(list(comments)))
+        .subquery()
+    )
+    rows = conn.execute(
+        select(Reply.id, Reply.comment_id, Reply.content, Reply.created_at, Reply.user_id, User.username,
+               ranked.c.total)
+        .join(ranked, ranked.c.id == Reply.id)
+        .join(User, Reply.user_id == User.id)
+        .where(ranked.c.rn <= preview)
+        .order_by(Reply.comment_id, ranked.c.rn)
+    ).all()
+    for row in rows:
+        comment = comments[row.comment_id]
+        comment["reply_total"] = row.total
+        comment["replies"].append({"id": row.id, "content": row.content, "created_at": _ts(row.created_at),
+                                   "user": {"id": row.user_id, "username": row.username}})
+    return docs
+
+
+# ==========================
+# SESSION HOOKS
+# ==========================
+def _projection():
+    if not has_app_context():
+        return None
+    projection = current_app.extensions.get("post_projection")
+    return projection if projection is not None and projection.enabled else None
+
+
+def _collect_changes(session, flush_context):
+    """after_flush: note which projected posts this flush affects."""
+    from .models import Post, Comment, Reply, Category, User, PostLike, CommentLike
+
+    if _projection() is None:
+        return
+    changes = session.info.setdefault("post_projection", {"posts": set(), "categories": set(), "users": set()})
+    comment_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Post):
+            changes["posts"].add(obj.id)
+        elif isinstance(obj, (Comment, PostLike)):
+            changes["posts"].add(obj.post_id)
+        elif isinstance(obj, (Reply, CommentLike)):
+            comment_ids.add(obj.comment_id)
+        elif isinstance(obj, Category) and inspect(obj).attrs.name.history.has_changes():
+            changes["categories"].add(obj.id)
+        elif isinstance(obj, User) and inspect(obj).attrs.username.history.has_changes():
+            changes["users"].add(obj.id)
+    if comment_ids:
+        rows = session.connection().execute(select(Comment.post_id).where(Comment.id.in_(comment_ids)))
+        changes["posts"].update(post_id for (post_id,) in rows)
+
+
+def refresh_on_commit(session, *post_ids):
+    """Re-project ``post_ids`` when ``session`` commits. For changes made
+    with Core statements, which _collect_changes doesn't see."""
+    if _projection() is not None:
+        changes = session.info.setdefault("post_projection", {"posts": set(), "categories": set(), "users": set()})
+        changes["posts"].update(post_ids)
+
+
+def _apply_changes(session):
+    changes = session.info.pop("post_projection", None)
+    projection = _projection()
+    if not changes or projection is None:
+        return
+    try:
+        post_ids = set(changes["posts"])
+        if changes["categories"] or changes["users"]:
+            post_ids |= projection.posts_mentioning(changes["categories"], changes["users"])
+        projection.refresh(post_ids)
+    except Exception:
+        # The SQL change is committed either way; `flask projection rebuild` catches up
+        current_app.logger.exception("Failed to update the post projection")
+
+
+def _discard_changes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("post_projection", None)
+
+
+# ==========================
+# CLI: flask projection
+# ==========================
+projection_cli = AppGroup("projection", help="Maintain the MongoDB read model of post pages.")
+
+
+@projection_cli.command("rebuild")
+@click.option("--chunk-size", default=500, show_default=True, help="Posts projected per round.")
+def rebuild_command(chunk_size):
+    """Project every published post and remove documents of the rest."""
+    started = time.monotonic()
+    written = current_app.extensions["post_projection"].rebuild(chunk_size, log=click.echo)
+    click.echo(f"Projected {written} posts in {time.monotonic() - started:.1f}s.")
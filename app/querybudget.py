@@ -0,0 +1,85 @@
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# ==========================
+# PER-REQUEST SQL BUDGETS
+# ==========================
+def query_budget(limit, methods=("GET", "HEAD")):
+    """Declare the most SQL statements a view may run per request.
+
+    Put it under the route decorator. Budgets are checked by
+    QueryBudget: going over raises QueryBudgetExceeded when enforcing
+    (TESTING, or QUERY_BUDGET_ENFORCE = True) and logs a warning otherwise.
+    Only ``methods`` are checked; by default writes are not, since their
+    side effects (statistics rollups, search index) add statements.
+    ``limit`` may be a function returning it, for views whose cost depends
+    on configuration.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            return f(*args, **kwargs)
+        decorated_function.query_budget = limit
+        decorated_function.query_budget_methods = methods
+        return decorated_function
+    return decorator
+
+
+class QueryBudget:
+    def __init__(self, app=None):
+        self.app = None
+        self.last = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["query_budget"] = self
+        app.before_request(self._start)
+        app.after_request(self._check)
+        if not event.contains(Engine, "before_cursor_execute", _count_statement):
+            event.listen(Engine, "before_cursor_execute", _count_statement)
+
+    def _start(self):
+        # Keep the statements (for the report) only where there is a budget
+        view = self.app.view_functions.get(request.endpoint)
+        if getattr(view, "query_budget", None) is not None and request.method in view.query_budget_methods:
+            g.sql_statements = []
+        else:
+            g.sql_statement_count = 0
+
+    def _check(self, response):
+        statements = g.pop("sql_statements", None)
+        if statements is None:
+            return response
+        limit = self.app.view_functions[request.endpoint].query_budget
+        if callable(limit):
+            limit = limit()
+
+        self.last = (request.endpoint, len(statements), statements)
+        if len(statements) <= limit:
+            return response
+
+        message = "%s ran %d SQL statements, budget is %d:\n  %s" % (
+            request.endpoint, len(statements), limit, "\n  ".join(statements))
+        if self.app.config.get("QUERY_BUDGET_ENFORCE", self.app.testing):
+            raise QueryBudgetExceeded(message)
+        self.app.logger.warning(message)
+        return response
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        statements = g.get("sql_statements")
+        if statements is not None:
+            statements.append(statement)
+        elif "sql_statement_count" in g:
+            g.sql_statement_count += 1
@@ -0,0 +1,265 @@
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import String, bindparam, func, select, type_coerce
+
+# Repair name -> {"fn", "models", "columns", "before_write", "after_chunk", "help"}
+REPAIRS = {}
+
+
+def repair(name, models, columns, before_write=None, after_chunk=None):
+    """Register a chunked data repair under ``name``.
+
+    The function is called as ``fn(conn, rows)`` for each chunk of rows of
+    every model in ``models`` (class names from app/models.py), with
+    ``rows`` holding ``id`` and those of ``columns`` the table has, as
+    they are stored. It returns ``{id: {column: new value}}`` for the
+    rows to change. Data derived from those rows is kept up to date chunk
+    by chunk too: ``before_write(conn, table, updates)`` runs in the
+    chunk's transaction just before the rows are changed, and
+    ``after_chunk(table, ids)`` once it has committed.
+    """
+    def decorator(f):
+        REPAIRS[name] = {"fn": f, "models": models, "columns": columns, "before_write": before_write,
+                         "after_chunk": after_chunk, "help": (f.__doc__ or "").strip().split("\n")[0]}
+        return f
+    return decorator
+
+
+# ==========================
+# CHUNKED RUNNER
+# ==========================
+# A repair walks a table in primary-key order, a chunk of rows at a time, and
+# commits each chunk in its own short transaction, so the write lock is
+# only ever held for one chunk and readers get in between. After every
+# commit the last key is saved to a checkpoint file under the instance
+# folder, and a run that was interrupted carries on from there.
+def checkpoint_path(name):
+    return os.path.join(current_app.instance_path, "repairs", f"{name}.json")
+
+
+def _load_checkpoint(name):
+    try:
+        with open(checkpoint_path(name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_checkpoint(name, state):
+    path = checkpoint_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def run_repair(name, chunk_size=500, pause=None, dry_run=False, restart=False, log=print):
+    """Run the repair ``name`` over all its models. Returns ``{model: rows changed}``.
+
+    ``pause`` seconds are slept after each chunk (REPAIR_PAUSE by default),
+    on top of as long as the chunk held its transaction, so a repair never
+    takes more than about half of the database's write time.
+    """
+    from . import db, models
+
+    spec = REPAIRS[name]
+    pause = current_app.config["REPAIR_PAUSE"] if pause is None else pause
+    state = {} if restart or dry_run else _load_checkpoint(name)
+    changed = {}
+    for model_name in spec["models"]:
+        table = getattr(models, model_name).__table__
+        progress = state.get(model_name, {})
+        if progress.get("done"):
+            log(f"{name}: {model_name} already done ({progress.get('changed', 0)} rows changed)")
+            changed[model_name] = progress.get("changed", 0)
+            continue
+        pk = table.primary_key.columns.values()[0]
+        # Read stored values as text: a malformed one would fail to load as its real type
+        columns = [type_coerce(table.c[c], String).label(c) for c in spec["columns"] if c in table.c]
+        last, count, seen = progress.get("last"), progress.get("changed", 0), 0
+        if last is not None:
+            log(f"{name}: resuming {model_name} after id {last}")
+
+        while True:
+            started = time.monotonic()
+            with db.engine.begin() as conn:
+                stmt = select(pk.label("id"), *columns).order_by(pk).limit(chunk_size)
+                if last is not None:
+                    stmt = stmt.where(pk > last)
+                rows = conn.execute(stmt).all()
+                if not rows:
+                    break
+                updates = spec["fn"](conn, rows)
+                if updates and not dry_run:
+                    if spec["before_write"]:
+                        spec["before_write"](conn, table, updates)
+                    for fields, group in _group(updates).items():
+                        conn.execute(
+                            table.update().where(pk == bindparam("_id")).values({f: bindparam(f) for f in fields}),
+                            [{"_id": id_, **values} for id_, values in group])
+            held = time.monotonic() - started
+            if updates and not dry_run and spec["after_chunk"]:
+                spec["after_chunk"](table, list(updates))
+            last = rows[-1].id
+            count += len(updates)
+            seen += len(rows)
+            if not dry_run:
+                state[model_name] = {"last": last, "changed": count}
+                _save_checkpoint(name, state)
+            log(f"{name}: {model_name} {seen} rows checked, {count} {'to change' if dry_run else 'changed'}")
+            time.sleep(pause + held)
+
+        changed[model_name] = count
+        if not dry_run:
+            state[model_name] = {"last": last, "changed": count, "done": True}
+            _save_checkpoint(name, state)
+
+    if not dry_run:
+        os.unlink(checkpoint_path(name))
+    return changed
+
+
+def _group(updates):
+    """{id: values} grouped by which columns change, one executemany each."""
+    groups = {}
+    for id_, values in updates.items():
+        groups.setdefault(tuple(sorted(values)), []).append((id_, values))
+    return groups
+
+
+# ==========================
+# BUILT-IN REPAIRS
+# ==========================
+STORED_FORMAT = "%Y-%m-%d %H:%M:%S.%f"  # how SQLAlchemy writes DateTime on SQLite
+LEGACY_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y", "%Y/%m/%d %H:%M:%S")
+
+
+def parse_datetime(value):
+    """A naive UTC datetime from a stored timestamp string, or None.
+
+    Values the driver already returns as datetimes (PostgreSQL) pass
+    through, converted to naive UTC.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = _parse_string(value)
+    if parsed is not None and parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_string(value):
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        parsed = None
+        for fmt in LEGACY_FORMATS:
+            try:
+                parsed = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        if parsed is None and value.replace(".", "", 1).isdigit():
+            parsed = datetime.fromtimestamp(float(value), timezone.utc)
+    return parsed
+
+
+def _shift_daily_rollups(conn, table, updates):
+    # Daily rollups count posts and comments by created_at's date, read the
+    # way compute_rollups() reads it: move each changed row to its new day
+    from .stats import apply_deltas
+
+    column = {"post": "posts", "comment": "comments"}.get(table.name)
+    if column is None or not current_app.config.get("STATS_ENABLED", True):
+        return
+    pk = table.primary_key.columns.values()[0]
+    old_days = dict(conn.execute(select(pk, func.date(table.c.created_at)).where(pk.in_(list(updates)))).all())
+    deltas = defaultdict(Counter)
+    for id_, values in updates.items():
+        old, new = old_days.get(id_), values["created_at"].date()
+        old = date.fromisoformat(old) if isinstance(old, str) else old
+        if old != new:
+            if old is not None:
+                deltas[("day", old)][column] -= 1
+            deltas[("day", new)][column] += 1
+    apply_deltas(conn, deltas)
+
+
+def _refresh_projection(table, ids):
+    # Projected post pages show, and are sorted by, these timestamps
+    from . import db
+    from .models import Comment, Reply
+
+    projection = current_app.extensions["post_projection"]
+    if not projection.enabled or table.name == "user":
+        return
+    with db.engine.connect() as conn:
+        if table.name == "comment":
+            ids = conn.execute(select(Comment.post_id).where(Comment.id.in_(ids))).scalars().all()
+        elif table.name == "reply":
+            ids = conn.execute(select(Comment.post_id).join(Reply, Reply.comment_id == Comment.id)
+                               .where(Reply.id.in_(ids))).scalars().all()
+    projection.refresh(ids)
+
+
+@repair("created-at", models=("Post", "Comment", "Reply", "User"), columns=("created_at", "updated_at"),
+        before_write=_shift_daily_rollups, after_chunk=_refresh_projection)
+def normalize_created_at(conn, rows):
+    """Rewrite created_at values stored as odd strings, or missing, as proper timestamps."""
+    strict = conn.dialect.name == "sqlite"  # elsewhere the column type already enforces it
+    updates = {}
+    for row in rows:
+        raw = row.created_at
+        if raw is None:
+            # Missing: the last edit is the closest thing we know
+            fallback = getattr(row, "updated_at", None)
+            updates[row.id] = {"created_at": (fallback and parse_datetime(fallback)) or datetime.utcnow()}
+            continue
+        if not strict:
+            continue
+        parsed = parse_datetime(raw)
+        if parsed is None:
+            current_app.logger.warning("created_at %r of row %s can't be parsed, left as is", raw, row.id)
+        elif parsed.strftime(STORED_FORMAT) != raw:
+            updates[row.id] = {"created_at": parsed}
+    return updates
+
+
+# ==========================
+# CLI: flask repair
+# ==========================
+repair_cli = AppGroup("repair", help="Run chunked, resumable data repairs.")
+
+
+@repair_cli.command("list")
+def list_command():
+    """Show the available repairs."""
+    for name, spec in sorted(REPAIRS.items()):
+        click.echo(f"{name:<16} {', '.join(spec['models'])}: {spec['help']}")
+
+
+@repair_cli.command("run")
+@click.argument("name", type=click.Choice(sorted(REPAIRS)))
+@click.option("--chunk-size", default=500, show_default=True, help="Rows per transaction.")
+@click.option("--pause", type=float, help="Extra seconds to sleep between chunks (default: REPAIR_PAUSE).")
+@click.option("--dry-run", is_flag=True, help="Count the rows that would change without writing.")
+@click.option("--restart", is_flag=True, help="Ignore the checkpoint of an interrupted run.")
+def run_command(name, chunk_size, pause, dry_run, restart):
+    """Run the repair NAME, resuming an interrupted run unless --restart."""
+    changed = run_repair(name, chunk_size, pause, dry_run, restart, log=click.echo)
+    verb = "would change" if dry_run else "changed"
+    click.echo(", ".join(f"{model}: {n} {verb}" for model, n in changed.items()))
+
+
+def init_repairs(app):
+    app.config.setdefault("REPAIR_PAUSE", 0.1)
+    app.cli.add_command(repair_cli)
@@ -0,0 +1,192 @@
+import re
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, text, false, Integer, Float, or_
+from sqlalchemy.orm import Session
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# ==========================
+# FULL-TEXT SEARCH INDEX
+# ==========================
+class SearchIndex:
+    """Inverted index over published posts' title and content.
+
+    On SQLite the index is an FTS5 virtual table (``post_fts``) keyed by
+    post id and kept in step with the ``post`` table from a session
+    ``after_flush`` hook, so it commits or rolls back with the change that
+    touched the post. Results are ranked with bm25, weighting title matches
+    above content. On other databases, or SQLite builds without FTS5, search
+    falls back to a LIKE over title and content.
+
+    The table is created by a migration (or with ``db.create_all()``) and
+    filled by ``flask search rebuild``; until it exists search uses LIKE.
+    """
+
+    table = "post_fts"
+    title_weight = 10.0
+    content_weight = 1.0
+
+    def __init__(self, app=None):
+        self.app = None
+        self._ready = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SEARCH_FTS_ENABLED", True)
+        self.app = app
+        app.extensions["search_index"] = self
+        app.cli.add_command(search_cli)
+        if not event.contains(Session, "after_flush", _sync_after_flush):
+            event.listen(Session, "after_flush", _sync_after_flush)
+        from . import db
+        if not event.contains(db.metadata, "after_create", _create_after_create_all):
+            event.listen(db.metadata, "after_create", _create_after_create_all)
+
+    # --------------------------
+    # Querying
+    # --------------------------
+    def search(self, query, q):
+        """Restrict a ``Post`` query to posts matching ``q``, best first."""
+        from .models import Post
+        from . import db
+
+        terms = TOKEN_RE.findall(q.lower())
+        if not terms:
+            return query.filter(false())
+
+        if self.available(db.session.connection()):
+            # Quote every term so user input can't inject FTS operators; the
+            # trailing * turns the last word into a prefix match for as-you-type
+            match = " ".join(f'"{t}"' for t in terms[:-1])
+            match = f'{match} "{terms[-1]}"*'.strip()
+            hits = (
+                text(
+                    f"SELECT rowid AS post_id, bm25({self.table}, :tw, :cw) AS rank "
+                    f"FROM {self.table} WHERE {self.table} MATCH :match"
+                )
+                .bindparams(match=match, tw=self.title_weight, cw=self.content_weight)
+                .columns(post_id=Integer, rank=Float)
+                .subquery("search_hits")
+            )
+            return query.join(hits, hits.c.post_id == Post.id).order_by(hits.c.rank, Post.created_at.desc())
+
+        for term in terms:
+            query = query.filter(or_(Post.title.ilike(f"%{term}%"), Post.content.ilike(f"%{term}%")))
+        return query.order_by(Post.created_at.desc())
+
+    # --------------------------
+    # Maintenance
+    # --------------------------
+    def available(self, conn):
+        """Whether the FTS table can be used on this connection's database."""
+        if not self.app or not self.app.config["SEARCH_FTS_ENABLED"] or conn.dialect.name != "sqlite":
+            return False
+
+        key = str(conn.engine.url)
+        if key not in self._ready:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": self.table}
+            ).first()
+            if not exists:
+                self.app.logger.warning("No %s table (run `flask db upgrade`, it needs SQLite with FTS5), "
+                                        "falling back to LIKE search", self.table)
+            self._ready[key] = exists is not None
+        return self._ready[key]
+
+    def create_table(self, conn):
+        """Create the FTS table if this SQLite build has FTS5; returns whether
+        it exists. The migration runs the same statement."""
+        self._ready.pop(str(conn.engine.url), None)
+        if not conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+            return False
+        conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                          "USING fts5(title, content, tokenize='unicode61')"))
+        return True
+
+    def rebuild(self, conn):
+        if not self.available(conn):
+            return 0
+        conn.execute(text(f"DELETE FROM {self.table}"))
+        count = self._populate(conn)
+        conn.execute(text(f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')"))
+        return count
+
+    def _populate(self, conn):
+        result = conn.execute(text(
+            f"INSERT INTO {self.table} (rowid, title, content) "
+            "SELECT id, title, content FROM post WHERE status = 'published'"
+        ))
+        return result.rowcount
+
+    def update(self, conn, posts, deleted_ids):
+        if not self.available(conn):
+            return
+        ids = [{"id": pid} for pid in deleted_ids] + [{"id": p.id} for p in posts]
+        if ids:
+            conn.execute(text(f"DELETE FROM {self.table} WHERE rowid = :id"), ids)
+        rows = [
+            {"id": p.id, "title": p.title, "content": p.content}
+            for p in posts if p.status == "published"
+        ]
+        if rows:
+            conn.execute(text(f"INSERT INTO {self.table} (rowid, title, content) VALUES (:id, :title, :content)"), rows)
+
+
+def _create_after_create_all(metadata, connection, **kw):
+    """after_create on db.metadata: ``db.create_all()`` adds the (empty) FTS
+    table too, like the migration."""
+    from flask import current_app, has_app_context
+
+    index = current_app.extensions.get("search_index") if has_app_context() else None
+    if index is not None and index.app.config["SEARCH_FTS_ENABLED"] and connection.dialect.name == "sqlite":
+        index.create_table(connection)
+
+
+def _sync_after_flush(session, flush_context):
+    from flask import current_app, has_app_context
+    from .models import Post
+
+    index = current_app.extensions.get("search_index") if has_app_context() else None
+    if index is None:
+        return
+
+    changed, deleted = [], []
+    for obj in session.new:
+        if isinstance(obj, Post):
+            changed.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Post):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in ("title", "content", "status")):
+                changed.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            deleted.append(obj.id)
+
+    if changed or deleted:
+        index.update(session.connection(), changed, deleted)
+
+
+# ==========================
+# CLI: flask search rebuild
+# ==========================
+search_cli = AppGroup("search", help="Manage the post search index.")
+
+
+@search_cli.command("rebuild")
+def rebuild_command():
+    """Rebuild the full-text index from the post table."""
+    from flask import current_app
+    from . import db
+
+    index = current_app.extensions["search_index"]
+    with db.engine.begin() as conn:
+        if not index.available(conn):
+            raise click.ClickException(f"No {index.table} table to fill: run `flask db upgrade` first "
+                                       "(full-text search needs SQLite with FTS5).")
+        count = index.rebuild(conn)
+    click.echo(f"Indexed {count} published posts.")
@@ -0,0 +1,122 @@
+import re
+
+from slugify import slugify
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+
+MAX_BASE_LENGTH = 200  # leaves room for "-<n>" within Post.slug's 255
+SUFFIX_RE = re.compile(r"-(\d+)$")
+BULK_CHUNK = 200  # bases per query in allocate_slugs
+
+
+# ==========================
+# UNIQUE SLUG ALLOCATION
+# ==========================
+# A title becomes slugify(title), or "<base>-<n>" with n one above the
+# highest suffix already used. Taken slugs for a base are found with one
+# range scan on the slug index: "base" itself plus everything between
+# "base-" and "base." ("." sorts right after "-"), so the cost doesn't
+# grow with the number of round-trips, only with the rows that match.
+def base_slug(text):
+    return slugify(text or "")[:MAX_BASE_LENGTH].strip("-") or "post"
+
+
+def _taken_condition(base):
+    from .models import Post
+
+    return or_(Post.slug == base, and_(Post.slug > f"{base}-", Post.slug < f"{base}."))
+
+
+def _next_suffix(base, taken):
+    """0 if ``base`` itself is free, else one past the highest ``base-<n>``."""
+    if base not in taken:
+        return 0
+    highest = 0
+    for slug in taken:
+        match = SUFFIX_RE.search(slug)
+        if match and slug[:match.start()] == base:
+            highest = max(highest, int(match.group(1)))
+    return highest + 1
+
+
+def _with_suffix(base, n):
+    return base if n == 0 else f"{base}-{n}"
+
+
+def allocate_slug(text):
+    """A slug for ``text`` that no post uses yet, in one query.
+
+    Two requests can still pick the same slug at the same moment; use
+    add_with_slug() to insert with a retry on the unique constraint.
+    """
+    from .models import Post
+
+    base = base_slug(text)
+    taken = set(db.session.execute(select(Post.slug).where(_taken_condition(base))).scalars())
+    return _with_suffix(base, _next_suffix(base, taken))
+
+
+def allocate_slugs(texts):
+    """Slugs for many titles at once (imports), unique among themselves
+    and against existing posts, using one query per BULK_CHUNK distinct bases."""
+    from .models import Post
+
+    bases = [base_slug(text) for text in texts]
+    distinct = sorted(set(bases))
+    taken = {}
+    for i in range(0, len(distinct), BULK_CHUNK):
+        chunk = distinct[i:i + BULK_CHUNK]
+        rows = db.session.execute(select(Post.slug).where(or_(*[_taken_condition(b) for b in chunk]))).scalars()
+        for slug in rows:
+            # A slug can match several bases ("a-1" is "a" suffixed, or the base "a-1")
+            for base in _bases_of(slug, chunk):
+                taken.setdefault(base, set()).add(slug)
+
+    next_n = {base: _next_suffix(base, taken.get(base, set())) for base in distinct}
+    slugs, used = [], set()
+    for base in bases:
+        slug = _with_suffix(base, next_n[base])
+        # Skip slugs taken in the database (when the base itself was free)
+        # or by another title in this batch ("a" suffixed can be "a-1")
+        while slug in used or slug in taken.get(base, ()):
+            next_n[base] += 1
+            slug = _with_suffix(base, next_n[base])
+        slugs.append(slug)
+        used.add(slug)
+        next_n[base] += 1
+    return slugs
+
+
+def _bases_of(slug, bases):
+    candidates = {slug}
+    match = SUFFIX_RE.search(slug)
+    if match:
+        candidates.add(slug[:match.start()])
+    return [base for base in candidates if base in bases]
+
+
+def add_with_slug(post, text, attempts=5):
+    """Give ``post`` a fresh slug for ``text`` and flush it, retrying with
+    the next free slug when a concurrent insert took it first.
+
+    Each try runs in a SAVEPOINT, so a collision only undoes the post's
+    own INSERT and not the rest of the caller's transaction. Any other
+    IntegrityError (a missing column value, a bad foreign key) is raised
+    at once.
+    """
+    from .models import Post
+
+    for attempt in range(attempts):
+        post.slug = allocate_slug(text)
+        try:
+            with db.session.begin_nested():
+                db.session.add(post)
+        except IntegrityError:
+            # Drivers word constraint errors differently: ask the table instead
+            taken = db.session.execute(select(Post.id).where(Post.slug == post.slug).limit(1)).first()
+            if taken is None or attempt == attempts - 1:
+                raise
+            continue
+        return post.slug
@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import click
+from flask import current_app
+
+
+# ==========================
+# STARTUP TIMING
+# ==========================
+# create_app runs each extension's setup inside startup_step, which keeps
+# the time it took in app.extensions["startup_profile"]. `flask
+# startup-profile` combines that with `python -X importtime` to show where
+# a worker's cold start goes.
+@contextmanager
+def startup_step(app, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        app.extensions.setdefault("startup_profile", []).append((name, time.perf_counter() - started))
+
+
+# Run in a fresh interpreter, so nothing is imported yet
+PROBE = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+print(json.dumps({"import": imported - started, "create_app": time.perf_counter() - imported,
+                  "steps": app.extensions["startup_profile"]}))
+"""
+
+
+def parse_importtime(output):
+    """``{module: self seconds}`` from ``python -X importtime`` output."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(own) / 1e6
+    return modules
+
+
+def group_imports(modules):
+    """Self times summed per top-level package; this app's modules one by one."""
+    groups = defaultdict(float)
+    for name, seconds in modules.items():
+        groups[name if name.split(".")[0] == "app" else name.split(".")[0]] += seconds
+    return groups
+
+
+@click.command("startup-profile")
+@click.option("--top", default=15, show_default=True, help="Imports to list.")
+def startup_profile_command(top):
+    """Time imports and each create_app step in a fresh interpreter."""
+    root = os.path.dirname(current_app.root_path)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=root,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise click.ClickException(result.stderr.strip().splitlines()[-1])
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    imports = group_imports(parse_importtime(result.stderr))
+
+    click.echo(f"Imports (self time per package, top {top}):")
+    for name, seconds in sorted(imports.items(), key=lambda item: -item[1])[:top]:
+        click.echo(f"  {name:<32} {seconds * 1000:8.1f} ms")
+    click.echo("create_app steps:")
+    for name, seconds in timings["steps"]:
+        click.echo(f"  {name:<32} {seconds * 1000:8.1f} ms")
+    click.echo(f"Total: import {timings['import'] * 1000:.1f} ms, create_app {timings['create_app'] * 1000:.1f} ms")
+
+
+def init_startup(app):
+    app.cli.add_command(startup_profile_command)
@@ -0,0 +1,289 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+# Rollup columns per table; see CategoryStat, AuthorStat and DailyStat
+POST_COLUMNS = ("posts", "published", "views", "likes", "comments")
+DAILY_COLUMNS = ("posts", "comments", "views", "likes")
+UNCATEGORIZED = 0  # category_stat key for posts without a category
+
+
+def _tables():
+    from .models import CategoryStat, AuthorStat, DailyStat
+
+    return {
+        "category": (CategoryStat.__table__, "category_id", POST_COLUMNS),
+        "author": (AuthorStat.__table__, "user_id", POST_COLUMNS),
+        "day": (DailyStat.__table__, "day", DAILY_COLUMNS),
+    }
+
+
+# ==========================
+# APPLYING INCREMENTS
+# ==========================
+def apply_deltas(conn, deltas):
+    """Add ``{(kind, key): Counter(column=n)}`` to the rollup rows.
+
+    One upsert per touched row, on the caller's connection, so the rollups
+    commit or roll back together with the change that caused them.
+    """
+    tables = _tables()
+    for (kind, key), values in deltas.items():
+        values = {column: n for column, n in values.items() if n}
+        if values:
+            table, key_column, columns = tables[kind]
+            _upsert(conn, table, key_column, key, values, columns)
+
+
+def _upsert(conn, table, key_column, key, values, columns):
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values({key_column: key, **{c: values.get(c, 0) for c in columns}})
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[key_column],
+            set_={c: table.c[c] + stmt.excluded[c] for c in values},
+        ))
+        return
+
+    updated = conn.execute(
+        table.update().where(table.c[key_column] == key).values({c: table.c[c] + n for c, n in values.items()})
+    ).rowcount
+    if not updated:
+        conn.execute(table.insert().values({key_column: key, **{c: values.get(c, 0) for c in columns}}))
+
+
+def record_post_counts(conn, column, counts):
+    """Roll up ``{post_id: n}`` increments of Post.views or Post.likes that
+    were written with Core statements (which the session hooks don't see)."""
+    from .models import Post
+
+    if not counts:
+        return
+    deltas = defaultdict(Counter)
+    rows = conn.execute(select(Post.id, Post.category_id, Post.user_id).where(Post.id.in_(list(counts))))
+    for post_id, category_id, user_id in rows:
+        n = counts[post_id]
+        deltas[("category", category_id or UNCATEGORIZED)][column] += n
+        deltas[("author", user_id)][column] += n
+        deltas[("day", date.today())][column] += n
+    apply_deltas(conn, deltas)
+
+
+# ==========================
+# SESSION HOOK
+# ==========================
+def _committed(obj, name):
+    """Value of ``name`` before this flush."""
+    history = inspect(obj).attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, name)
+
+
+def _post_values(status, views, likes, sign):
+    return {
+        "posts": sign,
+        "published": sign if status == "published" else 0,
+        "views": sign * (views or 0),
+        "likes": sign * (likes or 0),
+    }
+
+
+def _day(value):
+    return (value or datetime.utcnow()).date()
+
+
+def _track_changes(session, flush_context):
+    """after_flush: turn Post and Comment changes into rollup increments."""
+    from .models import Post, Comment
+
+    if has_app_context() and not current_app.config.get("STATS_ENABLED", True):
+        return
+
+    deltas = defaultdict(Counter)
+    today = date.today()
+    moved = {}  # post id -> (old category, old author, new category, new author)
+
+    def add(kind, key, values):
+        deltas[(kind, key)].update(values)
+
+    for obj in session.new:
+        if isinstance(obj, Post):
+            values = _post_values(obj.status, obj.views, obj.likes, 1)
+            add("category", obj.category_id or UNCATEGORIZED, values)
+            add("author", obj.user_id, values)
+            add("day", _day(obj.created_at), {"posts": 1})
+
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            values = _post_values(_committed(obj, "status"), _committed(obj, "views"), _committed(obj, "likes"), -1)
+            add("category", _committed(obj, "category_id") or UNCATEGORIZED, values)
+            add("author", _committed(obj, "user_id"), values)
+            add("day", _day(_committed(obj, "created_at")), {"posts": -1})
+
+    for obj in session.dirty:
+        if not isinstance(obj, Post) or not session.is_modified(obj, include_collections=False):
+            continue
+        old_key = (_committed(obj, "category_id") or UNCATEGORIZED, _committed(obj, "user_id"))
+        new_key = (obj.category_id or UNCATEGORIZED, obj.user_id)
+        old = _post_values(_committed(obj, "status"), _committed(obj, "views"), _committed(obj, "likes"), -1)
+        new = _post_values(obj.status, obj.views, obj.likes, 1)
+        add("category", old_key[0], old)
+        add("category", new_key[0], new)
+        add("author", old_key[1], old)
+        add("author", new_key[1], new)
+        add("day", today, {"views": new["views"] + old["views"], "likes": new["likes"] + old["likes"]})
+        if old_key != new_key:
+            moved[obj.id] = old_key + new_key
+
+    # Comments count towards their post's category and author
+    new_comments = [obj for obj in session.new if isinstance(obj, Comment)]
+    deleted_comments = [obj for obj in session.deleted if isinstance(obj, Comment)]
+    if new_comments or deleted_comments or moved:
+        in_session = {obj.id: obj for obj in list(session.identity_map.values()) + list(session.deleted)
+                      if isinstance(obj, Post)}
+        wanted = {c.post_id for c in new_comments + deleted_comments} - set(in_session)
+        from_db = {}
+        if wanted:
+            rows = session.connection().execute(
+                select(Post.id, Post.category_id, Post.user_id).where(Post.id.in_(wanted)))
+            from_db = {post_id: (category_id or UNCATEGORIZED, user_id) for post_id, category_id, user_id in rows}
+
+        def owner(post_id, before_flush):
+            post = in_session.get(post_id)
+            if post is None:
+                return from_db.get(post_id)
+            if before_flush:
+                return (_committed(post, "category_id") or UNCATEGORIZED, _committed(post, "user_id"))
+            return (post.category_id or UNCATEGORIZED, post.user_id)
+
+        new_per_post = Counter(c.post_id for c in new_comments)
+        for comments, sign in ((new_comments, 1), (deleted_comments, -1)):
+            for comment in comments:
+                key = owner(comment.post_id, before_flush=sign < 0)
+                if key is None:
+                    continue
+                add("category", key[0], {"comments": sign})
+                add("author", key[1], {"comments": sign})
+                add("day", _day(comment.created_at if sign > 0 else _committed(comment, "created_at")),
+                    {"comments": sign})
+
+        if moved:
+            # Comments that stay on a post follow it to its new category/author
+            rows = session.connection().execute(
+                select(Comment.post_id, func.count(Comment.id))
+                .where(Comment.post_id.in_(list(moved)))
+                .group_by(Comment.post_id))
+            for post_id, count in rows:
+                count -= new_per_post.get(post_id, 0)
+                old_category, old_author, new_category, new_author = moved[post_id]
+                add("category", old_category, {"comments": -count})
+                add("category", new_category, {"comments": count})
+                add("author", old_author, {"comments": -count})
+                add("author", new_author, {"comments": count})
+
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def init_stats(app):
+    app.config.setdefault("STATS_ENABLED", True)
+    app.cli.add_command(stats_cli)
+    if not event.contains(Session, "after_flush", _track_changes):
+        event.listen(Session, "after_flush", _track_changes)
+
+
+# ==========================
+# RECONCILIATION
+# ==========================
+def compute_rollups(conn):
+    """Rollups recomputed from the source tables, in apply_deltas() format.
+
+    Daily views and likes are not included: they are counted as they
+    happen and there is no per-day record to rebuild them from.
+    """
+    from .models import Post, Comment
+
+    rollups = defaultdict(Counter)
+    published = func.sum(case((Post.status == "published", 1), else_=0))
+    for kind, column in (("category", Post.category_id), ("author", Post.user_id)):
+        def key(value):
+            return value or UNCATEGORIZED if kind == "category" else value
+
+        rows = conn.execute(
+            select(column, func.count(Post.id), published,
+                   func.coalesce(func.sum(Post.views), 0), func.coalesce(func.sum(Post.likes), 0))
+            .group_by(column))
+        for value, posts, pub, views, likes in rows:
+            rollups[(kind, key(value))].update({"posts": posts, "published": pub or 0, "views": views, "likes": likes})
+
+        rows = conn.execute(
+            select(column, func.count(Comment.id)).join(Post, Comment.post_id == Post.id).group_by(column))
+        for value, comments in rows:
+            rollups[(kind, key(value))]["comments"] += comments
+
+    for model, column in ((Post, "posts"), (Comment, "comments")):
+        rows = conn.execute(select(func.date(model.created_at), func.count(model.id)).group_by(func.date(model.created_at)))
+        for day, count in rows:
+            if day is not None:
+                rollups[("day", date.fromisoformat(day) if isinstance(day, str) else day)][column] += count
+    return rollups
+
+
+def rebuild(conn):
+    """Replace the rollups with freshly computed ones; returns the number
+    of rows that had drifted."""
+    fresh = compute_rollups(conn)
+    tables = _tables()
+    drifted = 0
+    for kind, (table, key_column, columns) in tables.items():
+        rebuilt = [c for c in columns if kind != "day" or c in ("posts", "comments")]
+        current = {row[0]: row[1:] for row in conn.execute(select(table.c[key_column], *[table.c[c] for c in rebuilt]))}
+        wanted = {key: tuple(values.get(c, 0) for c in rebuilt) for (k, key), values in fresh.items() if k == kind}
+        for key in set(current) | set(wanted):
+            if tuple(current.get(key, (0,) * len(rebuilt))) != wanted.get(key, (0,) * len(rebuilt)):
+                drifted += 1
+
+        if kind == "day":
+            conn.execute(table.update().values({c: 0 for c in rebuilt}))
+            for key, values in wanted.items():
+                _set_row(conn, table, key_column, key, dict(zip(rebuilt, values)), columns)
+        else:
+            conn.execute(table.delete())
+            if wanted:
+                conn.execute(table.insert(), [{key_column: key, **dict(zip(rebuilt, values))}
+                                              for key, values in wanted.items()])
+    return drifted
+
+
+def _set_row(conn, table, key_column, key, values, columns):
+    updated = conn.execute(table.update().where(table.c[key_column] == key).values(values)).rowcount
+    if not updated:
+        conn.execute(table.insert().values({key_column: key, **{c: values.get(c, 0) for c in columns}}))
+
+
+# ==========================
+# CLI: flask stats
+# ==========================
+stats_cli = AppGroup("stats", help="Maintain the admin statistics rollups.")
+
+
+@stats_cli.command("rebuild")
+def rebuild_command():
+    """Recompute category, author and daily rollups from posts and comments."""
+    from . import db
+
+    with db.engine.begin() as conn:
+        drifted = rebuild(conn)
+    click.echo(f"Statistics rebuilt ({drifted} rows corrected).")
@@ -0,0 +1,110 @@
+import json
+import random
+import time
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# ==========================
+# REQUEST TIMING
+# ==========================
+# With SERVER_TIMING on, every request records how long its SQL statements
+# took (and how many ran), how long templates took to render and how long
+# the whole view took, and reports it in a Server-Timing header that the
+# browser's dev tools show under "Timing":
+#
+#   Server-Timing: db;dur=4.1;desc="5 queries", render;dur=2.0, view;dur=9.7
+#
+# A SERVER_TIMING_LOG_SAMPLE fraction of requests is also logged as one JSON
+# line, and every request slower than SLOW_REQUEST_MS (or its endpoint's
+# entry in SLOW_REQUEST_ENDPOINTS) is logged as a warning with all its
+# statements and their times. When off, no hooks are installed at all.
+class RequestTiming:
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault("SERVER_TIMING", False)
+        app.config.setdefault("SERVER_TIMING_HEADER", True)
+        app.config.setdefault("SERVER_TIMING_LOG_SAMPLE", 0.01)
+        app.config.setdefault("SLOW_REQUEST_MS", 500)
+        app.config.setdefault("SLOW_REQUEST_ENDPOINTS", {})
+        app.extensions["request_timing"] = self
+        if not app.config["SERVER_TIMING"]:
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(_render_started, app)
+        template_rendered.connect(_render_finished, app)
+        if not event.contains(Engine, "before_cursor_execute", _statement_started):
+            event.listen(Engine, "before_cursor_execute", _statement_started)
+            event.listen(Engine, "after_cursor_execute", _statement_finished)
+
+    def _start(self):
+        g.request_timing = {"start": time.perf_counter(), "db": 0.0, "statements": [], "render": 0.0}
+
+    def _finish(self, response):
+        timing = g.pop("request_timing", None)
+        if timing is None:
+            return response
+        view = time.perf_counter() - timing["start"]
+        queries = len(timing["statements"])
+        if self.app.config["SERVER_TIMING_HEADER"]:
+            response.headers.add("Server-Timing", ", ".join((
+                f'db;dur={timing["db"] * 1000:.1f};desc="{queries} queries"',
+                f'render;dur={timing["render"] * 1000:.1f}',
+                f"view;dur={view * 1000:.1f}",
+            )))
+
+        summary = {
+            "endpoint": request.endpoint, "method": request.method, "path": request.path,
+            "status": response.status_code, "view_ms": round(view * 1000, 1),
+            "db_ms": round(timing["db"] * 1000, 1), "queries": queries,
+            "render_ms": round(timing["render"] * 1000, 1),
+        }
+        limit = self.app.config["SLOW_REQUEST_ENDPOINTS"].get(request.endpoint, self.app.config["SLOW_REQUEST_MS"])
+        if view * 1000 > limit:
+            self.app.logger.warning("Slow request, %s ms (limit %s ms): %s\n  %s", summary["view_ms"], limit,
+                                    json.dumps(summary),
+                                    "\n  ".join(f"{ms * 1000:.1f} ms  {sql}" for sql, ms in timing["statements"]))
+        elif random.random() < self.app.config["SERVER_TIMING_LOG_SAMPLE"]:
+            self.app.logger.info("request timing %s", json.dumps(summary))
+        return response
+
+
+def _current():
+    return g.get("request_timing") if has_request_context() else None
+
+
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current() is not None:
+        context._timing_started = time.perf_counter()
+
+
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_timing_started", None)
+    timing = _current()
+    if started is None or timing is None:
+        return
+    took = time.perf_counter() - started
+    timing["db"] += took
+    timing["statements"].append((statement, took))
+
+
+def _render_started(sender, template, context, **extra):
+    timing = _current()
+    if timing is not None:
+        timing.setdefault("render_stack", []).append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra):
+    timing = _current()
+    if timing is not None and timing.get("render_stack"):
+        started = timing["render_stack"].pop()
+        if not timing["render_stack"]:  # templates rendered inside one count once
+            timing["render"] += time.perf_counter() - started
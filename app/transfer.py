@@ -0,0 +1,466 @@
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import or_, select, text
+from werkzeug.security import generate_password_hash
+
+KINDS = ("users", "categories", "posts", "comments", "replies")  # in dependency order
+FORMATS = ("jsonl", "csv")
+
+
+# ==========================
+# RECORD FORMATS
+# ==========================
+# One flat record per row. References are by natural key (author username,
+# category name, post slug) so a file can be loaded into a database whose
+# ids differ; "id", "user_id", "post_id" etc. are used when present, which
+# is what export writes, so an exported file re-imports as-is.
+FIELDS = {
+    "users": ["id", "username", "email", "password_hash", "is_admin", "created_at"],
+    "categories": ["id", "name"],
+    "posts": ["id", "title", "slug", "content", "status", "views", "likes", "media_filename",
+              "created_at", "updated_at", "category", "author"],
+    "comments": ["id", "post", "author", "content", "likes", "created_at", "updated_at"],
+    "replies": ["id", "comment_id", "author", "content", "created_at"],
+}
+INTEGERS = {"id", "user_id", "category_id", "post_id", "comment_id", "views", "likes"}
+DATETIMES = {"created_at", "updated_at"}
+
+
+def _value(name, value):
+    """A CSV/JSON value converted to what the column expects."""
+    if value is None or value == "":
+        return None
+    if name in INTEGERS:
+        return int(value)
+    if name in DATETIMES:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if name == "is_admin":
+        return value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes")
+    return value
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def read_records(stream, fmt):
+    """Yield dicts from a JSONL or CSV stream, one line at a time."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield row
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _format_for(path, fmt):
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+# ==========================
+# BATCH INSERTS
+# ==========================
+def _insert_rows(table, rows):
+    """executemany INSERT that skips rows hitting a unique key (re-imports,
+    resumed batches). Returns the number of rows inserted."""
+    from . import db
+
+    if not rows:
+        return 0
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return db.session.execute(table.insert(), rows).rowcount
+    # executemany needs every row to carry the same keys; rows without an
+    # id (the database assigns one) go in their own group
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return sum(db.session.execute(insert(table).on_conflict_do_nothing(), group).rowcount
+               for group in groups.values())
+
+
+def _lookup(column, key_column, values):
+    """``{natural key: id}`` for the given keys, in one query."""
+    from . import db
+
+    values = {v for v in values if v is not None}
+    if not values:
+        return {}
+    rows = db.session.execute(select(key_column, column).where(key_column.in_(values)))
+    return {key: id_ for key, id_ in rows}
+
+
+def _user_ids(records):
+    from .models import User
+
+    return _lookup(User.id, User.username, (r.get("author") for r in records if not r.get("user_id")))
+
+
+def _prepare_users(records, counts):
+    from .models import User
+
+    rows = []
+    for record in records:
+        password_hash = record.get("password_hash") or (
+            generate_password_hash(record["password"]) if record.get("password") else None)
+        if not record.get("username") or not record.get("email") or not password_hash:
+            counts["skipped"] += 1
+            continue
+        rows.append({
+            **({"id": _value("id", record["id"])} if record.get("id") else {}),
+            "username": record["username"],
+            "email": record["email"],
+            "password_hash": password_hash,
+            "is_admin": bool(_value("is_admin", record.get("is_admin"))),
+            "created_at": _value("created_at", record.get("created_at")) or datetime.utcnow(),
+        })
+    return User.__table__, rows
+
+
+def _prepare_categories(records, counts):
+    from .models import Category
+
+    rows = []
+    for record in records:
+        if not record.get("name"):
+            counts["skipped"] += 1
+            continue
+        rows.append({**({"id": _value("id", record["id"])} if record.get("id") else {}), "name": record["name"]})
+    return Category.__table__, rows
+
+
+def _category_ids(names):
+    """Ids for category names, creating the ones that don't exist yet."""
+    from .models import Category
+
+    names = {name for name in names if name}
+    found = _lookup(Category.id, Category.name, names)
+    missing = names - set(found)
+    if missing:
+        _insert_rows(Category.__table__, [{"name": name} for name in sorted(missing)])
+        found.update(_lookup(Category.id, Category.name, missing))
+    return found
+
+
+def _prepare_posts(records, counts):
+    from . import db
+    from .models import Post
+    from .slugs import allocate_slugs
+
+    users = _user_ids(records)
+    categories = _category_ids(r.get("category") for r in records if not r.get("category_id"))
+    unslugged = [r for r in records if not r.get("slug")]
+    # Taken slugs for the whole batch in one query, see app/slugs.py
+    for record, slug in zip(unslugged, allocate_slugs([r.get("title") for r in unslugged])):
+        record["slug"] = slug
+
+    # Posts already in the database (a re-import) are left out up front, so
+    # media references are only counted for rows really inserted
+    ids = [_value("id", r["id"]) for r in records if r.get("id")]
+    present = db.session.execute(
+        select(Post.id, Post.slug).where(or_(Post.slug.in_([r["slug"] for r in records]), Post.id.in_(ids)))).all()
+    present_ids, present_slugs = {row.id for row in present}, {row.slug for row in present}
+
+    rows = []
+    now = datetime.utcnow()
+    for record in records:
+        if record["slug"] in present_slugs or (record.get("id") and _value("id", record["id"]) in present_ids):
+            continue
+        user_id = _value("user_id", record.get("user_id")) or users.get(record.get("author"))
+        if not record.get("title") or record.get("content") is None or user_id is None:
+            counts["skipped"] += 1
+            continue
+        rows.append({
+            **({"id": _value("id", record["id"])} if record.get("id") else {}),
+            "title": record["title"],
+            "slug": record["slug"],
+            "content": record["content"],
+            "status": record.get("status") or "published",
+            "views": _value("views", record.get("views")) or 0,
+            "likes": _value("likes", record.get("likes")) or 0,
+            "media_filename": record.get("media_filename") or None,
+            "created_at": _value("created_at", record.get("created_at")) or now,
+            "updated_at": _value("updated_at", record.get("updated_at")) or now,
+            "category_id": _value("category_id", record.get("category_id")) or categories.get(record.get("category")),
+            "user_id": user_id,
+        })
+    return Post.__table__, rows
+
+
+def _prepare_comments(records, counts):
+    from .models import Post, Comment
+
+    users = _user_ids(records)
+    posts = _lookup(Post.id, Post.slug, (r.get("post") for r in records if not r.get("post_id")))
+    rows = []
+    now = datetime.utcnow()
+    for record in records:
+        user_id = _value("user_id", record.get("user_id")) or users.get(record.get("author"))
+        post_id = _value("post_id", record.get("post_id")) or posts.get(record.get("post"))
+        if not record.get("content") or user_id is None or post_id is None:
+            counts["skipped"] += 1
+            continue
+        rows.append({
+            **({"id": _value("id", record["id"])} if record.get("id") else {}),
+            "content": record["content"],
+            "likes": _value("likes", record.get("likes")) or 0,
+            "created_at": _value("created_at", record.get("created_at")) or now,
+            "updated_at": _value("updated_at", record.get("updated_at")) or now,
+            "user_id": user_id,
+            "post_id": post_id,
+        })
+    return Comment.__table__, rows
+
+
+def _prepare_replies(records, counts):
+    from .models import Reply
+
+    users = _user_ids(records)
+    rows = []
+    now = datetime.utcnow()
+    for record in records:
+        user_id = _value("user_id", record.get("user_id")) or users.get(record.get("author"))
+        comment_id = _value("comment_id", record.get("comment_id"))
+        if not record.get("content") or user_id is None or comment_id is None:
+            counts["skipped"] += 1
+            continue
+        rows.append({
+            **({"id": _value("id", record["id"])} if record.get("id") else {}),
+            "content": record["content"],
+            "created_at": _value("created_at", record.get("created_at")) or now,
+            "user_id": user_id,
+            "comment_id": comment_id,
+        })
+    return Reply.__table__, rows
+
+
+PREPARE = {
+    "users": _prepare_users,
+    "categories": _prepare_categories,
+    "posts": _prepare_posts,
+    "comments": _prepare_comments,
+    "replies": _prepare_replies,
+}
+
+
+def _count_media(rows):
+    """Core inserts skip the media session hook, so count post references
+    here or `flask media gc` would treat the files as unused."""
+    from . import db
+    from .models import MediaBlob
+
+    names = Counter(row["media_filename"] for row in rows if row.get("media_filename"))
+    table = MediaBlob.__table__
+    for name, n in names.items():
+        db.session.execute(table.update().where(table.c.filename == name).values(ref_count=table.c.ref_count + n))
+
+
+def import_records(kind, records, batch_size=1000, on_batch=None):
+    """Insert ``records`` in batches of ``batch_size``, one transaction each.
+
+    ``on_batch(records_done, counts)`` runs after every commit, e.g. to
+    save a checkpoint. Rows whose references can't be resolved are
+    skipped; rows that already exist (same id or unique key) are ignored.
+    Returns the counts of inserted, existing and skipped rows.
+    """
+    from . import db
+
+    counts = Counter()
+    done = 0
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        skipped = counts["skipped"]
+        table, rows = PREPARE[kind](batch, counts)
+        inserted = _insert_rows(table, rows)
+        if kind == "posts":
+            _count_media(rows)
+        db.session.commit()
+        counts["inserted"] += inserted
+        counts["existing"] += len(batch) - (counts["skipped"] - skipped) - inserted
+        done += len(batch)
+        if on_batch:
+            on_batch(done, counts)
+    return counts
+
+
+def _reset_sequences(kind):
+    """PostgreSQL: move the id sequence past ids loaded explicitly."""
+    from . import db
+
+    if db.session.get_bind().dialect.name != "postgresql":
+        return
+    table = {"users": "user", "categories": "category", "posts": "post",
+             "comments": "comment", "replies": "reply"}[kind]
+    db.session.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)"))
+    db.session.commit()
+
+
+def refresh_derived():
+    """Rebuild what the session hooks would have maintained row by row."""
+    from . import db
+    from .pagecache import EVERYTHING, bump_versions
+    from .stats import rebuild
+
+    with db.engine.begin() as conn:
+        rebuild(conn)
+        current_app.extensions["search_index"].rebuild(conn)
+        bump_versions(conn, [EVERYTHING])
+    current_app.extensions["page_cache"].store.clear()
+    projection = current_app.extensions["post_projection"]
+    if projection.enabled:
+        projection.rebuild()
+
+
+# ==========================
+# EXPORT
+# ==========================
+def export_query(kind):
+    """SELECT for ``kind`` in FIELDS order, with references as natural keys."""
+    from .models import User, Category, Post, Comment, Reply
+
+    if kind == "users":
+        stmt = select(User.id, User.username, User.email, User.password_hash, User.is_admin, User.created_at)
+        return stmt.order_by(User.id)
+    if kind == "categories":
+        return select(Category.id, Category.name).order_by(Category.id)
+    if kind == "posts":
+        return (
+            select(Post.id, Post.title, Post.slug, Post.content, Post.status, Post.views, Post.likes,
+                   Post.media_filename, Post.created_at, Post.updated_at,
+                   Category.name.label("category"), User.username.label("author"))
+            .outerjoin(Category, Post.category_id == Category.id)
+            .join(User, Post.user_id == User.id)
+            .order_by(Post.id)
+        )
+    if kind == "comments":
+        return (
+            select(Comment.id, Post.slug.label("post"), User.username.label("author"), Comment.content,
+                   Comment.likes, Comment.created_at, Comment.updated_at)
+            .join(Post, Comment.post_id == Post.id)
+            .join(User, Comment.user_id == User.id)
+            .order_by(Comment.id)
+        )
+    return (
+        select(Reply.id, Reply.comment_id, User.username.label("author"), Reply.content, Reply.created_at)
+        .join(User, Reply.user_id == User.id)
+        .order_by(Reply.id)
+    )
+
+
+def export_records(kind, batch_size=1000):
+    """Yield ``kind`` rows as dicts, streamed ``batch_size`` rows at a time
+    (a server-side cursor where the driver has one), so memory use stays
+    flat however large the table."""
+    from . import db
+
+    result = db.session.execute(export_query(kind).execution_options(yield_per=batch_size))
+    for row in result:
+        yield {key: _serialize(value) for key, value in row._mapping.items()}
+
+
+# ==========================
+# CLI: flask data
+# ==========================
+data_cli = AppGroup("data", help="Bulk import and export of users, categories, posts, comments and replies.")
+
+
+def _checkpoint_path(path, kind):
+    return f"{path}.{kind}.checkpoint"
+
+
+@data_cli.command("import")
+@click.argument("kind", type=click.Choice(KINDS))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="Input format (default: from the file extension).")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows per transaction.")
+@click.option("--resume/--restart", default=True, show_default=True,
+              help="Continue after the last committed batch of an interrupted import.")
+@click.option("--refresh/--no-refresh", default=True, show_default=True,
+              help="Rebuild statistics and the search index afterwards.")
+def import_command(kind, path, fmt, batch_size, resume, refresh):
+    """Import KIND records from a JSONL or CSV file.
+
+    Import in dependency order: users, categories, posts, comments, replies.
+    Progress is saved after every committed batch in PATH.KIND.checkpoint,
+    so re-running an interrupted import picks up where it stopped.
+    """
+    checkpoint = _checkpoint_path(path, kind)
+    start = 0
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            start = json.load(f)["records"]
+        click.echo(f"Resuming {kind} import after {start} records.")
+
+    def save(done, counts):
+        with open(checkpoint + ".tmp", "w") as f:
+            json.dump({"records": start + done}, f)
+        os.replace(checkpoint + ".tmp", checkpoint)
+        click.echo(f"{kind}: {start + done} records ({counts['inserted']} inserted, "
+                   f"{counts['existing']} existing, {counts['skipped']} skipped)")
+
+    with open(path, newline="", encoding="utf-8") as stream:
+        records = islice(read_records(stream, _format_for(path, fmt)), start, None)
+        counts = import_records(kind, records, batch_size, on_batch=save)
+
+    _reset_sequences(kind)
+    if refresh and kind in ("posts", "comments"):
+        refresh_derived()
+    if os.path.exists(checkpoint):
+        os.unlink(checkpoint)
+    click.echo(f"Imported {counts['inserted']} {kind} ({counts['existing']} already present, "
+               f"{counts['skipped']} skipped).")
+
+
+@data_cli.command("export")
+@click.argument("kind", type=click.Choice(KINDS))
+@click.option("--output", "-o", type=click.Path(dir_okay=False), help="Output file (default: stdout).")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="Output format (default: from the file extension).")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows fetched per round trip.")
+def export_command(kind, output, fmt, batch_size):
+    """Export KIND records as JSONL or CSV, in a format `flask data import` reads."""
+    fmt = _format_for(output or "", fmt)
+    stream = open(output, "w", newline="", encoding="utf-8") if output else sys.stdout
+    try:
+        writer = csv.DictWriter(stream, fieldnames=FIELDS[kind]) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        count = 0
+        for record in export_records(kind, batch_size):
+            if writer:
+                writer.writerow(record)
+            else:
+                stream.write(json.dumps(record) + "\n")
+            count += 1
+    finally:
+        if output:
+            stream.close()
+    if output:
+        click.echo(f"Exported {count} {kind} to {output}.")
+
+
+def init_transfer(app):
+    app.cli.add_command(data_cli)
@@ -8,10 +8,101 @@ class Config:
         "sqlite:///site.db"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite connection profile (app/database.py): WAL and friends on every
+    # connection. Set SQLITE_PROFILE=0 for SQLite's defaults.
+    SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "1") == "1"
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))  # ms to wait for a lock
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "normal")
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))  # bytes
+
+    # Optional read replica: GET requests of views marked @replica_reads
+    # (app/database.py) read from it. After a write a user reads from the
+    # primary for DB_REPLICA_MAX_LAG seconds; a replica lagging more than
+    # that is skipped.
+    SQLALCHEMY_REPLICA_URI = os.environ.get("DATABASE_REPLICA_URL")
+    DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 2))  # seconds
+
+    # Connection pool per worker process, for server databases
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))  # seconds
+
     # File uploads
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), "app", "static", "uploads")
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max
 
+    # Media delivery (see app/media.py). MEDIA_OFFLOAD hands file bodies to
+    # the front proxy: "x-accel-redirect" (nginx, internal location at
+    # MEDIA_ACCEL_PREFIX mapped to app/static/uploads) or "x-sendfile".
+    MEDIA_OFFLOAD = os.environ.get("MEDIA_OFFLOAD")
+    MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/_uploads")
+    MEDIA_MAX_AGE = 24 * 3600  # seconds, for files without a content hash in the name
+    MEDIA_GC_GRACE = int(os.environ.get("MEDIA_GC_GRACE", 3600))  # seconds a claimed upload is safe from gc
+
+    # Post view counting: "batched" buffers views per worker and writes them
+    # in one UPDATE every few seconds, "sync" writes on every request
+    VIEW_COUNTER_MODE = os.environ.get("VIEW_COUNTER_MODE", "batched")
+    VIEW_COUNTER_FLUSH_INTERVAL = int(os.environ.get("VIEW_COUNTER_FLUSH_INTERVAL", 5))  # seconds
+    VIEW_COUNTER_FLUSH_THRESHOLD = int(os.environ.get("VIEW_COUNTER_FLUSH_THRESHOLD", 200))  # pending views
+
+    # Rendered page cache for anonymous readers: "memory" (per worker) or
+    # "filesystem" (shared by all workers on the host, under PAGE_CACHE_DIR).
+    # Either way invalidation reaches every worker: tag versions live in the
+    # database (content_version)
+    PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE_ENABLED", "1") == "1"
+    PAGE_CACHE_BACKEND = os.environ.get("PAGE_CACHE_BACKEND", "memory")
+    PAGE_CACHE_DIR = os.environ.get("PAGE_CACHE_DIR")
+    PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 60))  # seconds
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", 2048))
+
+    # Comment threads: comments are paged newest first and each shows its
+    # first REPLY_PREVIEW replies, the rest load on demand
+    COMMENTS_PER_PAGE = int(os.environ.get("COMMENTS_PER_PAGE", 20))
+    REPLY_PREVIEW = int(os.environ.get("REPLY_PREVIEW", 3))
+    REPLIES_PER_PAGE = int(os.environ.get("REPLIES_PER_PAGE", 20))
+
+    # Background jobs (app/jobs.py), run by `flask jobs worker`. With
+    # JOB_QUEUE_EAGER tasks run inline in the request instead.
+    JOB_QUEUE_EAGER = os.environ.get("JOB_QUEUE_EAGER", "0") == "1"
+    JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+    JOB_VISIBILITY_TIMEOUT = int(os.environ.get("JOB_VISIBILITY_TIMEOUT", 300))  # seconds a claimed job is held
+    JOB_RETRY_BACKOFF = int(os.environ.get("JOB_RETRY_BACKOFF", 10))  # seconds, doubled per failed attempt
+    # "thread" builds image derivatives in the web worker, "queue" hands them to the job worker
+    IMAGE_DERIVATIVES_MODE = os.environ.get("IMAGE_DERIVATIVES_MODE", "thread")
+
+    # Admin statistics rollups (app/stats.py); rebuild with `flask stats rebuild`
+    STATS_ENABLED = os.environ.get("STATS_ENABLED", "1") == "1"
+
+    # MongoDB, used by the post projection below; the client is created on
+    # first use (app/clients.py)
+    MONGO_URI = os.environ.get("MONGO_URI")
+
+    # MongoDB read model of post pages (app/projection.py): "off", "write"
+    # (keep it current, e.g. while `flask projection rebuild` backfills it)
+    # or "read" (also serve blog.view_post and blog.index from it)
+    POST_PROJECTION = os.environ.get("POST_PROJECTION", "off")
+    POST_PROJECTION_DATABASE = os.environ.get("POST_PROJECTION_DATABASE", "blog")
+
+    # Seconds `flask repair run` sleeps between chunks, besides as long as
+    # the chunk's transaction took
+    REPAIR_PAUSE = float(os.environ.get("REPAIR_PAUSE", 0.1))
+
+    # Per-request timing (app/timing.py): Server-Timing header, a sampled
+    # JSON log line, and a warning with the SQL of every request slower than
+    # SLOW_REQUEST_MS. Off by default; nothing is hooked in when off.
+    SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+    SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "1") == "1"
+    SERVER_TIMING_LOG_SAMPLE = float(os.environ.get("SERVER_TIMING_LOG_SAMPLE", 0.01))  # fraction of requests
+    SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", 500))
+    SLOW_REQUEST_ENDPOINTS = {}  # per-endpoint limits, e.g. {"admin.stats": 2000}
+
+    # Metrics shared by all workers on the host (app/metrics.py), served in
+    # Prometheus format at /admin/metrics to admins, or to scrapers sending
+    # "Authorization: Bearer <METRICS_TOKEN>"
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+    METRICS_DIR = os.environ.get("METRICS_DIR")  # default: instance/metrics
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
     # Email (for password reset etc.)
     MAIL_SERVER = "smtp.gmail.com"
     MAIL_PORT = 587
@@ -0,0 +1,13 @@
+# Read by gunicorn from the working directory (`gunicorn main:app`).
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+# Build the app once in the master and fork workers from it: workers start
+# in milliseconds and share the imported code's memory. What must not be
+# shared is reset in each child on its own: database pools are dropped by
+# an os.register_at_fork hook (app/database.py), and the Mongo client, view
+# counter flusher and image thread pool are created per process id on
+# first use. With preloading, new code needs a restart rather than a HUP;
+# set GUNICORN_PRELOAD=0 to import the app in every worker instead.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
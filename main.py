@@ -1,6 +1,5 @@
 from app import create_app
 from flask import redirect, url_for
-from app.models import db
 
 # Create the app
 app = create_app()
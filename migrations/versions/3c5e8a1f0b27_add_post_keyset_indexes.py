@@ -0,0 +1,30 @@
+"""add post keyset pagination indexes
+
+Revision ID: 3c5e8a1f0b27
+Revises: 9ab5f8730484
+Create Date: 2026-10-18 09:12:44.201733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c5e8a1f0b27'
+down_revision = '9ab5f8730484'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_post_status_created_at_id', ['status', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_post_category_status_created_at_id', ['category_id', 'status', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_category_status_created_at_id')
+        batch_op.drop_index('ix_post_status_created_at_id')
+        batch_op.drop_index('ix_post_created_at_id')
@@ -0,0 +1,51 @@
+"""add statistics rollup tables
+
+Run `flask stats rebuild` after upgrading to fill them from existing data.
+
+Revision ID: 5f9d3b6e8a21
+Revises: e4a1c7d92f36
+Create Date: 2026-10-18 17:40:52.301877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f9d3b6e8a21'
+down_revision = 'e4a1c7d92f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for name, key in (('category_stat', sa.Column('category_id', sa.Integer(), autoincrement=False, nullable=False)),
+                      ('author_stat', sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False))):
+        op.create_table(name,
+        key,
+        sa.Column('posts', sa.Integer(), nullable=False),
+        sa.Column('published', sa.Integer(), nullable=False),
+        sa.Column('views', sa.Integer(), nullable=False),
+        sa.Column('likes', sa.Integer(), nullable=False),
+        sa.Column('comments', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint(key.name)
+        )
+    op.create_table('daily_stat',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('posts', sa.Integer(), nullable=False),
+    sa.Column('comments', sa.Integer(), nullable=False),
+    sa.Column('views', sa.Integer(), nullable=False),
+    sa.Column('likes', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_views', ['views'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_views')
+
+    op.drop_table('daily_stat')
+    op.drop_table('author_stat')
+    op.drop_table('category_stat')
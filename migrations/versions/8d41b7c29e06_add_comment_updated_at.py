@@ -0,0 +1,26 @@
+"""add comment updated_at
+
+Revision ID: 8d41b7c29e06
+Revises: 3c5e8a1f0b27
+Create Date: 2026-10-18 13:20:05.417982
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7c29e06'
+down_revision = '3c5e8a1f0b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
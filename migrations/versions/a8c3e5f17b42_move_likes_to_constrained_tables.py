@@ -0,0 +1,53 @@
+"""move likes to the constrained post_like/comment_like tables
+
+Copies rows from the unconstrained post_likes/comment_likes tables
+(dropping duplicates), drops those tables and recounts post.likes and
+comment.likes from the rows, which also repairs counts lost to the old
+read-modify-write increments.
+
+Revision ID: a8c3e5f17b42
+Revises: 5f9d3b6e8a21
+Create Date: 2026-10-18 18:55:13.402193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c3e5f17b42'
+down_revision = '5f9d3b6e8a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for legacy, table, target in (('post_likes', 'post_like', 'post'), ('comment_likes', 'comment_like', 'comment')):
+        column = f'{target}_id'
+        op.execute(f"""
+            INSERT INTO {table} (user_id, {column})
+            SELECT DISTINCT l.user_id, l.{column} FROM {legacy} l
+            WHERE l.user_id IS NOT NULL AND l.{column} IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.user_id = l.user_id AND t.{column} = l.{column})
+        """)
+        op.execute(f"""
+            UPDATE {target} SET likes = (SELECT count(*) FROM {table} t WHERE t.{column} = {target}.id)
+        """)
+        op.drop_table(legacy)
+
+
+def downgrade():
+    op.create_table('post_likes',
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('post_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], )
+    )
+    op.create_table('comment_likes',
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('comment_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['comment_id'], ['comment.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], )
+    )
+    op.execute("INSERT INTO post_likes (user_id, post_id) SELECT user_id, post_id FROM post_like")
+    op.execute("INSERT INTO comment_likes (user_id, comment_id) SELECT user_id, comment_id FROM comment_like")
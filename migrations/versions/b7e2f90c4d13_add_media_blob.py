@@ -0,0 +1,38 @@
+"""add media_blob
+
+Revision ID: b7e2f90c4d13
+Revises: 8d41b7c29e06
+Create Date: 2026-10-18 15:02:37.660214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f90c4d13'
+down_revision = '8d41b7c29e06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('media_blob',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('filename', sa.String(length=200), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('filename')
+    )
+    with op.batch_alter_table('media_blob', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_media_blob_sha256'), ['sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('media_blob', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_media_blob_sha256'))
+
+    op.drop_table('media_blob')
@@ -0,0 +1,32 @@
+"""add comment and reply thread indexes
+
+Revision ID: c2d4f6a8b0e3
+Revises: a8c3e5f17b42
+Create Date: 2026-10-18 19:48:30.527114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d4f6a8b0e3'
+down_revision = 'a8c3e5f17b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index('ix_comment_post_created_at_id', ['post_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('reply', schema=None) as batch_op:
+        batch_op.create_index('ix_reply_comment_created_at_id', ['comment_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reply', schema=None) as batch_op:
+        batch_op.drop_index('ix_reply_comment_created_at_id')
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_comment_post_created_at_id')
@@ -0,0 +1,29 @@
+"""add content_version
+
+Revision ID: d5e7a9c1b3f4
+Revises: c2d4f6a8b0e3
+Create Date: 2026-10-18 21:05:12.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5e7a9c1b3f4'
+down_revision = 'c2d4f6a8b0e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('content_version',
+    sa.Column('tag', sa.String(length=300), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('tag')
+    )
+
+
+def downgrade():
+    op.drop_table('content_version')
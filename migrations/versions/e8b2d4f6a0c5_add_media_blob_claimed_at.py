@@ -0,0 +1,26 @@
+"""add media_blob claimed_at
+
+Revision ID: e8b2d4f6a0c5
+Revises: d5e7a9c1b3f4
+Create Date: 2026-10-19 10:12:44.170395
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b2d4f6a0c5'
+down_revision = 'd5e7a9c1b3f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('media_blob', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('media_blob', schema=None) as batch_op:
+        batch_op.drop_column('claimed_at')
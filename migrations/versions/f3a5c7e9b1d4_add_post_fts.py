@@ -0,0 +1,32 @@
+"""add post_fts search index
+
+Revision ID: f3a5c7e9b1d4
+Revises: e8b2d4f6a0c5
+Create Date: 2026-10-18 23:12:40.118502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a5c7e9b1d4'
+down_revision = 'e8b2d4f6a0c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite only (app/search.py); elsewhere, or without FTS5, search uses
+    # LIKE. The table starts empty: fill it with `flask search rebuild`.
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    if not bind.execute(sa.text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+        return
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, content, tokenize='unicode61')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS post_fts")
@@ -1,15 +1,6 @@
-from app import create_app, db
-from app.models import User, Post, Comment, Category 
-from flask_migrate import Migrate
-
-
-app = create_app()
-migrate = Migrate(app, db)
-
+# Local development server; gunicorn serves main:app
+from main import app
 
 
 if __name__ == '__main__':
-    
-    
-    
-    app.run(port=5000,debug=True)
+    app.run(port=5000, debug=True)
@@ -0,0 +1,80 @@
+"""Throughput of blog.media on a large upload: full GETs, seeking with
+Range requests, and X-Accel-Redirect offload.
+
+Usage: python scripts/bench_media.py [--size-mb 200] [--requests 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+from app import create_app
+from app.media import media_folder
+
+
+def report(name, requests, nbytes, elapsed):
+    print(f"{name:>28}: {requests / elapsed:9.1f} req/s  {nbytes / elapsed / 2**20:9.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--range-kb", type=int, default=1024)
+    args = parser.parse_args()
+
+    app = create_app()
+    client = app.test_client()
+    size = args.size_mb * 2**20
+    filename = f"bench_{'0' * 16}.mp4"
+
+    with app.test_request_context():
+        path = os.path.join(media_folder(), filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(2**20))
+
+    try:
+        url = f"/blog/media/{filename}"
+
+        started = time.perf_counter()
+        total = 0
+        for _ in range(args.requests):
+            resp = client.get(url)
+            total += len(resp.get_data())
+            resp.close()
+        report("full GET", args.requests, total, time.perf_counter() - started)
+
+        span = args.range_kb * 1024
+        rng = random.Random(1)
+        seeks = args.requests * 50
+        started = time.perf_counter()
+        total = 0
+        for _ in range(seeks):
+            start = rng.randrange(0, size - span)
+            resp = client.get(url, headers={"Range": f"bytes={start}-{start + span - 1}"})
+            assert resp.status_code == 206
+            total += len(resp.get_data())
+            resp.close()
+        report(f"Range {args.range_kb}KB seeks", seeks, total, time.perf_counter() - started)
+
+        app.config["MEDIA_OFFLOAD"] = "x-accel-redirect"
+        started = time.perf_counter()
+        for _ in range(seeks):
+            client.get(url).close()
+        elapsed = time.perf_counter() - started
+        report("X-Accel-Redirect (app side)", seeks, 0, elapsed)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Search latency on a large archive: FTS5 index vs the old LIKE scan.
+
+Usage: python scripts/bench_search.py [--posts 100000] [--runs 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+from app import create_app, db, search_index
+from app.models import User, Category, Post
+
+# A small set of news words plus a long Zipf-distributed tail, so common
+# words match many posts and rare ones only a handful, like a real archive
+WORDS = ("lagos abuja senate election football transfer church music nollywood fuel price naira "
+         "court ruling police governor minister budget league match concert album festival").split()
+WORDS += [f"w{i:05d}" for i in range(20000)]
+WEIGHTS = [1.0 / (rank + 20) for rank in range(len(WORDS))]
+
+
+def seed(app, posts):
+    rng = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", email="bench@example.com")
+        user.set_password("bench")
+        db.session.add_all([user, Category(name="general")])
+        db.session.commit()
+
+        start = datetime(2024, 1, 1)
+        rows = [
+            {
+                "title": " ".join(rng.choices(WORDS, WEIGHTS, k=6)).title(),
+                "slug": f"bench-post-{i}",
+                "content": " ".join(rng.choices(WORDS, WEIGHTS, k=120)),
+                "status": "published",
+                "views": 0,
+                "likes": 0,
+                "user_id": user.id,
+                "category_id": 1,
+                "created_at": start + timedelta(minutes=i),
+                "updated_at": start + timedelta(minutes=i),
+            }
+            for i in range(posts)
+        ]
+        db.session.execute(Post.__table__.insert(), rows)
+        db.session.commit()
+
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            search_index.rebuild(conn)
+        print(f"Indexed {posts} posts in {time.perf_counter() - started:.2f}s")
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app()
+    seed(app, args.posts)
+
+    with app.app_context():
+        for q in ("senate", "fuel price", "nollywood concert", "festi", "w01234"):
+            base = Post.query.filter(Post.status == "published")
+
+            def like():
+                base.filter(Post.title.ilike(f"%{q}%")).order_by(Post.created_at.desc()).limit(6).all()
+
+            def fts():
+                search_index.search(base, q).limit(6).all()
+
+            for name, fn in (("LIKE title", like), ("FTS5", fts)):
+                p50, p95 = timed(fn, args.runs)
+                print(f"{q!r:>22} {name:>10}: p50 {p50:8.2f} ms  p95 {p95:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Mixed read/write throughput on SQLite with and without the connection
+profile from app/database.py (WAL, busy_timeout, synchronous=NORMAL, ...).
+
+Several forked worker processes, like gunicorn's, run listing reads and
+comment inserts against one database file for a fixed time.
+
+Usage: python scripts/bench_sqlite_profile.py [--processes 4] [--seconds 10] [--write-ratio 0.2]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(app, posts):
+    from app import db
+    from app.models import User, Category, Post
+
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", email="bench@example.com")
+        user.set_password("bench")
+        category = Category(name="general")
+        db.session.add_all([user, category])
+        db.session.commit()
+        for i in range(posts):
+            db.session.add(Post(title=f"Bench post {i}", slug=f"bench-post-{i}", content="Lorem ipsum " * 50,
+                                status="published", views=0, user_id=user.id, category_id=category.id,
+                                created_at=datetime.utcnow()))
+        db.session.commit()
+        return user.id
+
+
+def work(app, user_id, posts, seconds, write_ratio, results):
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from app.models import Post, Comment
+
+    reads = writes = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if random.random() < write_ratio:
+                    db.session.add(Comment(content="bench", user_id=user_id, post_id=random.randint(1, posts),
+                                           created_at=datetime.utcnow()))
+                    db.session.commit()
+                    writes += 1
+                else:
+                    Post.query.filter_by(status="published").order_by(Post.created_at.desc(), Post.id.desc()) \
+                        .limit(6).all()
+                    db.session.query(db.func.count(Comment.id)).filter_by(post_id=random.randint(1, posts)).scalar()
+                    db.session.commit()
+                    reads += 1
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    results.put({"reads": reads, "writes": writes, "errors": errors,
+                 "p99": latencies[int(len(latencies) * 0.99)] if latencies else 0})
+
+
+def run_variant(args):
+    """Runs in its own interpreter, so the profile is read from a fresh config."""
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    app = create_app()
+    user_id = seed(app, args.posts)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    children = [context.Process(target=work, args=(app, user_id, args.posts, args.seconds, args.write_ratio, results))
+                for _ in range(args.processes)]
+    for child in children:
+        child.start()
+    totals = [results.get() for _ in children]
+    for child in children:
+        child.join()
+    print(json.dumps({
+        "reads": sum(t["reads"] for t in totals),
+        "writes": sum(t["writes"] for t in totals),
+        "errors": sum(t["errors"] for t in totals),
+        "p99": max(t["p99"] for t in totals),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args)
+        return
+
+    for name, profile in (("default", "0"), ("profile", "1")):
+        tmpdir = tempfile.mkdtemp()
+        env = dict(os.environ, SQLITE_PROFILE=profile,
+                   DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+        out = subprocess.run([sys.executable, __file__, "--variant", name, *sys.argv[1:]],
+                             env=env, capture_output=True, text=True)
+        if out.returncode:
+            sys.exit(out.stderr)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        ops = result["reads"] + result["writes"]
+        print(f"{name:>8}: {ops / args.seconds:8.1f} ops/s  (reads {result['reads']}, writes {result['writes']}, "
+              f"lock errors {result['errors']}, p99 {result['p99'] * 1000:.1f} ms, {args.processes} processes)")
+
+
+if __name__ == "__main__":
+    main()
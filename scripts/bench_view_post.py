@@ -0,0 +1,82 @@
+"""Requests/sec on blog.view_post with synchronous vs batched view counting.
+
+Usage: python scripts/bench_view_post.py [--requests 2000] [--threads 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+from app import create_app, db, view_counter
+from app.models import User, Category, Post
+
+
+def seed(app, posts):
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", email="bench@example.com")
+        user.set_password("bench")
+        category = Category(name="general")
+        db.session.add_all([user, category])
+        db.session.commit()
+        for i in range(posts):
+            db.session.add(Post(title=f"Bench post {i}", slug=f"bench-post-{i}", content="Lorem ipsum " * 50,
+                                status="published", views=0, user_id=user.id, category_id=category.id,
+                                created_at=datetime.utcnow()))
+        db.session.commit()
+
+
+def run(app, mode, requests, threads, posts):
+    app.config["VIEW_COUNTER_MODE"] = mode
+    per_thread = requests // threads
+    errors = []
+
+    def worker(n):
+        client = app.test_client()
+        for i in range(per_thread):
+            resp = client.get(f"/blog/post/bench-post-{(n + i) % posts}")
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+
+    with app.app_context():
+        before = db.session.query(db.func.sum(Post.views)).scalar() or 0
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    view_counter.flush()
+
+    with app.app_context():
+        counted = (db.session.query(db.func.sum(Post.views)).scalar() or 0) - before
+    total = per_thread * threads
+    print(f"{mode:>8}: {total / elapsed:8.1f} req/s  ({total} requests, {threads} threads, "
+          f"{elapsed:.2f}s, views counted {counted}, errors {len(errors)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--posts", type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app()
+    seed(app, args.posts)
+    for mode in ("sync", "batched"):
+        run(app, mode, args.requests, args.threads, args.posts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Hammer the like endpoints from many threads and check no count is lost.
+
+Every user likes the same post and comment several times at once (only
+the first may count), then a random subset unlikes again, also
+concurrently and repeatedly. Afterwards post.likes and comment.likes
+must equal the number of like rows, and the expected number of users.
+Exits non-zero on any mismatch.
+
+Usage: python scripts/check_like_concurrency.py [--users 40] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'likes.db')}"
+
+from app import create_app, db
+from app.models import User, Category, Post, Comment, PostLike, CommentLike
+
+
+def seed(app, users):
+    with app.app_context():
+        db.create_all()
+        people = [User(username=f"reader{i}", email=f"reader{i}@example.com") for i in range(users)]
+        for person in people:
+            person.set_password("pw")
+        category = Category(name="general")
+        db.session.add_all([category, *people])
+        db.session.commit()
+        post = Post(title="Hot post", slug="hot-post", content="Like me", status="published",
+                    user_id=people[0].id, category_id=category.id, created_at=datetime.utcnow())
+        db.session.add(post)
+        db.session.commit()
+        comment = Comment(content="Like me too", user_id=people[0].id, post_id=post.id)
+        db.session.add(comment)
+        db.session.commit()
+        return post.id, comment.id
+
+
+def run_concurrently(app, users, repeat, make_urls):
+    """One thread per user, each hitting its URLs ``repeat`` times."""
+    clients = []
+    for i in users:
+        client = app.test_client()
+        client.post("/login", data={"ident": f"reader{i}", "password": "pw"})
+        clients.append(client)
+
+    barrier = threading.Barrier(len(clients))
+    errors = []
+
+    def work(client, urls):
+        barrier.wait()
+        for _ in range(repeat):
+            for url in urls:
+                response = client.post(url, headers={"Accept": "application/json"})
+                if response.status_code != 200:
+                    errors.append((url, response.status_code))
+
+    threads = [threading.Thread(target=work, args=(client, make_urls())) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def counts(app, post_id, comment_id):
+    with app.app_context():
+        return (
+            db.session.get(Post, post_id).likes,
+            PostLike.query.filter_by(post_id=post_id).count(),
+            db.session.get(Comment, comment_id).likes,
+            CommentLike.query.filter_by(comment_id=comment_id).count(),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.update(PAGE_CACHE_ENABLED=False)
+    post_id, comment_id = seed(app, args.users)
+    everyone = list(range(args.users))
+    quitters = set(random.sample(everyone, args.users // 3))
+
+    failed = False
+
+    def check(stage, expected):
+        nonlocal failed
+        post_likes, post_rows, comment_likes, comment_rows = counts(app, post_id, comment_id)
+        ok = post_likes == post_rows == expected and comment_likes == comment_rows == expected
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {stage:<8} post.likes={post_likes} rows={post_rows}  "
+              f"comment.likes={comment_likes} rows={comment_rows}  expected={expected}")
+
+    errors = run_concurrently(app, everyone, args.repeat,
+                              lambda: [f"/blog/like/{post_id}", f"/blog/like_comment/{comment_id}"])
+    check("like", args.users)
+    errors += run_concurrently(app, sorted(quitters), args.repeat,
+                               lambda: [f"/blog/unlike/{post_id}", f"/blog/unlike_comment/{comment_id}"])
+    check("unlike", args.users - len(quitters))
+
+    if errors:
+        print(f"{len(errors)} requests failed, e.g. {errors[:3]}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Check the MongoDB post projection against SQL, using mongomock.
+
+Seeds a SQLite file, backfills the projection, then changes posts,
+comments and categories through the ORM so the session hooks keep the
+documents in sync. After each step:
+
+- every listing (all posts and per category, keyset paged both ways and
+  offset paged) returns the same posts, total and cursors as the SQL
+  listing in blog.index;
+- every published post's page has the same counters, comment page and
+  reply previews as SQL, and unpublished posts have no document;
+- listing totals come from the post count cache.
+
+Exits non-zero on any mismatch.
+
+Usage: python scripts/check_projection.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'blog.db')}"
+os.environ["POST_PROJECTION"] = "read"
+os.environ["PAGE_CACHE_ENABLED"] = "0"
+os.environ["COMMENTS_PER_PAGE"] = "4"
+os.environ["REPLY_PREVIEW"] = "2"
+
+import mongomock
+from flask import current_app
+
+from app import create_app, db, post_counts, post_projection
+from app.blog.routes import _list_posts
+from app.models import User, Category, Post, Comment, Reply
+
+PER_PAGE = 3
+
+
+def seed(app):
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(3)]
+        for user in users:
+            user.set_password("pw")
+        categories = [Category(name="general"), Category(name="tech")]
+        db.session.add_all(users + categories)
+        db.session.commit()
+
+        start = datetime(2025, 1, 1)
+        for i in range(14):
+            # Pairs of posts share a timestamp, so cursors need the id tiebreak
+            db.session.add(Post(title=f"Post {i}", slug=f"post-{i}", content=f"Body {i}",
+                                status="draft" if i % 5 == 4 else "published", views=i * 3, likes=i % 4,
+                                user_id=users[i % 3].id, category_id=categories[i % 2].id,
+                                created_at=start + timedelta(hours=i // 2)))
+        db.session.commit()
+        for post in Post.query.filter(Post.id % 3 == 0):
+            for j in range(6):
+                comment = Comment(content=f"Comment {j} on {post.slug}", post_id=post.id,
+                                  user_id=users[j % 3].id, created_at=post.created_at + timedelta(minutes=j))
+                db.session.add(comment)
+                db.session.flush()
+                for k in range(j % 4):
+                    db.session.add(Reply(content=f"Reply {k}", comment_id=comment.id, user_id=users[k % 3].id,
+                                         created_at=comment.created_at + timedelta(seconds=k)))
+        db.session.commit()
+
+
+def change(app):
+    """Edits the session hooks have to carry over to the projection."""
+    with app.app_context():
+        user = User.query.filter_by(username="user0").one()
+        tech = Category.query.filter_by(name="tech").one()
+        db.session.add(Post(title="Fresh post", slug="fresh-post", content="New", status="published",
+                            user_id=user.id, category_id=tech.id, created_at=datetime(2025, 2, 1)))
+        Post.query.filter_by(slug="post-1").one().title = "Post 1, retitled"
+        Post.query.filter_by(slug="post-2").one().status = "draft"
+        Post.query.filter_by(slug="post-4").one().status = "published"
+        Post.query.filter_by(slug="post-5").one().category_id = tech.id
+        db.session.commit()
+        post = Post.query.filter_by(slug="post-3").one()
+        db.session.add(Comment(content="Late comment", post_id=post.id, user_id=user.id,
+                               created_at=datetime(2025, 3, 1)))
+        db.session.commit()
+        tech.name = "technology"
+        user.username = "renamed"
+        db.session.commit()
+
+
+def compare(label, failures):
+    def expect(what, ok):
+        if not ok:
+            print(f"FAIL {label}: {what}")
+            failures.append(f"{label}: {what}")
+        return ok
+
+    def ids(posts):
+        return [p.id for p in posts]
+
+    categories = [None] + [c.name for c in Category.query.order_by(Category.name)]
+    for cat in categories:
+        where = f"cat={cat}"
+        post_counts.clear()
+        total = post_projection.listing(PER_PAGE, cat=cat)[1]
+        expect(f"{where} total from the count cache", ("blog.index", cat) in post_counts._counts)
+        post_counts.clear()
+        expect(f"{where} total", total == _list_posts(PER_PAGE, "", cat, None, None, None)[1])
+
+        # Forward through the keyset pages, then back from the last one
+        pages, after = [], None
+        while True:
+            mongo = post_projection.listing(PER_PAGE, cat=cat, after=after)
+            sql = _list_posts(PER_PAGE, "", cat, after, None, None)
+            if not expect(f"{where} after={after} posts", ids(mongo[0]) == ids(sql[0])):
+                break
+            expect(f"{where} after={after} cursors", mongo[2:] == sql[2:])
+            pages.append(mongo)
+            after = mongo[3]
+            if not after:
+                break
+        for page in reversed(pages[1:]):
+            mongo = post_projection.listing(PER_PAGE, cat=cat, before=page[2])
+            sql = _list_posts(PER_PAGE, "", cat, None, page[2], None)
+            expect(f"{where} before={page[2]} posts", ids(mongo[0]) == ids(sql[0]))
+            expect(f"{where} before={page[2]} cursors", mongo[2:] == sql[2:])
+        for number in range(1, len(pages) + 2):
+            mongo = post_projection.listing(PER_PAGE, cat=cat, page=number)
+            sql = _list_posts(PER_PAGE, "", cat, None, None, number)
+            expect(f"{where} page={number} posts", ids(mongo[0]) == ids(sql[0]))
+
+    per_page, preview = current_app.config["COMMENTS_PER_PAGE"], current_app.config["REPLY_PREVIEW"]
+    for post in Post.query.order_by(Post.id):
+        where = f"post {post.slug}"
+        page = post_projection.page(post.slug)
+        if post.status != "published":
+            expect(f"{where} unpublished but projected", page is None)
+            continue
+        if not expect(f"{where} missing", page is not None):
+            continue
+        projected = page.post
+        expect(f"{where} fields", (projected.title, projected.content, projected.views, projected.likes,
+                                   projected.created_at, projected.user.username)
+               == (post.title, post.content, post.views or 0, post.likes or 0, post.created_at, post.user.username))
+        expect(f"{where} category", (projected.category.name if projected.category else None)
+               == (post.category.name if post.category else None))
+
+        comments = (Comment.query.filter_by(post_id=post.id)
+                    .order_by(Comment.created_at.desc(), Comment.id.desc()).all())
+        expect(f"{where} comment total", page.comment_total == len(comments))
+        expect(f"{where} comment page", ids(page.comments) == ids(comments[:per_page]))
+        expect(f"{where} next comments", (page.next_comments_cursor is not None) == (len(comments) > per_page))
+        for comment in comments[:per_page]:
+            replies = (Reply.query.filter_by(comment_id=comment.id)
+                       .order_by(Reply.created_at, Reply.id).all())
+            expect(f"{where} replies of comment {comment.id}",
+                   ids(page.reply_previews[comment.id]) == ids(replies[:preview])
+                   and page.reply_totals[comment.id] == len(replies))
+
+
+def main():
+    app = create_app()
+    app.config["TESTING"] = True
+    post_projection.database = mongomock.MongoClient()["blog"]
+    seed(app)
+    failures = []
+
+    with app.app_context():
+        # Seeding went through the hooks too: start from an empty collection
+        post_projection.collection.drop()
+        written = post_projection.rebuild(chunk_size=4)
+        print(f"Projected {written} posts")
+        compare("after rebuild", failures)
+
+    change(app)
+    with app.app_context():
+        compare("after edits", failures)
+        body = app.test_client().get("/blog/?cat=technology").get_data(as_text=True)
+        if "Fresh post" not in body or "renamed" not in body:
+            failures.append("blog.index from the projection")
+            print("FAIL blog.index doesn't show the projected posts")
+
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    if failures:
+        sys.exit(f"{len(failures)} check(s) failed")
+    print("Post projection OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Fail if any route runs more SQL statements than its @query_budget.
+
+Seeds a post with a large comment thread (so per-row lazy loads would
+show up as hundreds of statements), requests every budgeted page and
+exits non-zero on the first route over budget.
+
+Usage: python scripts/check_query_budgets.py [--comments 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'budget.db')}"
+
+from app import create_app, db
+from app.models import User, Category, Post, Comment, Reply
+from app.querybudget import QueryBudgetExceeded
+
+
+def seed(app, comments):
+    with app.app_context():
+        db.create_all()
+        admin = User(username="admin", email="admin@example.com", is_admin=True)
+        admin.set_password("admin")
+        users = [User(username=f"reader{i}", email=f"reader{i}@example.com", password_hash="x") for i in range(20)]
+        category = Category(name="general")
+        db.session.add_all([admin, category, *users])
+        db.session.commit()
+
+        for i in range(12):
+            db.session.add(Post(title=f"Post {i}", slug=f"post-{i}", content="Lorem ipsum", status="published",
+                                user_id=users[i % len(users)].id, category_id=category.id,
+                                created_at=datetime.utcnow()))
+        db.session.commit()
+
+        post = Post.query.filter_by(slug="post-0").first()
+        for i in range(comments):
+            comment = Comment(content=f"Comment {i}", user_id=users[i % len(users)].id, post_id=post.id)
+            db.session.add(comment)
+            db.session.flush()
+            for j in range(3):
+                db.session.add(Reply(content="Reply", user_id=users[(i + j) % len(users)].id, comment_id=comment.id))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--comments", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config.update(TESTING=True, QUERY_BUDGET_ENFORCE=True)
+    seed(app, args.comments)
+    budget = app.extensions["query_budget"]
+
+    anonymous = app.test_client()
+    admin = app.test_client()
+    admin.post("/login", data={"ident": "admin", "password": "admin"})
+
+    checks = [
+        (anonymous, "/blog/"),
+        (anonymous, "/blog/?page=2"),
+        (anonymous, "/blog/?cat=general"),
+        (anonymous, "/blog/?q=lorem"),
+        (anonymous, "/blog/post/post-0"),
+        (admin, "/blog/post/post-0"),
+        (anonymous, "/blog/post/post-0/comments"),
+        (anonymous, "/blog/comment/1/replies"),
+        (anonymous, "/api/posts"),
+        (admin, "/admin/"),
+        (admin, "/admin/posts.json"),
+        (admin, "/admin/stats"),
+        (admin, "/admin/posts.json?status=published&sort=views&dir=asc&page=2&per_page=5"),
+    ]
+
+    failed = False
+    for client, url in checks:
+        try:
+            resp = client.get(url)
+        except QueryBudgetExceeded as exc:
+            print(f"FAIL {url}\n{exc}")
+            failed = True
+            continue
+        endpoint, count, _ = budget.last
+        limit = app.view_functions[endpoint].query_budget
+        if callable(limit):
+            limit = limit()
+        print(f"ok   {url:<24} {resp.status_code}  {count}/{limit} statements ({endpoint})")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Check read-replica routing against two local SQLite files.
+
+The replica file starts as a copy of the primary, then the primary moves
+on (a retitled post), so every page shows which database it read from:
+
+- anonymous GETs of blog.index, blog.view_post and api.posts read the replica;
+- other pages, and all writes, use the primary;
+- after posting a comment the author reads from the primary, and sees the
+  comment, until DB_REPLICA_MAX_LAG has passed; then the replica again.
+
+Exits non-zero on any mismatch.
+
+Usage: python scripts/check_replica_routing.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+tmpdir = tempfile.mkdtemp()
+PRIMARY = os.path.join(tmpdir, "primary.db")
+REPLICA = os.path.join(tmpdir, "replica.db")
+MAX_LAG = 1.0
+os.environ["DATABASE_URL"] = f"sqlite:///{PRIMARY}"
+os.environ["DATABASE_REPLICA_URL"] = f"sqlite:///{REPLICA}"
+os.environ["DB_REPLICA_MAX_LAG"] = str(MAX_LAG)
+os.environ["PAGE_CACHE_ENABLED"] = "0"  # check the database, not the page cache
+
+from app import create_app, db
+from app.models import User, Category, Post
+
+
+def seed(app):
+    with app.app_context():
+        db.create_all()
+        user = User(username="reader", email="reader@example.com")
+        user.set_password("pw")
+        category = Category(name="general")
+        db.session.add_all([user, category])
+        db.session.commit()
+        db.session.add(Post(title="Replica title", slug="the-post", content="Hello", status="published",
+                            user_id=user.id, category_id=category.id, created_at=datetime.utcnow()))
+        db.session.commit()
+        # WAL keeps recent pages in the -wal file: fold them in before copying
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        shutil.copyfile(PRIMARY, REPLICA)
+        db.session.execute(db.update(Post).values(title="Primary title"))
+        db.session.commit()
+
+
+def main():
+    app = create_app()
+    app.config["TESTING"] = True
+    seed(app)
+    failures = []
+
+    def expect(label, response, present, absent=()):
+        body = response.get_data(as_text=True)
+        ok = response.status_code == 200 and all(p in body for p in present) and not any(a in body for a in absent)
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+        if not ok:
+            failures.append(label)
+
+    anonymous = app.test_client()
+    expect("index reads the replica", anonymous.get("/blog/"), ["Replica title"], ["Primary title"])
+    expect("post page reads the replica", anonymous.get("/blog/post/the-post"), ["Replica title"])
+    expect("api.posts reads the replica", anonymous.get("/api/posts"), ["Replica title"])
+
+    reader = app.test_client()
+    reader.post("/login", data={"ident": "reader", "password": "pw"})
+    expect("logged-in index reads the replica", reader.get("/blog/"), ["Replica title"])
+
+    reader.post("/blog/post/the-post", data={"content": "Fresh comment"})
+    expect("after a write the author reads the primary", reader.get("/blog/post/the-post"),
+           ["Primary title", "Fresh comment"])
+    expect("other readers still read the replica", anonymous.get("/blog/post/the-post"),
+           ["Replica title"], ["Fresh comment"])
+
+    time.sleep(MAX_LAG + 0.1)
+    expect("after DB_REPLICA_MAX_LAG the author reads the replica again", reader.get("/blog/post/the-post"),
+           ["Replica title"], ["Fresh comment"])
+
+    with app.app_context():
+        replica = db.engines["replica"]
+        with replica.connect() as conn:
+            comments = conn.exec_driver_sql("SELECT count(*) FROM comment").scalar()
+    print(f"{'ok  ' if comments == 0 else 'FAIL'} nothing was written to the replica")
+    if comments:
+        failures.append("replica written")
+
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    if failures:
+        sys.exit(f"{len(failures)} check(s) failed")
+    print("Replica routing OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
+"""Create the default categories and a sample user.
+
+For real data use the bulk loader instead, e.g.
+``flask data import posts posts.jsonl`` (see app/transfer.py).
+"""
 from app import create_app, db
-from app.models import User, Category, Post
+from app.models import User, Category
+from app.transfer import import_records
+
 app = create_app()
 with app.app_context():
-    if not Category.query.first():
-        cats = ['Politics','Religion','Tech','Entertainment','Music','Security','Health','Naija Gist']
-        for c in cats:
-            Category(name=c, slug=c.lower().replace(' ','-')).save = None
+    cats = ['Politics', 'Religion', 'Tech', 'Entertainment', 'Music', 'Security', 'Health', 'Naija Gist']
+    import_records("categories", [{"name": c} for c in cats])
     if not User.query.filter_by(username='sampleuser').first():
         u = User(username='sampleuser', email='user@example.com')
         u.set_password('password123')
         db.session.add(u)
         db.session.commit()
-    print('Sample setup done (you may need to run migrations).')
+    print(f'Sample setup done: {Category.query.count()} categories (you may need to run migrations).')
@@ -0,0 +1,182 @@
+"""Fill a database with a synthetic but realistic blog, the same for the
+same --seed and --scale every time (password hashes aside, they are salted).
+
+Comment threads, replies and likes are skewed like real traffic: a few hot
+posts get most of the discussion. Timestamps count from a fixed date, not
+from now. Every user's password is "password"; user 1, "admin", is an
+admin and user 2, "reader", a plain reader (scripts/loadtest.py logs in
+as both).
+
+Rows go in through the bulk importer (app/transfer.py), then statistics
+and the search index are rebuilt as `flask data import` would.
+
+Usage: python scripts/generate_dataset.py --database sqlite:////tmp/blog-bench.db [--scale small|medium|full] [--seed 1]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {
+    "small": dict(users=200, posts=1000, comments=20000, replies=10000, post_likes=20000, comment_likes=10000),
+    "medium": dict(users=2000, posts=10000, comments=200000, replies=100000, post_likes=200000,
+                   comment_likes=100000),
+    "full": dict(users=20000, posts=100000, comments=2000000, replies=1000000, post_likes=2000000,
+                 comment_likes=1000000),
+}
+# The first six are the ones admin.new_post creates when missing: with them
+# present, opening the editor doesn't write, so the dataset stays as generated
+CATEGORIES = ["general", "politics", "religion", "sport", "entertainment", "Naija gist", "tech", "music", "health",
+              "business"]
+WORDS = ("lagos abuja election music album concert match league goal market price naira policy senate "
+         "church festival health clinic doctor school student exam phone network startup funding artist "
+         "movie premiere rain flood road traffic fuel power grid bank loan court judge minister police "
+         "security village city youth coach player transfer record release review fans weekend news").split()
+EPOCH = datetime(2024, 1, 1)
+BATCH = 5000
+
+
+def skewed(rng, n, power=2.5):
+    """An index in range(n), small ones far more often: hot items first."""
+    return int(n * rng.random() ** power)
+
+
+def sentence(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def post_time(post_id, posts):
+    # Spread evenly over a year, oldest first
+    return EPOCH + timedelta(seconds=post_id * 365 * 86400 // posts)
+
+
+def users(counts, password_hash):
+    yield {"id": 1, "username": "admin", "email": "admin@example.com", "password_hash": password_hash,
+           "is_admin": True, "created_at": EPOCH}
+    yield {"id": 2, "username": "reader", "email": "reader@example.com", "password_hash": password_hash,
+           "is_admin": False, "created_at": EPOCH}
+    for i in range(3, counts["users"] + 1):
+        yield {"id": i, "username": f"user{i:06d}", "email": f"user{i:06d}@example.com",
+               "password_hash": password_hash, "is_admin": False, "created_at": EPOCH}
+
+
+def posts(rng, counts):
+    for i in range(1, counts["posts"] + 1):
+        title = sentence(rng, 4, 10).capitalize()
+        created = post_time(i, counts["posts"])
+        yield {
+            "id": i, "title": title, "slug": f"{'-'.join(title.lower().split()[:6])}-{i}",
+            "content": "\n\n".join(sentence(rng, 40, 120).capitalize() + "." for _ in range(rng.randint(2, 6))),
+            "status": "draft" if rng.random() < 0.03 else "published",
+            "views": int(rng.paretovariate(1.2) * 50),
+            "created_at": created, "updated_at": created,
+            "category_id": rng.randint(1, len(CATEGORIES)), "user_id": rng.randint(1, max(counts["users"] // 20, 1)),
+        }
+
+
+def comments(rng, counts):
+    for i in range(1, counts["comments"] + 1):
+        # Hot posts are the newest ones
+        post_id = counts["posts"] - skewed(rng, counts["posts"])
+        created = post_time(post_id, counts["posts"]) + timedelta(minutes=rng.randint(1, 20000))
+        yield {"id": i, "post_id": post_id, "user_id": rng.randint(1, counts["users"]),
+               "content": sentence(rng, 3, 40), "created_at": created, "updated_at": created}
+
+
+def replies(rng, counts):
+    for i in range(1, counts["replies"] + 1):
+        yield {"id": i, "comment_id": counts["comments"] - skewed(rng, counts["comments"]),
+               "user_id": rng.randint(1, counts["users"]), "content": sentence(rng, 2, 25),
+               "created_at": EPOCH + timedelta(days=366, minutes=i)}
+
+
+def likes(rng, users_count, targets, total, key, liked):
+    """Unique (user, target) pairs, hot targets liked most; ``liked``
+    counts them per target."""
+    seen = set()
+    while len(seen) < total:
+        pair = (rng.randint(1, users_count), targets - skewed(rng, targets))
+        if pair not in seen:
+            seen.add(pair)
+            liked[pair[1]] += 1
+            yield {"user_id": pair[0], key: pair[1]}
+
+
+def insert_likes(rng, counts, model, target_model):
+    """Insert like rows, then set the targets' like counters to match."""
+    from sqlalchemy import bindparam
+    from app import db
+
+    table, target_table = model.__table__, target_model.__table__
+    key = "post_id" if "post_id" in table.c else "comment_id"
+    liked = Counter()
+    total = counts["post_likes" if key == "post_id" else "comment_likes"]
+    rows = likes(rng, counts["users"], counts["posts" if key == "post_id" else "comments"], total, key, liked)
+    while True:
+        batch = list(islice(rows, BATCH))
+        if not batch:
+            break
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+    # updated_at would default to now: keep the generated one
+    stmt = target_table.update().where(target_table.c.id == bindparam("target")).values(
+        likes=bindparam("n"), updated_at=target_table.c.updated_at)
+    db.session.execute(stmt, [{"target": target, "n": n} for target, n in liked.items()])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database", required=True, help="SQLAlchemy URL; an existing database is added to")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=1)
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"override the scale's {name}")
+    args = parser.parse_args()
+    counts = {name: getattr(args, name) or default for name, default in SCALES[args.scale].items()}
+    counts["users"] = max(counts["users"], 2)
+
+    os.environ["DATABASE_URL"] = args.database
+    os.environ.setdefault("STATS_ENABLED", "1")
+    from app import create_app, db
+    from app.models import User, Post, Comment, PostLike, CommentLike
+    from app.transfer import import_records, refresh_derived
+
+    app = create_app()
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.create_all()
+        sample = User()
+        sample.set_password("password")
+        steps = [
+            ("users", lambda: import_records("users", users(counts, sample.password_hash), BATCH)),
+            ("categories", lambda: import_records(
+                "categories", ({"id": i, "name": n} for i, n in enumerate(CATEGORIES, 1)), BATCH)),
+            ("posts", lambda: import_records("posts", posts(rng, counts), BATCH)),
+            ("comments", lambda: import_records("comments", comments(rng, counts), BATCH)),
+            ("replies", lambda: import_records("replies", replies(rng, counts), BATCH)),
+            ("post likes", lambda: insert_likes(rng, counts, PostLike, Post)),
+            ("comment likes", lambda: insert_likes(rng, counts, CommentLike, Comment)),
+        ]
+        for name, step in steps:
+            started = time.perf_counter()
+            step()
+            print(f"{name:<14} {time.perf_counter() - started:7.1f} s")
+
+        started = time.perf_counter()
+        refresh_derived()
+        if db.engine.dialect.name == "sqlite":
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"{'derived data':<14} {time.perf_counter() - started:7.1f} s")
+    print("Dataset ready: " + ", ".join(f"{n} {name.replace('_', ' ')}" for name, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""Load-test every route, in-process and through gunicorn, and compare runs.
+
+    python scripts/generate_dataset.py --database sqlite:////tmp/blog-bench.db --scale medium
+    python scripts/loadtest.py run --database sqlite:////tmp/blog-bench.db --output baseline.json
+    # ... change something ...
+    python scripts/loadtest.py run --database sqlite:////tmp/blog-bench.db --output current.json
+    python scripts/loadtest.py compare baseline.json current.json
+
+Each scenario is one route with realistic arguments, requested as an
+anonymous visitor, as "reader" or as "admin" (see generate_dataset.py). It
+runs --requests times from --concurrency threads, first through the Flask
+test client in this process ("client"), then over HTTP against gunicorn on
+localhost ("gunicorn"). Throughput and p50/p95/p99 latency are recorded per
+scenario and target. URLs and form data come from a seeded RNG, so two runs
+send the same requests. Write scenarios run last. Each target gets a fresh
+copy of a SQLite database, so the dataset stays as generated.
+
+`compare` flags scenarios whose p95 latency rose or whose throughput fell
+by more than --threshold, and exits non-zero if there are any.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_dataset import WORDS  # noqa: E402  (same directory)
+
+ROLES = {"reader": "reader", "admin": "admin"}  # role -> username; password is "password"
+
+# Routes no scenario drives, and why
+SKIPPED = {
+    "auth.create_admin": "creates admin accounts",
+    "auth.logout": "ends the session the scenario runs in",
+    "blog.media": "needs uploaded files; see scripts/bench_media.py",
+    "admin.delete_post": "destructive",
+    "admin.delete_user": "destructive",
+    "admin.delete_category": "destructive",
+    "admin.publish_all": "destructive",
+}
+
+
+# ==========================
+# SCENARIOS
+# ==========================
+# (name, endpoint, role, writes, build) where build(rng, samples, i) returns
+# (method, url, form data or None) for the i-th request
+def _slug(rng, s):
+    # Half the traffic goes to the hottest posts
+    return rng.choice(s["hot_slugs"] if rng.random() < 0.5 else s["slugs"])
+
+
+SCENARIOS = [
+    ("home", "home", None, False, lambda rng, s, i: ("GET", "/", None)),
+    ("static", "static", None, False, lambda rng, s, i: ("GET", "/static/style.css", None)),
+    ("auth.login", "auth.login", None, False, lambda rng, s, i: ("GET", "/login", None)),
+    ("auth.register", "auth.register", None, False, lambda rng, s, i: ("GET", "/register", None)),
+    ("blog.index", "blog.index", None, False, lambda rng, s, i: ("GET", "/blog/", None)),
+    ("blog.index:deep", "blog.index", None, False,
+     lambda rng, s, i: ("GET", f"/blog/?after={rng.choice(s['post_cursors'])}", None)),
+    ("blog.index:offset", "blog.index", None, False,
+     lambda rng, s, i: ("GET", f"/blog/?page={rng.randint(1, 50)}", None)),
+    ("blog.index:category", "blog.index", None, False,
+     lambda rng, s, i: ("GET", "/blog/?" + urllib.parse.urlencode({"cat": rng.choice(s["categories"])}), None)),
+    ("blog.index:search", "blog.index", None, False,
+     lambda rng, s, i: ("GET", "/blog/?" + urllib.parse.urlencode({"q": " ".join(rng.sample(WORDS, 2))}), None)),
+    ("blog.view_post", "blog.view_post", None, False,
+     lambda rng, s, i: ("GET", f"/blog/post/{_slug(rng, s)}", None)),
+    ("blog.view_post:reader", "blog.view_post", "reader", False,
+     lambda rng, s, i: ("GET", f"/blog/post/{_slug(rng, s)}", None)),
+    ("blog.comments_page", "blog.comments_page", None, False,
+     lambda rng, s, i: ("GET", "/blog/post/{}/comments?after={}".format(*rng.choice(s["comment_cursors"])), None)),
+    ("blog.replies_page", "blog.replies_page", None, False,
+     lambda rng, s, i: ("GET", f"/blog/comment/{rng.choice(s['replied_comments'])}/replies", None)),
+    ("blog.likes_state", "blog.likes_state", "reader", False,
+     lambda rng, s, i: ("GET", "/blog/likes?posts={}&comments={}".format(
+         ",".join(map(str, rng.sample(s["post_ids"], 6))), ",".join(map(str, rng.sample(s["comment_ids"], 20)))),
+         None)),
+    ("api.posts", "api.posts", None, False, lambda rng, s, i: ("GET", "/api/posts?limit=20", None)),
+    ("api.posts:deep", "api.posts", None, False,
+     lambda rng, s, i: ("GET", f"/api/posts?limit=20&after={rng.choice(s['post_cursors'])}", None)),
+    ("admin.dashboard", "admin.dashboard", "admin", False, lambda rng, s, i: ("GET", "/admin/", None)),
+    ("admin.posts_data", "admin.posts_data", "admin", False,
+     lambda rng, s, i: ("GET", f"/admin/posts.json?page={rng.randint(1, 20)}&sort=views", None)),
+    ("admin.post_content", "admin.post_content", "admin", False,
+     lambda rng, s, i: ("GET", f"/admin/post/{rng.choice(s['post_ids'])}/content", None)),
+    ("admin.stats", "admin.stats", "admin", False, lambda rng, s, i: ("GET", "/admin/stats", None)),
+    ("admin.metrics_export", "admin.metrics_export", "admin", False, lambda rng, s, i: ("GET", "/admin/metrics", None)),
+    ("admin.edit_category", "admin.edit_category", "admin", False,
+     lambda rng, s, i: ("GET", f"/admin/category/edit/{rng.choice(s['category_ids'])}", None)),
+    ("admin.new_post", "admin.new_post", "admin", False, lambda rng, s, i: ("GET", "/admin/new-post", None)),
+    # Writes
+    ("auth.login:post", "auth.login", None, True,
+     lambda rng, s, i: ("POST", "/login", {"ident": "reader", "password": "password"})),
+    ("auth.register:post", "auth.register", None, True,
+     lambda rng, s, i: ("POST", "/register", {"username": f"load{i}-{rng.getrandbits(32)}",
+                                              "email": f"load{i}-{rng.getrandbits(32)}@example.com",
+                                              "password": "password"})),
+    ("blog.view_post:comment", "blog.view_post", "reader", True,
+     lambda rng, s, i: ("POST", f"/blog/post/{_slug(rng, s)}", {"content": " ".join(rng.sample(WORDS, 8))})),
+    ("blog.add_reply", "blog.add_reply", "reader", True,
+     lambda rng, s, i: ("POST", f"/blog/reply/{rng.choice(s['replied_comments'])}",
+                        {"reply_content": " ".join(rng.sample(WORDS, 6))})),
+    ("blog.like_post", "blog.like_post", "reader", True,
+     lambda rng, s, i: ("POST", f"/blog/like/{rng.choice(s['post_ids'])}", None)),
+    ("blog.unlike_post", "blog.unlike_post", "reader", True,
+     lambda rng, s, i: ("POST", f"/blog/unlike/{rng.choice(s['post_ids'])}", None)),
+    ("blog.like_comment", "blog.like_comment", "reader", True,
+     lambda rng, s, i: ("POST", f"/blog/like_comment/{rng.choice(s['comment_ids'])}", None)),
+    ("blog.unlike_comment", "blog.unlike_comment", "reader", True,
+     lambda rng, s, i: ("POST", f"/blog/unlike_comment/{rng.choice(s['comment_ids'])}", None)),
+    ("blog.edit_comment", "blog.edit_comment", "reader", True,
+     lambda rng, s, i: ("POST", f"/blog/edit_comment/{rng.choice(s['own_comments'])}",
+                        {"content": " ".join(rng.sample(WORDS, 8))})),
+    ("admin.update_post", "admin.update_post", "admin", True,
+     lambda rng, s, i: ("POST", f"/admin/update_post/{rng.choice(s['post_ids'])}",
+                        {"title": " ".join(rng.sample(WORDS, 5)).capitalize()})),
+    ("admin.new_post:post", "admin.new_post", "admin", True,
+     lambda rng, s, i: ("POST", "/admin/new-post", {"title": " ".join(rng.sample(WORDS, 6)).capitalize(),
+                                                    "content": " ".join(rng.choices(WORDS, k=200)),
+                                                    "category_id": str(rng.choice(s["category_ids"]))})),
+    ("admin.add_category", "admin.add_category", "admin", True,
+     lambda rng, s, i: ("POST", "/admin/add_category", {"name": f"Load {i} {rng.getrandbits(32)}"})),
+    ("admin.edit_category:post", "admin.edit_category", "admin", True,
+     lambda rng, s, i: ("POST", f"/admin/category/edit/{rng.choice(s['category_ids'])}",
+                        {"name": f"Renamed {i} {rng.getrandbits(32)}"})),
+    ("admin.publish_post", "admin.publish_post", "admin", True,
+     lambda rng, s, i: ("POST", f"/admin/publish_post/{rng.choice(s['post_ids'])}", None)),
+    ("admin.unpublish_post", "admin.unpublish_post", "admin", True,
+     lambda rng, s, i: ("POST", f"/admin/unpublish_post/{rng.choice(s['post_ids'])}", None)),
+]
+
+
+def load_samples(app, rng, size=500):
+    """Ids, slugs and cursors to build URLs from, drawn with ``rng``."""
+    from sqlalchemy import func, select
+    from app import db
+    from app.models import Category, Comment, Post, Reply
+    from app.pagination import encode_cursor
+
+    with app.app_context():
+        def pick(column, *where):
+            ids = db.session.scalars(select(column).where(*where).distinct().order_by(column)).all()
+            return rng.sample(ids, min(size, len(ids)))
+
+        published = Post.status == "published"
+        post_ids = pick(Post.id, published)
+        posts = db.session.execute(select(Post.id, Post.slug, Post.created_at).where(Post.id.in_(post_ids))).all()
+        comment_ids = pick(Comment.id)
+        comments = db.session.execute(
+            select(Comment.id, Comment.created_at, Post.slug).join(Post).where(Comment.id.in_(comment_ids))).all()
+        reader_id = db.session.scalar(select(func.min(Comment.user_id)).where(Comment.user_id == 2))
+        return {
+            "post_ids": sorted(post_ids),
+            "slugs": sorted(row.slug for row in posts),
+            "hot_slugs": db.session.scalars(
+                select(Post.slug).where(published).order_by(Post.created_at.desc()).limit(20)).all(),
+            "post_cursors": sorted(encode_cursor(row) for row in posts),
+            "comment_ids": sorted(comment_ids),
+            "comment_cursors": sorted((row.slug, encode_cursor(row)) for row in comments),
+            "replied_comments": pick(Reply.comment_id) or sorted(comment_ids),
+            "own_comments": pick(Comment.id, Comment.user_id == reader_id) if reader_id else sorted(comment_ids),
+            "categories": db.session.scalars(select(Category.name).order_by(Category.id)).all(),
+            "category_ids": db.session.scalars(select(Category.id).order_by(Category.id)).all(),
+        }
+
+
+# ==========================
+# DRIVERS
+# ==========================
+class ClientDriver:
+    """Requests through the Flask test client, in this process."""
+    name = "client"
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self, role):
+        client = self.app.test_client()
+        if role:
+            client.post("/login", data={"ident": ROLES[role], "password": "password"})
+        return client
+
+    def request(self, client, method, url, data):
+        response = client.open(url, method=method, data=data, headers={"Accept": "text/html,application/json"})
+        response.close()
+        return response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    """Requests over HTTP, to a server at ``base_url``."""
+    name = "gunicorn"
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def session(self, role):
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect)
+        if role:
+            self.request(opener, "POST", "/login", {"ident": ROLES[role], "password": "password"})
+        return opener
+
+    def request(self, opener, method, url, data):
+        body = urllib.parse.urlencode(data).encode() if data is not None else (b"" if method == "POST" else None)
+        request = urllib.request.Request(self.base_url + url, data=body, method=method,
+                                         headers={"Accept": "text/html,application/json"})
+        try:
+            with opener.open(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            return exc.code
+
+
+@contextmanager
+def gunicorn_server(env, workers):
+    """Start gunicorn (gunicorn.conf.py applies) on a free localhost port."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+                                "--log-level", "warning", "main:app"], cwd=ROOT, env=env)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/login", timeout=5).read()
+                break
+            except (OSError, urllib.error.URLError):
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise SystemExit("gunicorn did not start")
+                time.sleep(0.2)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(30)
+
+
+# ==========================
+# RUNNING
+# ==========================
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+def run_scenario(driver, scenario, samples, requests, concurrency, seed):
+    name, _, role, _, build = scenario
+    rng = random.Random(f"{seed}:{name}")
+    plan = [build(rng, samples, i) for i in range(requests)]
+    sessions = [driver.session(role) for _ in range(concurrency)]
+    latencies, statuses, failures = [], {}, []
+    next_index = itertools.count()
+    barrier = threading.Barrier(concurrency + 1)
+    lock = threading.Lock()
+
+    def work(session):
+        barrier.wait()
+        mine = []
+        for i in iter(lambda: next(next_index), None):
+            if i >= len(plan):
+                break
+            started = time.perf_counter()
+            try:
+                status = driver.request(session, *plan[i])
+            except Exception as exc:  # connection errors count as failures
+                status = type(exc).__name__
+            mine.append((time.perf_counter() - started, status))
+        with lock:
+            for took, status in mine:
+                latencies.append(took)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if not isinstance(status, int) or status >= 500:
+                    failures.append(status)
+
+    threads = [threading.Thread(target=work, args=(session,)) for session in sessions]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies), "errors": len(failures), "statuses": statuses,
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def run_target(driver, scenarios, samples, args, reset):
+    reset()
+    results = {}
+    for scenario in scenarios:
+        result = results[scenario[0]] = run_scenario(driver, scenario, samples, args.requests, args.concurrency,
+                                                     args.seed)
+        print(f"{driver.name:<9} {scenario[0]:<28} {result['rps']:8.1f} req/s  p50 {result['p50_ms']:7.2f}  "
+              f"p95 {result['p95_ms']:7.2f}  p99 {result['p99_ms']:7.2f} ms"
+              + (f"  {result['errors']} errors" if result["errors"] else ""))
+    return results
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    url = args.database
+    source = url[len("sqlite:///"):] if url.startswith("sqlite:///") else None
+    if source:
+        url = f"sqlite:///{os.path.join(workdir, 'blog.db')}"
+
+    def reset():
+        # Every target starts from the dataset as generated
+        if source:
+            shutil.copyfile(source, url[len("sqlite:///"):])
+
+    reset()
+    env = dict(os.environ, DATABASE_URL=url, METRICS_DIR=os.path.join(workdir, "metrics"))
+    if args.no_page_cache:
+        env["PAGE_CACHE_ENABLED"] = "0"
+    os.environ.update(env)
+
+    from app import db
+    from main import app  # the app gunicorn serves, home page included
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+    scenarios = [s for s in SCENARIOS if s[1] in endpoints and (not args.only or s[0] in args.only)
+                 and (args.writes or not s[3])]
+    scenarios.sort(key=lambda s: s[3])  # reads first
+    samples = load_samples(app, random.Random(args.seed))
+
+    def reset_client():
+        with app.app_context():
+            db.engine.dispose()
+        reset()
+
+    results = {}
+    if args.target in ("client", "both"):
+        results["client"] = run_target(ClientDriver(app), scenarios, samples, args, reset_client)
+    if args.target in ("gunicorn", "both"):
+        with app.app_context():
+            db.engine.dispose()
+        reset()
+        with gunicorn_server(env, args.workers) as base_url:
+            results["gunicorn"] = run_target(HttpDriver(base_url), scenarios, samples, args, lambda: None)
+
+    covered = {s[1] for s in SCENARIOS}
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                  text=True).stdout.strip(),
+            "python": platform.python_version(), "database": args.database, "seed": args.seed,
+            "requests": args.requests, "concurrency": args.concurrency, "workers": args.workers,
+            "page_cache": not args.no_page_cache,
+        },
+        "results": results,
+        "not_covered": {e: SKIPPED.get(e, "no scenario") for e in sorted(endpoints - covered)},
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(f"Results written to {args.output}")
+    failed = sum(r["errors"] for target in results.values() for r in target.values())
+    return 1 if failed else 0
+
+
+# ==========================
+# COMPARING
+# ==========================
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = 0
+    for target, scenarios in current["results"].items():
+        before = baseline["results"].get(target, {})
+        for name, now in scenarios.items():
+            then = before.get(name)
+            if then is None:
+                print(f"new       {target:<9} {name}")
+                continue
+            slower = now["p95_ms"] > then["p95_ms"] * (1 + args.threshold) and now["p95_ms"] - then["p95_ms"] > args.min_ms
+            fewer = now["rps"] < then["rps"] * (1 - args.threshold)
+            failing = now["errors"] > then["errors"]
+            flag = "REGRESSED" if slower or fewer or failing else "ok"
+            regressions += flag != "ok"
+            print(f"{flag:<9} {target:<9} {name:<28} p95 {then['p95_ms']:7.2f} -> {now['p95_ms']:7.2f} ms  "
+                  f"{then['rps']:8.1f} -> {now['rps']:8.1f} req/s"
+                  + (f"  errors {then['errors']} -> {now['errors']}" if failing else ""))
+        for name in sorted(set(before) - set(scenarios)):
+            print(f"missing   {target:<9} {name}")
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}" if regressions else "No regressions.")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the scenarios and write a JSON report")
+    run_parser.add_argument("--database", required=True, help="SQLAlchemy URL of a generated dataset")
+    run_parser.add_argument("--target", choices=("client", "gunicorn", "both"), default="both")
+    run_parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--only", action="append", help="scenario name; repeat for several")
+    run_parser.add_argument("--no-writes", dest="writes", action="store_false", help="skip write scenarios")
+    run_parser.add_argument("--no-page-cache", action="store_true", help="measure with the page cache off")
+    run_parser.add_argument("--output", default="loadtest-results.json")
+    compare_parser = commands.add_parser("compare", help="flag regressions of CURRENT against BASELINE")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative change")
+    compare_parser.add_argument("--min-ms", type=float, default=1.0, help="ignore p95 changes smaller than this")
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == "run" else compare(args))
+
+
+if __name__ == "__main__":
+    main()